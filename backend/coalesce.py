@@ -0,0 +1,70 @@
+"""Single-flight coalescing of hot reads.
+
+Identical concurrent reads (same scope and key) share one in-flight
+query: the first caller starts it, later callers await the same result.
+Optionally, results are also kept for READ_CACHE_TTL seconds (off by
+default), which flattens bursts of refreshes further.
+
+Writes call invalidate() with the scopes they touch (a session id, or
+the session list). That drops cached results and detaches any in-flight
+query for those scopes, so a read that starts after a write always
+queries again; callers already waiting still get the query they joined.
+Results are shared between callers and must not be mutated.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from metrics import READ_COALESCING
+
+READ_CACHE_TTL = float(os.environ.get('READ_CACHE_TTL', '0'))
+READ_CACHE_ENTRIES = 1024
+
+Key = Tuple[str, Hashable]
+
+
+class ReadCoalescer:
+    def __init__(self, ttl: float = READ_CACHE_TTL, max_entries: int = READ_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[Key, asyncio.Future] = {}
+        self._cache: "OrderedDict[Key, Tuple[float, Any]]" = OrderedDict()
+
+    async def read(self, name: str, scope: str, key: Hashable, query: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of `query()`, shared with identical reads in flight (or cached) for this scope"""
+        full_key = (scope, (name, key))
+        if self.ttl > 0:
+            entry = self._cache.get(full_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(full_key)
+                READ_COALESCING.inc(name, "cache_hit")
+                return entry[1]
+        task = self._inflight.get(full_key)
+        if task is None:
+            READ_COALESCING.inc(name, "query")
+            task = self._inflight[full_key] = asyncio.ensure_future(query())
+            task.add_done_callback(partial(self._settle, full_key))
+        else:
+            READ_COALESCING.inc(name, "coalesced")
+        # Shielded: a caller going away doesn't cancel the query for the others
+        return await asyncio.shield(task)
+
+    def _settle(self, key: Key, task: asyncio.Future):
+        failed = task.cancelled() or task.exception() is not None
+        if self._inflight.get(key) is not task:
+            return   # invalidated while in flight: never cached
+        del self._inflight[key]
+        if self.ttl > 0 and not failed:
+            self._cache[key] = (time.monotonic() + self.ttl, task.result())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, *scopes: str):
+        """Forget cached and in-flight reads of these scopes"""
+        for table in (self._inflight, self._cache):
+            for key in [k for k in table if k[0] in scopes]:
+                del table[key]
@@ -0,0 +1,177 @@
+"""Negotiated response compression.
+
+Compresses responses above a size threshold with brotli (when the
+optional `brotli` package is installed and the client accepts it) or
+gzip. Whole bodies are compressed in one go; streamed bodies (reports,
+NDJSON) are compressed chunk by chunk and flushed, so clients still see
+data as it is produced. Partial content, already-encoded responses and
+binary downloads are passed through untouched.
+
+A compressed body is not byte-identical to the identity one, so its
+ETag is weakened (W/"..."), as nginx does; conditional requests compare
+validators with etag_matches(), which ignores the weak marker.
+"""
+import os
+import zlib
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:   # optional: gzip only
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+
+# Fast settings: most of the size win for a fraction of the CPU of the maximum levels
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Content types worth compressing; anything else (archives, images, octet-stream downloads) is sent as is
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                      "application/xml", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding the client accepts (q=0 means refused)"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+def _weak(etag: bytes) -> bytes:
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+
+def _compressed_headers(headers: List[Tuple[bytes, bytes]], encoding: str) -> List[Tuple[bytes, bytes]]:
+    # Drop the length, weaken the ETag, and merge Accept-Encoding into any Vary the app already set
+    varies = [t.strip().lower() for name, value in headers if name == b"vary" for t in value.split(b",")]
+    merged = b"accept-encoding" in varies or b"*" in varies
+    result = []
+    for name, value in headers:
+        if name == b"content-length":
+            continue
+        if name == b"etag":
+            value = _weak(value)
+        elif name == b"vary" and not merged:
+            value, merged = value + b", Accept-Encoding", True
+        result.append((name, value))
+    if not merged:
+        result.append((b"vary", b"Accept-Encoding"))
+    result.append((b"content-encoding", encoding.encode()))
+    return result
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+def _compressible(status: int, headers: List[Tuple[bytes, bytes]]) -> bool:
+    if status < 200 or status in (204, 206, 304):
+        return False
+    content_type = b""
+    for name, value in headers:
+        if name in (b"content-encoding", b"content-range"):
+            return False
+        if name == b"content-type":
+            content_type = value
+    return content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware applying brotli/gzip to large compressible responses"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = choose_encoding(value.decode("latin-1"))
+                break
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                passthrough = not _compressible(message["status"], message.get("headers", []))
+                if message["status"] == 304:
+                    # Same validator as the compressed 200 it revalidates
+                    message = {**message, "headers": [(k, _weak(v) if k == b"etag" else v)
+                                                      for k, v in message.get("headers", [])]}
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers = _compressed_headers(start.get("headers", []), encoding)
+                if not more_body:
+                    body = compressor.finish(body)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start, "headers": headers})
+            data = compressor.chunk(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
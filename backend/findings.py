@@ -0,0 +1,170 @@
+"""Structured findings extraction from tool output.
+
+Runs once when a tool execution is stored and turns the free-text output
+into small typed documents (open ports, services/versions, discovered
+paths, credential markers, referenced CVEs) so correlation and reporting
+can query them instead of re-parsing output blobs.
+"""
+import re
+from typing import List, Dict, Any, Optional
+
+FINDING_TYPES = ("port", "service", "path", "credential", "cve")
+
+NMAP_TARGET_RE = re.compile(r"^Nmap scan report for (\S+)")
+NMAP_PORT_RE = re.compile(r"^(\d+)/(tcp|udp)\s+(open|filtered|closed)\s+(\S+)(?:\s+(.+?))?\s*$")
+MASSCAN_PORT_RE = re.compile(r"Discovered open port (\d+)/(tcp|udp) on (\S+)")
+CME_HOST_RE = re.compile(r"^CME\s+(\S+?):(\d+)\s")
+
+DIRB_PATH_RE = re.compile(r"^\+ (https?://\S+) \(CODE:(\d+)\|SIZE:(\d+)\)")
+GOBUSTER_PATH_RE = re.compile(r"^(/\S*)\s+\(Status: (\d+)\) \[Size: (\d+)\]")
+NIKTO_PATH_RE = re.compile(r"^\+ (?:OSVDB-\d+: )?(/\S*?):? (.+)$")
+
+SERVER_HEADER_RE = re.compile(r"Server:\s+([A-Za-z][\w.-]*)/(\d[\w.]*)")
+TECH_LIST_RE = re.compile(r"^(?:web application technology|back-end DBMS):\s*(.+)$", re.IGNORECASE)
+PRODUCT_VERSION_RE = re.compile(r"([A-Za-z][\w-]*(?: [A-Za-z][\w-]*)?)\s*(?:>=\s*)?(\d[\w.]*)")
+
+HYDRA_CRED_RE = re.compile(r"host: (\S+)\s+login: (\S+)\s+password: \S+")
+JOHN_CRED_RE = re.compile(r"^(\S+)\s+\((\S+)\)$")
+CME_CRED_RE = re.compile(r"\[\+\] ([\w.-]+)\\(\S+?):\S+( \(Pwn3d!\))?")
+USERNAME_RE = re.compile(r"^\*?\s*(?:user ?name|username|login|defaultusername)\s*:\s*(\S+)", re.IGNORECASE)
+PASSWORD_RE = re.compile(r"^\*?\s*(?:password|defaultpassword)\s*:\s*\S+", re.IGNORECASE)
+
+CVE_RE = re.compile(r"\bCVE-\d{4}-\d{4,}\b")
+
+
+def _port_findings(lines: List[str], target: Optional[str]) -> List[Dict[str, Any]]:
+    findings = []
+    host = target
+    for line in lines:
+        match = NMAP_TARGET_RE.match(line)
+        if match:
+            host = match.group(1)
+            continue
+        match = NMAP_PORT_RE.match(line)
+        if match:
+            port, proto, state, service, version = match.groups()
+            findings.append({"type": "port", "host": host, "port": int(port), "protocol": proto,
+                             "state": state, "service": service})
+            if version:
+                findings.append({"type": "service", "host": host, "port": int(port),
+                                 "service": service, "product": version})
+            continue
+        match = MASSCAN_PORT_RE.search(line)
+        if match:
+            port, proto, masscan_host = match.groups()
+            findings.append({"type": "port", "host": masscan_host, "port": int(port), "protocol": proto,
+                             "state": "open", "service": None})
+            continue
+        match = CME_HOST_RE.match(line)
+        if match:
+            findings.append({"type": "port", "host": match.group(1), "port": int(match.group(2)),
+                             "protocol": "tcp", "state": "open", "service": "smb"})
+    return findings
+
+
+def _path_findings(lines: List[str]) -> List[Dict[str, Any]]:
+    findings = []
+    for line in lines:
+        match = DIRB_PATH_RE.match(line)
+        if match:
+            url, code, size = match.groups()
+            findings.append({"type": "path", "path": url, "status": int(code), "size": int(size)})
+            continue
+        match = GOBUSTER_PATH_RE.match(line)
+        if match:
+            path, code, size = match.groups()
+            findings.append({"type": "path", "path": path, "status": int(code), "size": int(size)})
+            continue
+        match = NIKTO_PATH_RE.match(line)
+        if match and match.group(1).startswith("/"):
+            findings.append({"type": "path", "path": match.group(1), "note": match.group(2).strip()})
+    return findings
+
+
+def _service_findings(lines: List[str], target: Optional[str]) -> List[Dict[str, Any]]:
+    findings = []
+    for line in lines:
+        match = SERVER_HEADER_RE.search(line)
+        if match:
+            findings.append({"type": "service", "host": target, "port": None, "service": "http",
+                             "product": f"{match.group(1)} {match.group(2)}"})
+            continue
+        match = TECH_LIST_RE.match(line.strip())
+        if match:
+            for product, version in PRODUCT_VERSION_RE.findall(match.group(1)):
+                findings.append({"type": "service", "host": target, "port": None, "service": None,
+                                 "product": f"{product} {version}"})
+    return findings
+
+
+def _credential_findings(lines: List[str], tool_name: str) -> List[Dict[str, Any]]:
+    # Only markers are kept (who/where); secrets stay in the raw output
+    findings = []
+    pending_user = None
+    for line in lines:
+        stripped = line.strip()
+        match = HYDRA_CRED_RE.search(stripped)
+        if match:
+            findings.append({"type": "credential", "host": match.group(1), "username": match.group(2),
+                             "privileged": False})
+            continue
+        match = CME_CRED_RE.search(stripped)
+        if match:
+            findings.append({"type": "credential", "host": None, "username": f"{match.group(1)}\\{match.group(2)}",
+                             "privileged": bool(match.group(3))})
+            continue
+        if tool_name == "john":
+            match = JOHN_CRED_RE.match(stripped)
+            if match:
+                findings.append({"type": "credential", "host": None, "username": match.group(2),
+                                 "privileged": False})
+                continue
+        match = USERNAME_RE.match(stripped)
+        if match:
+            pending_user = match.group(1)
+            continue
+        if pending_user and PASSWORD_RE.match(stripped):
+            findings.append({"type": "credential", "host": None, "username": pending_user,
+                             "privileged": pending_user.lower() in ("administrator", "admin", "root")})
+            pending_user = None
+    return findings
+
+
+def extract_findings(tool_name: str, output: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Parse tool output into de-duplicated structured findings"""
+    lines = output.splitlines()
+    target = params.get("target")
+    candidates = (
+        _port_findings(lines, target)
+        + _service_findings(lines, target)
+        + _path_findings(lines)
+        + _credential_findings(lines, tool_name)
+        + [{"type": "cve", "cve_id": cve_id} for cve_id in CVE_RE.findall(output)]
+    )
+
+    findings, seen = [], set()
+    for finding in candidates:
+        key = tuple(sorted((k, str(v)) for k, v in finding.items()))
+        if key in seen:
+            continue
+        seen.add(key)
+        if finding.get("host") is None:
+            finding["host"] = target
+        findings.append(finding)
+    return findings
+
+
+def finding_documents(findings: List[Dict[str, Any]], session_id: str, execution_id: str,
+                      tool_name: str, timestamp: str) -> List[Dict[str, Any]]:
+    """Wrap extracted findings into documents for the findings collection"""
+    return [
+        {
+            **finding,
+            "id": f"{execution_id}:{index}",
+            "session_id": session_id,
+            "execution_id": execution_id,
+            "tool_name": tool_name,
+            "timestamp": timestamp,
+        }
+        for index, finding in enumerate(findings)
+    ]
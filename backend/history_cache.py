@@ -0,0 +1,105 @@
+"""Write-through cache of recent chat history per session.
+
+Each chat turn needs the session's recent messages as LLM context. This
+process has usually just written them, so they are kept here, per
+session, tagged with the session document's `history_version`: every
+message insert is followed by a `$inc` of that field, so an entry is
+current exactly when its version is the one in Mongo. A turn bumps the
+version for its user message; if the result is the cached version plus
+one, nobody else (in this or another worker) wrote in between and the
+context comes from memory, otherwise it is read from Mongo.
+
+Sessions are evicted least recently used once the estimated size of the
+cached messages exceeds HISTORY_CACHE_BYTES.
+"""
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from metrics import Counter, Gauge
+
+HISTORY_CACHE_BYTES = int(os.environ.get('HISTORY_CACHE_BYTES', str(32 * 1024 * 1024)))
+HISTORY_CONTEXT_MESSAGES = 50
+
+# Rough per-message cost of the dict and string objects on top of the JSON size
+MESSAGE_OVERHEAD = 512
+
+HISTORY_CACHE_READS = Counter("chat_history_cache_total", "Chat context reads by outcome (hit, miss)", ("outcome",))
+HISTORY_CACHE_SIZE = Gauge("chat_history_cache_bytes", "Estimated size of the cached chat history")
+
+
+def message_size(message: Dict[str, Any]) -> int:
+    return len(orjson.dumps(message, default=str)) + MESSAGE_OVERHEAD
+
+
+class _Entry:
+    __slots__ = ("version", "messages", "sizes")
+
+    def __init__(self, version: int):
+        self.version = version
+        self.messages: List[Dict[str, Any]] = []
+        self.sizes: List[int] = []
+
+
+class HistoryCache:
+    def __init__(self, max_bytes: int = HISTORY_CACHE_BYTES, max_messages: int = HISTORY_CONTEXT_MESSAGES):
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.size = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        HISTORY_CACHE_SIZE.set_function(lambda: self.size)
+
+    def get(self, session_id: str, version: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+        """Recent messages, oldest first, if cached at exactly this version"""
+        entry = self._entries.get(session_id)
+        if entry is None or version is None or entry.version != version:
+            HISTORY_CACHE_READS.inc("miss")
+            return None
+        self._entries.move_to_end(session_id)
+        HISTORY_CACHE_READS.inc("hit")
+        return list(entry.messages)
+
+    def put(self, session_id: str, version: Optional[int], messages: List[Dict[str, Any]]):
+        """Cache the recent messages of a session as of `version`"""
+        self.drop(session_id)
+        if version is None:
+            return
+        entry = self._entries[session_id] = _Entry(version)
+        self._extend(entry, messages)
+        self._evict()
+
+    def append(self, session_id: str, version: Optional[int], message: Dict[str, Any]):
+        """Add a message written as `version`; the entry is dropped if it missed a write"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        if version is None or entry.version != version - 1:
+            self.drop(session_id)
+            return
+        entry.version = version
+        self._extend(entry, [message])
+        self._entries.move_to_end(session_id)
+        self._evict()
+
+    def drop(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.size -= sum(entry.sizes)
+
+    def _extend(self, entry: _Entry, messages: List[Dict[str, Any]]):
+        for message in messages:
+            message = {k: v for k, v in message.items() if k != "_id"}
+            entry.messages.append(message)
+            entry.sizes.append(message_size(message))
+            self.size += entry.sizes[-1]
+        excess = len(entry.messages) - self.max_messages
+        if excess > 0:
+            self.size -= sum(entry.sizes[:excess])
+            del entry.messages[:excess], entry.sizes[:excess]
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            session_id = next(iter(self._entries))
+            self.drop(session_id)
@@ -0,0 +1,123 @@
+"""Idempotency keys for retried POSTs.
+
+A request carrying an `Idempotency-Key` header claims a record in the
+`idempotency_keys` collection (keyed by endpoint and key, expired by a
+TTL index on `created_at`) before doing any work, and stores its result
+there when done. A duplicate gets the stored result; while the original
+is still running it attaches to it: directly when it runs in this
+process, otherwise by polling the record. A record is tied to a
+fingerprint of the request body, so reusing a key for a different
+request is rejected. Failed requests release their record, so a retry
+runs again; records left behind by a crashed worker are taken over once
+they are older than IDEMPOTENCY_LOCK_SECONDS.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', str(24 * 3600)))
+IDEMPOTENCY_WAIT = float(os.environ.get('IDEMPOTENCY_WAIT', '120'))
+IDEMPOTENCY_LOCK_SECONDS = float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '600'))
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+DUPLICATE_KEY = 11000   # MongoDB error code; checked by value so pymongo needn't be imported here
+POLL_MAX_DELAY = 1.0
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a request with a different body"""
+
+
+class IdempotencyInProgress(Exception):
+    """The original request is still running elsewhere after the wait timed out"""
+
+
+def fingerprint(payload: Any) -> str:
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+
+def _aware(value: datetime) -> datetime:
+    # pymongo returns naive UTC datetimes unless the client is tz_aware
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class IdempotencyStore:
+    def __init__(self, wait: float = IDEMPOTENCY_WAIT, lock_seconds: float = IDEMPOTENCY_LOCK_SECONDS):
+        self.wait = wait
+        self.lock_seconds = lock_seconds
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def run(self, collection, record_id: str, payload: Any,
+                  handler: Callable[[], Awaitable[Any]]) -> Tuple[bool, Any]:
+        """(replayed, result): `handler()`'s JSON-ready result, computed at most once per record_id"""
+        digest = fingerprint(payload)
+        inflight = self._inflight.get(record_id)
+        if inflight is not None:
+            if inflight[0] != digest:
+                raise IdempotencyKeyReused("Idempotency-Key was already used for a different request")
+            await asyncio.shield(inflight[1])
+            return True, inflight[1].result()[1]
+        # Shielded task: the work and its record outlive a caller that disconnects
+        task = asyncio.ensure_future(self._resolve(collection, record_id, digest, handler))
+        self._inflight[record_id] = (digest, task)
+        task.add_done_callback(lambda done: self._forget(record_id, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, record_id: str, task: asyncio.Future):
+        if self._inflight.get(record_id, (None, None))[1] is task:
+            del self._inflight[record_id]
+
+    async def _claim(self, collection, record_id: str, digest: str) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await collection.insert_one({"_id": record_id, "fingerprint": digest, "status": "in_progress",
+                                         "created_at": now, "started_at": now})
+            return True
+        except Exception as e:
+            if getattr(e, "code", None) != DUPLICATE_KEY:
+                raise
+            return False
+
+    async def _resolve(self, collection, record_id: str, digest: str, handler) -> Tuple[bool, Any]:
+        if not await self._claim(collection, record_id, digest):
+            record = await self._wait(collection, record_id, digest)
+            if record is not None:
+                return True, record["response"]
+        try:
+            result = await handler()
+        except BaseException:
+            await collection.delete_one({"_id": record_id, "status": "in_progress"})
+            raise
+        await collection.update_one({"_id": record_id}, {"$set": {"status": "completed", "response": result}})
+        return False, result
+
+    async def _wait(self, collection, record_id: str, digest: str) -> Optional[Dict[str, Any]]:
+        """The completed record, or None once this process owns the record instead"""
+        deadline = time.monotonic() + self.wait
+        delay = 0.05
+        while True:
+            record = await collection.find_one({"_id": record_id})
+            if record is None:
+                # The original failed and released the key
+                if await self._claim(collection, record_id, digest):
+                    return None
+                continue
+            if record["fingerprint"] != digest:
+                raise IdempotencyKeyReused("Idempotency-Key was already used for a different request")
+            if record["status"] == "completed":
+                return record
+            stale = datetime.now(timezone.utc) - timedelta(seconds=self.lock_seconds)
+            if _aware(record["started_at"]) < stale and await collection.find_one_and_update(
+                    {"_id": record_id, "status": "in_progress", "started_at": record["started_at"]},
+                    {"$set": {"started_at": datetime.now(timezone.utc)}}):
+                return None
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress("A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_MAX_DELAY)
@@ -0,0 +1,244 @@
+"""Prometheus-compatible metrics.
+
+A minimal, dependency-free implementation of counters, gauges and
+histograms with labels, rendered in the Prometheus text exposition format
+at /metrics. Recording is a dict lookup and a few additions under a lock,
+so it is cheap enough to leave on everywhere: HTTP requests (per route
+template, not per raw path), MongoDB commands (via a pymongo command
+listener), LLM calls, tool simulations and sandbox file I/O.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the (unlabelled) value from `function` at scrape time"""
+        self._function = function
+
+    def _samples(self) -> Iterator[str]:
+        if self._function is not None:
+            yield f"{self.name} {_format_value(self._function())}"
+            return
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last slot is +Inf), sum, count
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+            series[0][index] += 1
+            series[1][0] += value
+            series[1][1] += 1
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted((labels, (list(counts), list(totals))) for labels, (counts, totals) in self._series.items())
+        for labels, (counts, (total, count)) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {count}"
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# ============ APPLICATION METRICS ============
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds",
+                                 "HTTP request latency, until the last body chunk is sent",
+                                 ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served", ("method",))
+
+MONGO_COMMAND_SECONDS = Histogram("mongodb_command_duration_seconds", "MongoDB command latency",
+                                  ("collection", "command", "outcome"), buckets=FAST_BUCKETS)
+
+LLM_REQUEST_SECONDS = Histogram("llm_request_duration_seconds", "LLM call latency", ("model", "outcome"))
+LLM_TOKENS = Histogram("llm_tokens", "Estimated LLM tokens per call (about 4 characters per token)",
+                       ("model", "direction"), buckets=TOKEN_BUCKETS)
+
+TOOL_SIMULATION_SECONDS = Histogram("tool_simulation_duration_seconds", "Simulated tool execution latency",
+                                    ("tool",), buckets=FAST_BUCKETS)
+
+FILE_IO_SECONDS = Histogram("sandbox_io_duration_seconds",
+                            "Sandbox file I/O latency, including time queued for a pool worker",
+                            ("operation", "outcome"), buckets=FAST_BUCKETS)
+FILE_IO_IN_FLIGHT = Gauge("sandbox_io_in_flight", "Sandbox file operations queued or running")
+
+READ_COALESCING = Counter("read_coalescing_total",
+                          "Coalesced reads by outcome (query, coalesced onto an in-flight query, cache_hit)",
+                          ("read", "outcome"))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by method, route template and status"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(method)
+            # The router stores the matched route in the scope; raw paths would explode cardinality
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method,
+                                         getattr(route, "path", "unmatched"), status)
+
+
+def mongo_command_listener():
+    """pymongo command listener recording per-collection, per-command latency
+
+    Built on demand so importing this module doesn't pull in pymongo.
+    """
+    from pymongo import monitoring
+
+    class MongoCommandMetrics(monitoring.CommandListener):
+        def __init__(self):
+            self._collections: Dict[Tuple[object, int], str] = {}
+
+        def started(self, event):
+            command = event.command
+            name = event.command_name
+            collection = command.get("collection") if name == "getMore" else command.get(name)
+            self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+        def _finish(self, event, outcome: str):
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+            MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, collection, event.command_name, outcome)
+
+        def succeeded(self, event):
+            self._finish(event, "ok")
+
+        def failed(self, event):
+            self._finish(event, "error")
+
+    return MongoCommandMetrics()
@@ -0,0 +1,183 @@
+"""Opt-in per-request profiling.
+
+A request carrying the profiling token (an `X-Profile` header, or a
+`profile` query parameter) runs under a profiler. Either cProfile, saved
+as a .pstats file, or a stack sampler saved as speedscope JSON (choose
+with `X-Profile-Format` / `profile_format`). The profile id is returned in
+an `X-Profile-Id` response header and the file lands in PROFILE_DIR, which
+keeps only the newest PROFILE_RETENTION profiles.
+
+Both profilers see the whole event loop thread, so work for concurrent
+requests shows up too; only one request is profiled at a time. The
+middleware is only installed when a token is configured, so there is no
+cost at all otherwise.
+"""
+import asyncio
+import cProfile
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN') or os.environ.get('ADMIN_TOKEN')
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', '/tmp/nexus_profiles'))
+PROFILE_RETENTION = int(os.environ.get('PROFILE_RETENTION', '50'))
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.001'))
+
+PROFILES_ROUTE = "/api/profiles/"
+
+PROFILE_FORMATS = {"pstats": ".pstats", "speedscope": ".speedscope.json"}
+
+Frame = Tuple[str, str, int]
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames: Dict[Frame, int] = {}
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_name, code.co_filename, code.co_firstlineno)
+                index = self.frames.get(key)
+                if index is None:
+                    index = self.frames[key] = len(self.frames)
+                stack.append(index)
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def speedscope(self, name: str) -> Dict:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": n, "file": f, "line": line} for n, f, line in self.frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.elapsed,
+                "samples": self.samples,
+                "weights": self.weights,
+            }],
+            "name": name,
+            "exporter": "nexus-profiling",
+        }
+
+
+def prune_profiles(directory: Path = PROFILE_DIR, keep: int = PROFILE_RETENTION):
+    profiles = sorted((p for p in directory.iterdir() if p.is_file()), key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in profiles[keep:]:
+        stale.unlink(missing_ok=True)
+
+
+def profile_path(profile_id: str) -> Optional[Path]:
+    """The saved profile for an id, if it still exists"""
+    for suffix in PROFILE_FORMATS.values():
+        path = PROFILE_DIR / f"{profile_id}{suffix}"
+        if path.is_file():
+            return path
+    return None
+
+
+def _save(profiler, profile_id: str, format: str, name: str):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{profile_id}{PROFILE_FORMATS[format]}"
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    if format == "pstats":
+        profiler.dump_stats(str(tmp_path))
+    else:
+        tmp_path.write_text(json.dumps(profiler.speedscope(name)))
+    os.replace(tmp_path, path)
+    prune_profiles(PROFILE_DIR, PROFILE_RETENTION)
+
+
+def token_matches(token: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that present the profiling token"""
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = threading.Lock()
+
+    def _requested(self, scope) -> Optional[str]:
+        headers = dict(scope["headers"])
+        token = headers.get(b"x-profile", b"").decode("latin-1")
+        format = headers.get(b"x-profile-format", b"").decode("latin-1")
+        if not token and b"profile=" in scope.get("query_string", b""):
+            query = parse_qs(scope["query_string"].decode("latin-1"))
+            token = query.get("profile", [""])[0]
+            format = format or query.get("profile_format", [""])[0]
+        if not token_matches(token):
+            return None
+        return format if format in PROFILE_FORMATS else "pstats"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Fetching a profile presents the token too; don't profile the download
+        format = None if scope["path"].startswith(PROFILES_ROUTE) else self._requested(scope)
+        if format is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        name = f'{scope["method"]} {scope["path"]}'
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        try:
+            if format == "pstats":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                profiler = StackSampler(threading.get_ident())
+                profiler.start()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                if format == "pstats":
+                    profiler.disable()
+                else:
+                    profiler.stop()
+            await asyncio.get_running_loop().run_in_executor(None, _save, profiler, profile_id, format, name)
+        finally:
+            self._busy.release()
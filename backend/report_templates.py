@@ -0,0 +1,168 @@
+"""Precompiled layouts for the HTML and Markdown report formats.
+
+Each layout is a set of small "{field}" templates. They are compiled once
+at import into plain f-string functions, so rendering a row is a single
+string build with no per-call template parsing.
+"""
+import html
+import re
+import string
+from typing import Any, Callable, Dict
+
+Renderer = Callable[[Dict[str, Any]], str]
+
+FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def compile_template(source: str, escape: Callable[[str], str]) -> Renderer:
+    """Compile a "{field}" / "{field!r}" template into one f-string function
+
+    "{field}" values are passed through escape; "!r" inserts them raw (for
+    pre-rendered fragments). Literal text is bound by name, so it needs no
+    quoting inside the generated code.
+    """
+    namespace: Dict[str, Any] = {"_escape": escape, "_str": str}
+    pieces = []
+    for index, (literal, field, _spec, conversion) in enumerate(string.Formatter().parse(source)):
+        if literal:
+            namespace[f"_lit{index}"] = literal
+            pieces.append(f"{{_lit{index}}}")
+        if field is None:
+            continue
+        if not FIELD_RE.match(field):
+            raise ValueError(f"Invalid template field: {field!r}")
+        value = f"_str(c.get({field!r}, ''))"
+        pieces.append(f"{{{value}}}" if conversion == "r" else f"{{_escape({value})}}")
+    code = f"def render(c):\n    return f\"{''.join(pieces)}\"\n"
+    exec(compile(code, f"<template {source[:30]!r}>", "exec"), namespace)
+    return namespace["render"]
+
+
+def compile_layout(sources: Dict[str, str], escape: Callable[[str], str]) -> Dict[str, Renderer]:
+    return {name: compile_template(source, escape) for name, source in sources.items()}
+
+
+MARKDOWN_SPECIAL_RE = re.compile(r"([\\`*_\[\]<>|#])")
+
+
+def markdown_escape(text: str) -> str:
+    return MARKDOWN_SPECIAL_RE.sub(r"\\\1", text)
+
+
+TILDE_RUN_RE = re.compile(r"~+")
+
+
+def code_fence(text: str) -> str:
+    """A tilde fence longer than any tilde run in text, so nothing inside can close it"""
+    longest = max((len(run) for run in TILDE_RUN_RE.findall(text)), default=0)
+    return "~" * max(4, longest + 1)
+
+
+HTML_LAYOUT = {
+    "head": """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>NEXUS Report {session_id}</title>
+<style>
+body {{ background: #0a0a0a; color: #d0d0d0; font-family: 'JetBrains Mono', monospace; margin: 2rem; }}
+h1, h2, h3 {{ color: #00FF41; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border: 1px solid #333; padding: 4px 8px; text-align: left; vertical-align: top; }}
+pre {{ white-space: pre-wrap; margin: 0.25rem 0; }}
+.status-success {{ color: #00FF41; }}
+.status-error {{ color: #FF3B3B; }}
+.msg {{ border-left: 2px solid #333; padding-left: 0.75rem; margin-bottom: 1rem; }}
+.msg-user {{ border-color: #00FF41; }}
+</style>
+</head>
+<body>
+<h1>NEXUS Penetration Test Report</h1>
+<p>Session ID: <code>{session_id}</code><br>Generated: {generated_at}</p>
+""",
+    "executions_start": """<h2>Tool Executions</h2>
+<table>
+<thead><tr><th>Time</th><th>Tool</th><th>Status</th><th>Parameters</th></tr></thead>
+<tbody>
+""",
+    "execution": """<tr><td>{timestamp}</td><td>{tool_name}</td><td class="status-{status}">{status}</td><td><code>{parameters}</code>{output_block!r}</td></tr>
+""",
+    "execution_output": """<details><summary>output</summary><pre>{output}</pre></details>""",
+    "executions_end": """</tbody>
+</table>
+<p>Total tools executed: {total}</p>
+""",
+    "findings_start": """<h2>Findings Summary</h2>
+""",
+    "finding_section": """<h3>{type} ({count})</h3>
+<ul>
+""",
+    "finding": """<li>{summary}</li>
+""",
+    "finding_section_end": """</ul>
+""",
+    "chat_start": """<h2>Chat History</h2>
+""",
+    "chat_message": """<div class="msg msg-{role}"><strong>{role}</strong> <small>{timestamp}</small><pre>{content}</pre></div>
+""",
+    "foot": """</body>
+</html>
+""",
+}
+
+MARKDOWN_LAYOUT = {
+    "head": """# NEXUS Penetration Test Report
+
+- **Session ID:** {session_id}
+- **Generated:** {generated_at}
+
+""",
+    "executions_start": """## Tool Executions
+
+""",
+    "execution": """### [{timestamp}] {tool_name}
+
+- Status: {status}
+- Parameters: {parameters}
+{output_block!r}
+""",
+    "execution_output": """
+{fence!r}
+{output!r}
+{fence!r}
+""",
+    "executions_end": """
+Total tools executed: {total}
+
+""",
+    "findings_start": """## Findings Summary
+""",
+    "finding_section": """
+### {type} ({count})
+
+""",
+    "finding": """- {summary}
+""",
+    "finding_section_end": "",
+    "chat_start": """
+## Chat History
+
+""",
+    "chat_message": """**{role}** ({timestamp}):
+
+{content}
+
+""",
+    "foot": "",
+}
+
+
+def _html_escape(text: str) -> str:
+    return html.escape(text, quote=True)
+
+
+# Compiled once at startup
+LAYOUTS: Dict[str, Dict[str, Renderer]] = {
+    "html": compile_layout(HTML_LAYOUT, _html_escape),
+    "md": compile_layout(MARKDOWN_LAYOUT, markdown_escape),
+}
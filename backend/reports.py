@@ -0,0 +1,315 @@
+"""Session report rendering.
+
+Reports are produced by async generators that walk Mongo cursors and emit
+the report piece by piece, so memory stays flat however large a session
+grows and nothing is truncated.
+"""
+import io
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+import orjson
+
+from findings import FINDING_TYPES
+from report_templates import LAYOUTS, code_fence
+
+CURSOR_BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+# Rendered reports keyed by (session, format, content version)
+REPORT_CACHE_DIR = Path(os.environ.get('REPORT_CACHE_DIR', '/tmp/nexus_report_cache'))
+SAFE_SESSION_ID_RE = re.compile(r"^[\w-]{1,128}$")
+
+REPORT_MEDIA_TYPES = {
+    "json": "application/x-ndjson",
+    "txt": "text/plain; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "md": "text/markdown; charset=utf-8",
+}
+
+
+def session_cursor(db, collection: str, session_id: str, sort: List = None):
+    """Cursor over one session's documents in a collection, in stored order"""
+    return db[collection].find(
+        {"session_id": session_id},
+        {"_id": 0}
+    ).sort(sort or [("timestamp", 1)]).batch_size(CURSOR_BATCH_SIZE)
+
+
+def format_finding(finding: Dict[str, Any]) -> str:
+    """One-line human readable summary of a finding"""
+    host = finding.get("host") or "?"
+    if finding["type"] == "port":
+        return f"{host}:{finding['port']}/{finding['protocol']} {finding['state']} {finding.get('service') or ''}".rstrip()
+    if finding["type"] == "service":
+        port = f":{finding['port']}" if finding.get("port") else ""
+        return f"{host}{port} {finding['product']}"
+    if finding["type"] == "path":
+        status = f" [{finding['status']}]" if finding.get("status") else ""
+        return f"{finding['path']}{status} {finding.get('note') or ''}".rstrip()
+    if finding["type"] == "credential":
+        return f"{finding['username']} @ {host}" + (" (privileged)" if finding.get("privileged") else "")
+    return finding.get("cve_id", "")
+
+
+async def _chunked(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    # Coalesce small lines into ~64KB chunks to keep per-write overhead low
+    buffer = io.StringIO()
+    async for line in lines:
+        buffer.write(line)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def _finding_type_counts(db, session_id: str) -> Dict[str, int]:
+    return {
+        row["_id"]: row["count"]
+        async for row in db.findings.aggregate([
+            {"$match": {"session_id": session_id}},
+            {"$group": {"_id": "$type", "count": {"$sum": 1}}},
+        ])
+    }
+
+
+async def _text_lines(db, session_id: str) -> AsyncIterator[str]:
+    yield "\n".join([
+        "=" * 60,
+        "NEXUS PENETRATION TEST REPORT",
+        "=" * 60,
+        f"Session ID: {session_id}",
+        f"Generated: {datetime.now(timezone.utc).isoformat()}",
+        "",
+        "-" * 60,
+        "TOOL EXECUTIONS",
+        "-" * 60,
+    ]) + "\n"
+
+    total = 0
+    async for exe in session_cursor(db, "tool_executions", session_id):
+        total += 1
+        yield f"\n[{exe.get('timestamp', 'N/A')}] {exe.get('tool_name', 'Unknown')}\n"
+        yield f"Status: {exe.get('status', 'N/A')}\n"
+        if exe.get('parameters'):
+            yield f"Parameters: {exe.get('parameters')}\n"
+
+    yield "\n".join([
+        "",
+        "-" * 60,
+        "FINDINGS SUMMARY",
+        "-" * 60,
+        f"Total tools executed: {total}",
+    ]) + "\n"
+
+    type_counts = await _finding_type_counts(db, session_id)
+
+    # Sorted by type so each section is emitted in one pass over the cursor
+    current_type = None
+    async for finding in session_cursor(db, "findings", session_id, sort=[("type", 1), ("timestamp", 1)]):
+        if finding.get("type") not in FINDING_TYPES:
+            continue
+        if finding["type"] != current_type:
+            current_type = finding["type"]
+            yield f"\n{current_type.upper()} ({type_counts.get(current_type, 0)})\n"
+        yield f"  - {format_finding(finding)}\n"
+
+    yield "\n".join([
+        "",
+        "=" * 60,
+        "END OF REPORT",
+        "=" * 60,
+    ])
+
+
+def stream_text_report(db, session_id: str) -> AsyncIterator[str]:
+    """Plain-text report, emitted in chunks"""
+    return _chunked(_text_lines(db, session_id))
+
+
+async def _ndjson_lines(db, session_id: str) -> AsyncIterator[str]:
+    yield orjson.dumps({
+        "record": "header",
+        "session_id": session_id,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+    }).decode() + "\n"
+
+    counts = {}
+    for record, collection in (("tool_execution", "tool_executions"),
+                               ("finding", "findings"),
+                               ("chat_message", "chat_messages")):
+        counts[collection] = 0
+        async for doc in session_cursor(db, collection, session_id):
+            counts[collection] += 1
+            yield orjson.dumps({"record": record, **doc}, default=str).decode() + "\n"
+
+    yield orjson.dumps({"record": "footer", "counts": counts}).decode() + "\n"
+
+
+def stream_ndjson_report(db, session_id: str) -> AsyncIterator[str]:
+    """JSON report as newline-delimited records (header, items, footer)"""
+    return _chunked(_ndjson_lines(db, session_id))
+
+
+async def _templated_lines(db, session_id: str, layout: Dict[str, Any]) -> AsyncIterator[str]:
+    yield layout["head"]({
+        "session_id": session_id,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+    yield layout["executions_start"]({})
+    total = 0
+    async for exe in session_cursor(db, "tool_executions", session_id):
+        total += 1
+        output = exe.get("output")
+        output_block = ""
+        if output:
+            output_block = layout["execution_output"]({"output": output.rstrip("\n"), "fence": code_fence(output)})
+        yield layout["execution"]({
+            "timestamp": exe.get("timestamp", "N/A"),
+            "tool_name": exe.get("tool_name", "Unknown"),
+            "status": exe.get("status", "N/A"),
+            "parameters": exe.get("parameters") or "",
+            "output_block": output_block,
+        })
+    yield layout["executions_end"]({"total": total})
+
+    yield layout["findings_start"]({})
+    type_counts = await _finding_type_counts(db, session_id)
+    current_type = None
+    async for finding in session_cursor(db, "findings", session_id, sort=[("type", 1), ("timestamp", 1)]):
+        if finding.get("type") not in FINDING_TYPES:
+            continue
+        if finding["type"] != current_type:
+            if current_type is not None:
+                yield layout["finding_section_end"]({})
+            current_type = finding["type"]
+            yield layout["finding_section"]({"type": current_type.upper(), "count": type_counts.get(current_type, 0)})
+        yield layout["finding"]({"summary": format_finding(finding)})
+    if current_type is not None:
+        yield layout["finding_section_end"]({})
+
+    yield layout["chat_start"]({})
+    async for message in session_cursor(db, "chat_messages", session_id):
+        yield layout["chat_message"]({
+            "role": message.get("role", ""),
+            "timestamp": message.get("timestamp", ""),
+            "content": message.get("content", ""),
+        })
+    yield layout["foot"]({})
+
+
+def stream_templated_report(db, session_id: str, format: str) -> AsyncIterator[str]:
+    """HTML or Markdown report rendered through the precompiled layout"""
+    return _chunked(_templated_lines(db, session_id, LAYOUTS[format]))
+
+
+def stream_report(db, session_id: str, format: str) -> AsyncIterator[str]:
+    if format == "json":
+        return stream_ndjson_report(db, session_id)
+    if format in LAYOUTS:
+        return stream_templated_report(db, session_id, format)
+    return stream_text_report(db, session_id)
+
+
+def normalize_format(format: str) -> str:
+    """Map a requested format onto a supported one (plain text by default)"""
+    return format if format in REPORT_MEDIA_TYPES else "txt"
+
+
+# ============ REPORT CACHE ============
+
+async def session_version(db, session_id: str) -> Optional[int]:
+    """Content version of a session, or None if the session isn't tracked"""
+    session = await db.sessions.find_one({"id": session_id}, {"_id": 0, "content_version": 1})
+    if session is None:
+        return None
+    return session.get("content_version", 0)
+
+
+def report_etag(session_id: str, format: str, version: int) -> str:
+    return f'"{session_id}.{format}.v{version}"'
+
+
+def cached_report_path(session_id: str, format: str, version: int) -> Path:
+    return REPORT_CACHE_DIR / session_id / f"v{version}.{format}"
+
+
+def drop_cached_reports(session_id: str):
+    """Remove every cached artifact of a session"""
+    if SAFE_SESSION_ID_RE.match(session_id):
+        shutil.rmtree(REPORT_CACHE_DIR / session_id, ignore_errors=True)
+
+
+async def _render_to_cache(db, session_id: str, format: str, version: int) -> AsyncIterator[str]:
+    # Tee the stream into a temp file; it only becomes the cached artifact if
+    # the session was not written to while rendering
+    path = cached_report_path(session_id, format, version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per render: concurrent renders of the same report must not share a temp file
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            async for chunk in stream_report(db, session_id, format):
+                f.write(chunk)
+                yield chunk
+        if await session_version(db, session_id) == version:
+            try:
+                os.replace(tmp_path, path)
+            except FileNotFoundError:   # the session's cache was dropped while rendering
+                return
+            for stale in path.parent.glob(f"v*.{format}"):
+                if stale != path:
+                    stale.unlink(missing_ok=True)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+async def report_body(db, session_id: str, format: str) -> Tuple[Optional[str], Optional[Path], AsyncIterator[str]]:
+    """Resolve a report to (etag, cached file, chunk stream)
+
+    When a cached artifact for the current content version exists its path
+    is returned and the stream reads from it; otherwise the report is
+    rendered and written through to the cache.
+    """
+    format = normalize_format(format)
+    version = await session_version(db, session_id) if SAFE_SESSION_ID_RE.match(session_id) else None
+    if version is None:
+        return None, None, stream_report(db, session_id, format)
+
+    path = cached_report_path(session_id, format, version)
+    if path.exists():
+        return report_etag(session_id, format, version), path, _read_file(path)
+    return report_etag(session_id, format, version), None, _render_to_cache(db, session_id, format, version)
+
+
+async def _read_file(path: Path) -> AsyncIterator[str]:
+    with open(path, encoding="utf-8") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def ndjson_to_report(text: str) -> Dict[str, Any]:
+    """Reassemble an NDJSON report into the nested JSON report shape"""
+    report = {"session_id": None, "generated_at": None, "tool_executions": [], "findings": [], "chat_history": []}
+    lists = {"tool_execution": "tool_executions", "finding": "findings", "chat_message": "chat_history"}
+    for line in text.splitlines():
+        if not line:
+            continue
+        record = orjson.loads(line)
+        kind = record.pop("record")
+        if kind == "header":
+            report.update(record)
+        elif kind in lists:
+            report[lists[kind]].append(record)
+    return report
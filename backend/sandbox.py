@@ -0,0 +1,753 @@
+"""Sandbox filesystem access.
+
+Every touch of the sandbox directory (path resolution, reads, writes,
+listings, recursive deletes) runs on a small dedicated thread pool, so a
+large wordlist read or a slow rmtree never stalls the event loop that
+serves chat and tool requests. Each operation has a timeout and is timed.
+"""
+import asyncio
+import base64
+import fnmatch
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from metrics import FILE_IO_SECONDS, FILE_IO_IN_FLIGHT
+from sandbox_storage import BlobStore
+
+SANDBOX_DIR = Path(os.environ.get('SANDBOX_DIR', '/tmp/pentest_sandbox'))
+
+# Content-addressed blobs behind every file written through the API (same
+# filesystem as the sandbox so they can be reflink-cloned into place)
+BLOB_DIR = Path(os.environ.get('SANDBOX_BLOB_DIR', '/tmp/pentest_sandbox_blobs'))
+SESSION_QUOTA_BYTES = int(os.environ.get('SANDBOX_SESSION_QUOTA', str(1024 ** 3)))
+
+# Partial uploads live next to (not inside) the sandbox so they never show in listings
+UPLOAD_DIR = Path(os.environ.get('SANDBOX_UPLOAD_DIR', '/tmp/pentest_sandbox_uploads'))
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_FLUSH_SIZE = 1024 * 1024
+PREVIEW_MAX_BYTES = 1024 * 1024
+PREVIEW_MAX_LINES = 5000
+LINE_INDEX_STRIDE = 1024
+
+LISTING_CACHE_SIZE = 256
+LISTING_CACHE_TTL = 30.0
+LISTING_MAX_LIMIT = 10000
+
+TREE_MAX_DEPTH = 8
+TREE_MAX_NODES = 10000
+
+SANDBOX_IO_WORKERS = int(os.environ.get('SANDBOX_IO_WORKERS', '8'))
+SANDBOX_IO_TIMEOUT = float(os.environ.get('SANDBOX_IO_TIMEOUT', '30'))
+
+# Seconds allowed per operation; recursive deletes and sandbox setup may take longer
+OPERATION_TIMEOUTS = {
+    "list": 10.0,
+    "preview": 10.0,
+    "delete": 4 * SANDBOX_IO_TIMEOUT,
+    "init": 2 * SANDBOX_IO_TIMEOUT,
+    "search": 2 * SANDBOX_IO_TIMEOUT,
+}
+
+# Opened on first use (normally during startup), so importing this module touches no disk
+BLOB_STORE: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    global BLOB_STORE
+    if BLOB_STORE is None:
+        with _blob_store_lock:
+            if BLOB_STORE is None:
+                BLOB_STORE = BlobStore(BLOB_DIR, SANDBOX_DIR, SESSION_QUOTA_BYTES)
+    return BLOB_STORE
+
+
+def close_blob_store():
+    global BLOB_STORE
+    with _blob_store_lock:
+        if BLOB_STORE is not None:
+            BLOB_STORE.close()
+            BLOB_STORE = None
+
+_executor = ThreadPoolExecutor(max_workers=SANDBOX_IO_WORKERS, thread_name_prefix="sandbox-io")
+
+
+class IOMetrics:
+    """Per-operation counters and timings for sandbox file I/O"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.operations: Dict[str, Dict[str, float]] = {}
+
+    def _entry(self, name: str) -> Dict[str, float]:
+        if name not in self.operations:
+            self.operations[name] = {"count": 0, "errors": 0, "timeouts": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        return self.operations[name]
+
+    def record(self, name: str, seconds: float, outcome: str = "ok"):
+        entry = self._entry(name)
+        entry["count"] += 1
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        if outcome == "error":
+            entry["errors"] += 1
+        elif outcome == "timeout":
+            entry["timeouts"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": SANDBOX_IO_WORKERS,
+            "in_flight": self.in_flight,
+            "operations": {
+                name: {**entry, "avg_seconds": entry["total_seconds"] / entry["count"] if entry["count"] else 0.0}
+                for name, entry in sorted(self.operations.items())
+            },
+        }
+
+
+IO_METRICS = IOMetrics()
+FILE_IO_IN_FLIGHT.set_function(lambda: IO_METRICS.in_flight)
+
+
+async def run_io(name: str, fn: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+    """Run blocking filesystem work on the sandbox pool with a timeout
+
+    Raises asyncio.TimeoutError when the operation (including time spent
+    queued for a worker) exceeds its budget. A queued call is dropped on
+    timeout; one already running finishes in the background.
+    """
+    timeout = timeout or OPERATION_TIMEOUTS.get(name, SANDBOX_IO_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    outcome = "ok"
+    IO_METRICS.in_flight += 1
+    try:
+        result = await asyncio.wait_for(loop.run_in_executor(_executor, fn, *args), timeout)
+        if isinstance(result, dict) and result.get("status") == "error":
+            outcome = "error"
+        return result
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        IO_METRICS.in_flight -= 1
+        elapsed = time.perf_counter() - started
+        IO_METRICS.record(name, elapsed, outcome)
+        FILE_IO_SECONDS.observe(elapsed, name, outcome)
+
+
+def shutdown_io_pool():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def resolve_sandbox_path(path: str) -> Path:
+    """Resolve a user supplied path inside the sandbox, or raise PermissionError"""
+    target_path = (SANDBOX_DIR / path.lstrip("/")).resolve()
+    root = SANDBOX_DIR.resolve()
+    if target_path != root and root not in target_path.parents:
+        raise PermissionError("Access denied: Path outside sandbox")
+    return target_path
+
+
+def sandbox_relative(target_path: Path) -> str:
+    """Normalized "/a/b" form of a resolved sandbox path (ledger key)"""
+    return "/" + target_path.relative_to(SANDBOX_DIR.resolve()).as_posix().lstrip(".")
+
+
+def _read(target_path: Path, path: str, content: Optional[str],
+          session_id: Optional[str]) -> Dict[str, Any]:
+    if target_path.exists():
+        return {"status": "success", "output": target_path.read_text()}
+    return {"status": "error", "output": f"File not found: {path}"}
+
+
+def _write(target_path: Path, path: str, content: Optional[str],
+           session_id: Optional[str]) -> Dict[str, Any]:
+    get_blob_store().put_bytes(sandbox_relative(target_path), target_path, (content or "").encode(), session_id)
+    notify_change(target_path)
+    return {"status": "success", "output": f"File written: {path}"}
+
+
+def _list(target_path: Path, path: str, content: Optional[str],
+          session_id: Optional[str]) -> Dict[str, Any]:
+    return list_directory(path)
+
+
+def _delete(target_path: Path, path: str, content: Optional[str],
+            session_id: Optional[str]) -> Dict[str, Any]:
+    if not target_path.exists():
+        return {"status": "error", "output": "File not found"}
+    if target_path.is_file():
+        target_path.unlink()
+    else:
+        shutil.rmtree(target_path)
+    get_blob_store().forget(sandbox_relative(target_path))
+    notify_change(target_path)
+    return {"status": "success", "output": f"Deleted: {path}"}
+
+
+def _execute(target_path: Path, path: str, content: Optional[str],
+             session_id: Optional[str]) -> Dict[str, Any]:
+    # Simulate script execution with safety
+    return {
+        "status": "success",
+        "output": f"[SIMULATED] Script execution: {path}\n[OUTPUT] Script ran successfully"
+    }
+
+
+FILE_OPERATIONS = {
+    "read": _read,
+    "write": _write,
+    "list": _list,
+    "delete": _delete,
+    "execute": _execute,
+}
+
+
+def sandbox_file_operation(operation: str, path: str, content: Optional[str] = None,
+                           session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Run one sandbox file operation synchronously (call through run_io)"""
+    SANDBOX_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        target_path = resolve_sandbox_path(path)
+    except PermissionError as e:
+        return {"status": "error", "output": str(e)}
+    except Exception as e:
+        return {"status": "error", "output": f"Invalid path: {str(e)}"}
+
+    handler = FILE_OPERATIONS.get(operation)
+    if handler is None:
+        return {"status": "error", "output": "Unknown operation"}
+    try:
+        return handler(target_path, path, content, session_id)
+    except Exception as e:
+        return {"status": "error", "output": str(e)}
+
+
+# Sample layout created on first use: relative path -> file content (None for a directory)
+SANDBOX_MANIFEST: Dict[str, Optional[str]] = {
+    "scans": None,
+    "results": None,
+    "scripts": None,
+    "wordlists": None,
+    "exploits": None,
+    "scans/nmap_results.txt": "# Nmap scan results\n# Run scans to populate",
+    "scripts/recon.sh": "#!/bin/bash\n# Reconnaissance script\necho 'Starting recon...'\nwhois $1\nnmap -sV $1",
+    "scripts/web_audit.sh": "#!/bin/bash\n# Web audit script\nnikto -h $1\ndirb http://$1",
+    "wordlists/common.txt": "admin\npassword\n123456\nroot\ntest\nuser\nguest\ndefault",
+    "wordlists/passwords.txt": "password\n123456\nadmin123\nletmein\nwelcome\npassword1",
+    "README.txt": "NEXUS Pentest Sandbox\n===================\nStore your scan results and scripts here.\n\nDirectories:\n- scans/: Store scan outputs\n- results/: Analysis results\n- scripts/: Custom scripts\n- wordlists/: Password lists\n- exploits/: Exploit code",
+}
+MANIFEST_HASH = hashlib.sha256(json.dumps(SANDBOX_MANIFEST, sort_keys=True).encode()).hexdigest()
+
+# Records which manifest the sandbox was last brought up to (kept beside the sandbox, not in listings)
+MANIFEST_STAMP = Path(os.environ.get('SANDBOX_MANIFEST_STAMP', str(SANDBOX_DIR) + '.manifest'))
+MANIFEST_RECHECK_SECONDS = 60.0
+
+_manifest_checked_at: Optional[float] = None
+
+
+def _read_stamp() -> Dict[str, Any]:
+    try:
+        return json.loads(MANIFEST_STAMP.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _sandbox_current() -> bool:
+    # Same manifest and the same sandbox directory (a wiped and recreated /tmp gets a new inode)
+    stamp = _read_stamp()
+    try:
+        inode = SANDBOX_DIR.stat().st_ino
+    except FileNotFoundError:
+        return False
+    return stamp.get("hash") == MANIFEST_HASH and stamp.get("inode") == inode
+
+
+def populate_sandbox() -> Dict[str, Any]:
+    """Create whatever the manifest lists that is missing; existing files are never rewritten"""
+    if _sandbox_current():
+        return {"status": "current", "created": []}
+    SANDBOX_DIR.mkdir(parents=True, exist_ok=True)
+    created = []
+    for rel, content in SANDBOX_MANIFEST.items():
+        target_path = SANDBOX_DIR / rel
+        try:
+            if content is None:
+                target_path.mkdir()
+            else:
+                # Exclusive create: never clobbers a user's edits or a racing worker's copy
+                with open(target_path, "x") as f:
+                    f.write(content)
+        except FileExistsError:
+            continue
+        created.append(rel)
+        notify_change(target_path)
+    tmp_path = MANIFEST_STAMP.with_name(f".{MANIFEST_STAMP.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({"hash": MANIFEST_HASH, "inode": SANDBOX_DIR.stat().st_ino}))
+    os.replace(tmp_path, MANIFEST_STAMP)
+    return {"status": "initialized", "created": created}
+
+
+async def ensure_sandbox() -> Dict[str, Any]:
+    """Bring the sandbox up to the manifest, skipping the pool entirely when recently verified"""
+    global _manifest_checked_at
+    now = time.monotonic()
+    if _manifest_checked_at is not None and now - _manifest_checked_at < MANIFEST_RECHECK_SECONDS:
+        return {"status": "current", "created": []}
+    result = await run_io("init", populate_sandbox)
+    _manifest_checked_at = now
+    return result
+
+
+# ============ DIRECTORY LISTING ============
+
+# One scandir pass per directory version: (name, is_dir, size, mtime), directories first then by name
+Entry = Tuple[str, bool, int, float]
+
+_listings: "OrderedDict[Path, Tuple[int, float, List[Entry]]]" = OrderedDict()
+_listings_lock = threading.Lock()
+
+
+# Called with the changed file or directory after every write through this module (e.g. search re-indexing)
+CHANGE_HOOKS: List[Callable[[Path], None]] = []
+
+
+def invalidate_listing(directory: Path):
+    """Forget a cached listing (in-place file changes don't bump the directory mtime)"""
+    with _listings_lock:
+        _listings.pop(directory, None)
+
+
+def notify_change(target_path: Path):
+    invalidate_listing(target_path.parent)
+    for hook in CHANGE_HOOKS:
+        hook(target_path)
+
+
+def _scan(directory: Path) -> List[Entry]:
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+                stat = entry.stat()
+            except OSError:
+                continue  # vanished or dangling symlink
+            entries.append((entry.name, is_dir, 0 if is_dir else stat.st_size, stat.st_mtime))
+    entries.sort(key=lambda e: (not e[1], e[0].lower(), e[0]))
+    return entries
+
+
+def scan_directory(directory: Path) -> List[Entry]:
+    """Entries of a directory, served from cache while its mtime is unchanged"""
+    mtime_ns = directory.stat().st_mtime_ns
+    now = time.monotonic()
+    with _listings_lock:
+        cached = _listings.get(directory)
+        if cached and cached[0] == mtime_ns and now - cached[1] < LISTING_CACHE_TTL:
+            _listings.move_to_end(directory)
+            return cached[2]
+    entries = _scan(directory)
+    with _listings_lock:
+        _listings[directory] = (mtime_ns, now, entries)
+        _listings.move_to_end(directory)
+        while len(_listings) > LISTING_CACHE_SIZE:
+            _listings.popitem(last=False)
+    return entries
+
+
+LISTING_SORT_KEYS = {
+    "name": None,  # cached order
+    "size": lambda e: e[2],
+    "mtime": lambda e: e[3],
+    "type": lambda e: (not e[1], os.path.splitext(e[0])[1].lower(), e[0].lower()),
+}
+
+
+def list_directory(path: str, sort: str = "name", order: str = "asc", offset: int = 0,
+                   limit: int = 1000, pattern: Optional[str] = None,
+                   type: Optional[str] = None) -> Dict[str, Any]:
+    """One page of a sandbox directory listing, filtered and sorted"""
+    target_path = resolve_sandbox_path(path)
+    if not target_path.is_dir():
+        return {"status": "error", "output": "Not a directory"}
+    if sort not in LISTING_SORT_KEYS:
+        return {"status": "error", "output": f"Unknown sort key: {sort}"}
+
+    entries = scan_directory(target_path)
+    if pattern:
+        matcher = re.compile(fnmatch.translate(pattern), re.IGNORECASE).match
+        entries = [e for e in entries if matcher(e[0])]
+    if type in ("file", "directory"):
+        want_dir = type == "directory"
+        entries = [e for e in entries if e[1] == want_dir]
+    if LISTING_SORT_KEYS[sort]:
+        entries = sorted(entries, key=LISTING_SORT_KEYS[sort], reverse=order == "desc")
+    elif order == "desc":
+        entries = entries[::-1]
+
+    offset = max(0, offset)
+    limit = max(1, min(limit, LISTING_MAX_LIMIT))
+    page = entries[offset:offset + limit]
+    return {
+        "status": "success",
+        "output": f"{len(page)} of {len(entries)} entries",
+        "path": path,
+        "items": [{"name": name, "type": "directory" if is_dir else "file", "size": size}
+                  for name, is_dir, size, _ in page],
+        "total": len(entries),
+        "offset": offset,
+        "limit": limit,
+    }
+
+
+# ============ TREE ============
+
+def _tree_token(path: str, offset: int = 0) -> str:
+    raw = json.dumps([path, offset], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_tree_token(token: str) -> Tuple[str, int]:
+    """Directory path and child offset encoded in an expansion token"""
+    try:
+        path, offset = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return str(path), max(0, int(offset))
+    except Exception:
+        raise ValueError("Invalid expansion token")
+
+
+def _glob_matcher(patterns: Optional[List[str]]):
+    if not patterns:
+        return None
+    regex = re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns), re.IGNORECASE)
+    return lambda name, rel: bool(regex.match(name) or regex.match(rel.lstrip("/")))
+
+
+def directory_tree(path: str = "/", depth: int = 2, max_nodes: int = 1000,
+                   include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Breadth-first subtree of the sandbox, capped by depth and node count
+
+    Directories that were not expanded (too deep, or over the node budget)
+    carry an `expand` token; a directory whose children were cut short
+    carries a `next` token. Passing either back as `cursor` continues from
+    there. `include` globs filter files, `exclude` globs prune files and
+    directories; both match the name or the sandbox-relative path.
+    """
+    offset = 0
+    if cursor:
+        path, offset = decode_tree_token(cursor)
+    path = "/" + path.strip("/")
+    target_path = resolve_sandbox_path(path)
+    if not target_path.is_dir():
+        return {"status": "error", "output": "Not a directory"}
+    depth = max(1, min(depth, TREE_MAX_DEPTH))
+    budget = max(1, min(max_nodes, TREE_MAX_NODES))
+    included, excluded = _glob_matcher(include), _glob_matcher(exclude)
+
+    root = {"name": target_path.name if path != "/" else "/", "path": path, "type": "directory", "children": []}
+    queue = [(target_path, root, 1, offset)]
+    nodes = 0
+    for index, (directory, node, level, start) in enumerate(queue):
+        if budget <= 0:
+            # Out of budget: everything still queued is left for expansion
+            for _, pending, _, pending_offset in queue[index:]:
+                pending.pop("children", None)
+                pending["expand"] = _tree_token(pending["path"], pending_offset)
+            break
+        entries = scan_directory(directory)
+        for position in range(start, len(entries)):
+            name, is_dir, size, _ = entries[position]
+            rel = f"{node['path'].rstrip('/')}/{name}"
+            if excluded and excluded(name, rel):
+                continue
+            if not is_dir and included and not included(name, rel):
+                continue
+            if budget <= 0:
+                node["next"] = _tree_token(node["path"], position)
+                break
+            budget -= 1
+            nodes += 1
+            child = {"name": name, "path": rel, "type": "directory" if is_dir else "file", "size": size}
+            node["children"].append(child)
+            if not is_dir:
+                continue
+            try:
+                child_path = resolve_sandbox_path(rel)
+            except PermissionError:
+                continue  # symlink out of the sandbox: listed, never walked
+            if level < depth:
+                child["children"] = []
+                queue.append((child_path, child, level + 1, 0))
+            else:
+                child["expand"] = _tree_token(rel)
+
+    return {
+        "status": "success",
+        "path": path,
+        "depth": depth,
+        "nodes": nodes,
+        "truncated": budget <= 0,
+        "tree": root,
+    }
+
+
+# ============ RANGED READS ============
+
+def sandbox_file(path: str) -> Tuple[Path, os.stat_result]:
+    """Resolve an existing regular file in the sandbox and stat it"""
+    target_path = resolve_sandbox_path(path)
+    if not target_path.is_file():
+        raise FileNotFoundError(f"File not found: {path}")
+    return target_path, target_path.stat()
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range "Range: bytes=a-b" header into inclusive (start, end)
+
+    Returns None when the header is absent or not a single byte range (the
+    whole file is served), raises ValueError when it cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+async def stream_file_range(target_path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive) of a file, read on the I/O pool"""
+    fd = await run_io("download", os.open, str(target_path), os.O_RDONLY)
+    try:
+        position = start
+        while position <= end:
+            chunk = await run_io("download", os.pread, fd, min(DOWNLOAD_CHUNK_SIZE, end - position + 1), position)
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+    finally:
+        await run_io("download", os.close, fd)
+
+
+class LineIndex:
+    """Sparse newline index of one file version (offset of every Nth line)"""
+
+    def __init__(self, size: int, mtime_ns: int):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.offsets = [0]      # offsets[i] is where line i * LINE_INDEX_STRIDE starts
+        self.complete = False
+        # Pool threads share indexes; only one may extend it (reads of existing slots need no lock)
+        self._lock = threading.Lock()
+
+    def seek_line(self, mm: mmap.mmap, line: int) -> int:
+        """Byte offset where `line` starts (the file size if past the end)"""
+        slot = line // LINE_INDEX_STRIDE
+        if len(self.offsets) <= slot and not self.complete:
+            with self._lock:
+                while len(self.offsets) <= slot and not self.complete:
+                    position = self.offsets[-1]
+                    for _ in range(LINE_INDEX_STRIDE):
+                        position = mm.find(b"\n", position) + 1
+                        if position == 0:
+                            self.complete = True
+                            break
+                    else:
+                        self.offsets.append(position)
+        if slot >= len(self.offsets):
+            return self.size
+        position = self.offsets[slot]
+        for _ in range(line - slot * LINE_INDEX_STRIDE):
+            position = mm.find(b"\n", position) + 1
+            if position == 0:
+                return self.size
+        return position
+
+
+_line_indexes: "OrderedDict[Path, LineIndex]" = OrderedDict()
+_line_indexes_lock = threading.Lock()
+
+
+def _line_index(target_path: Path, stat: os.stat_result) -> LineIndex:
+    with _line_indexes_lock:
+        index = _line_indexes.get(target_path)
+        if index is None or (index.size, index.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            index = _line_indexes[target_path] = LineIndex(stat.st_size, stat.st_mtime_ns)
+        _line_indexes.move_to_end(target_path)
+        while len(_line_indexes) > 64:
+            _line_indexes.popitem(last=False)
+        return index
+
+
+def read_window(path: str, offset: int = 0, length: int = 64 * 1024,
+                line: Optional[int] = None, lines: Optional[int] = None) -> Dict[str, Any]:
+    """Read a byte window, or a window of whole lines, from a sandbox file via mmap
+
+    With `line` set the window starts at that (0-based) line and covers up
+    to `lines` lines; otherwise it covers `length` bytes from `offset`.
+    Either way the window never exceeds PREVIEW_MAX_BYTES.
+    """
+    target_path, stat = sandbox_file(path)
+    size = stat.st_size
+    length = max(0, min(length, PREVIEW_MAX_BYTES))
+    result = {"status": "success", "path": path, "size": size}
+    if size == 0:
+        return {**result, "offset": 0, "length": 0, "next_offset": 0, "eof": True, "content": ""}
+
+    with open(target_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if line is not None:
+            lines = max(1, min(lines or 100, PREVIEW_MAX_LINES))
+            start = _line_index(target_path, stat).seek_line(mm, max(0, line))
+            end = start
+            for _ in range(lines):
+                if end >= size or end - start >= PREVIEW_MAX_BYTES:
+                    break
+                newline = mm.find(b"\n", end, min(size, start + PREVIEW_MAX_BYTES))
+                end = newline + 1 if newline != -1 else min(size, start + PREVIEW_MAX_BYTES)
+            result.update(line=max(0, line))
+        else:
+            start = min(max(0, offset), size)
+            end = min(size, start + length)
+        data = mm[start:end]
+
+    return {
+        **result,
+        "offset": start,
+        "length": len(data),
+        "next_offset": end,
+        "eof": end >= size,
+        "content": data.decode("utf-8", errors="replace"),
+    }
+
+
+# ============ RESUMABLE UPLOADS ============
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Uploads with no new data for this long are abandoned and swept
+UPLOAD_TTL = float(os.environ.get('SANDBOX_UPLOAD_TTL', str(24 * 3600)))
+UPLOAD_SWEEP_INTERVAL = 3600.0
+
+
+def _upload_paths(upload_id: str) -> Tuple[Path, Path]:
+    if not UPLOAD_ID_RE.match(upload_id):
+        raise FileNotFoundError("Unknown upload")
+    return UPLOAD_DIR / f"{upload_id}.json", UPLOAD_DIR / f"{upload_id}.part"
+
+
+def create_upload(path: str, size: int, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Start a resumable upload of `size` bytes to a sandbox path"""
+    target_path = resolve_sandbox_path(path)
+    if size < 0:
+        raise ValueError("Upload size must be non-negative")
+    get_blob_store().check_quota(sandbox_relative(target_path), size, session_id)
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path = _upload_paths(upload_id)
+    part_path.touch()
+    meta_path.write_text(json.dumps({"path": path, "size": size, "session_id": session_id, "created_at": time.time()}))
+    return upload_status(upload_id)
+
+
+def upload_status(upload_id: str) -> Dict[str, Any]:
+    """Progress of an upload: bytes received so far is the offset to resume from"""
+    meta_path, part_path = _upload_paths(upload_id)
+    if not meta_path.exists():
+        raise FileNotFoundError("Unknown upload")
+    meta = json.loads(meta_path.read_text())
+    return {"upload_id": upload_id, "path": meta["path"], "size": meta["size"],
+            "session_id": meta.get("session_id"), "offset": part_path.stat().st_size, "complete": False}
+
+
+def append_upload(upload_id: str, offset: int, chunks: List[bytes]) -> int:
+    """Append data at `offset`, which must equal the bytes already received"""
+    meta_path, part_path = _upload_paths(upload_id)
+    if not meta_path.exists():
+        raise FileNotFoundError("Unknown upload")
+    size = json.loads(meta_path.read_text())["size"]
+    with open(part_path, "r+b") as f:
+        received = f.seek(0, os.SEEK_END)
+        if offset != received:
+            raise UploadOffsetError(received)
+        if received + sum(len(c) for c in chunks) > size:
+            raise ValueError("Upload exceeds declared size")
+        f.writelines(chunks)
+        return f.tell()
+
+
+def finish_upload(upload_id: str) -> Dict[str, Any]:
+    """Move a fully received upload into place in the sandbox"""
+    status = upload_status(upload_id)
+    if status["offset"] != status["size"]:
+        return status
+    meta_path, part_path = _upload_paths(upload_id)
+    target_path = resolve_sandbox_path(status["path"])
+    get_blob_store().put_file(sandbox_relative(target_path), target_path, part_path, status["session_id"])
+    notify_change(target_path)
+    meta_path.unlink(missing_ok=True)
+    return {**status, "complete": True}
+
+
+def abort_upload(upload_id: str):
+    for p in _upload_paths(upload_id):
+        p.unlink(missing_ok=True)
+
+
+def sweep_uploads(max_age: float = UPLOAD_TTL) -> int:
+    """Remove uploads untouched for `max_age` seconds; returns how many were removed"""
+    try:
+        upload_ids = {name.partition(".")[0] for name in os.listdir(UPLOAD_DIR)}
+    except FileNotFoundError:
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for upload_id in upload_ids:
+        if not UPLOAD_ID_RE.match(upload_id):
+            continue
+        mtimes = []
+        for p in _upload_paths(upload_id):
+            try:
+                mtimes.append(p.stat().st_mtime)
+            except FileNotFoundError:
+                pass
+        # Appends touch the part file, so a resumed upload stays alive
+        if mtimes and max(mtimes) < cutoff:
+            abort_upload(upload_id)
+            removed += 1
+    return removed
+
+
+class UploadOffsetError(Exception):
+    """Chunk offset does not match the bytes already received"""
+
+    def __init__(self, received: int):
+        super().__init__(f"Expected offset {received}")
+        self.received = received
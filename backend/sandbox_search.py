@@ -0,0 +1,533 @@
+"""Full-text search over the sandbox, backed by an on-disk inverted index.
+
+Every text file under the sandbox is tokenized once into a SQLite postings
+table (token -> part, term frequency), where a part is a run of whole lines
+of a file; small files are a single part, big ones are split so no file is
+too large to index. The index is kept current by an incremental mtime/size
+scan, so unchanged files are never re-read, and paths reported as written
+are re-indexed on their own without walking the tree. A query is planned
+into index terms, the postings narrow it to candidate parts ranked by
+tf-idf, and only those parts are read to confirm matches and collect line
+context, one result page at a time.
+"""
+import fcntl
+import itertools
+import math
+import os
+import re
+import sqlite3
+import stat
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import re._parser as sre_parse
+    from re._constants import LITERAL, AT, AT_BOUNDARY
+except ImportError:  # Python < 3.11
+    import sre_parse
+    from sre_constants import LITERAL, AT, AT_BOUNDARY
+
+# Bumped whenever the on-disk layout changes so stale index files get rebuilt
+SCHEMA_VERSION = 3
+
+TOKEN_RE = re.compile(rb"[a-z0-9_]{2,64}")
+WORD_RE = re.compile(r"[a-z0-9_]+")
+
+READ_CHUNK_SIZE = 1024 * 1024
+BINARY_SNIFF_SIZE = 8192
+# A part ends at the first line break after this many bytes or distinct tokens
+PART_SIZE = 4 * READ_CHUNK_SIZE
+MAX_PART_TOKENS = 100_000
+REFRESH_INTERVAL = 5.0
+MAX_LINE_LENGTH = 500
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+CREATE TABLE files (
+    fid INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE TABLE parts (
+    pid INTEGER PRIMARY KEY,
+    fid INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE INDEX parts_fid ON parts (fid);
+CREATE TABLE postings (
+    token TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (token, pid)
+) WITHOUT ROWID;
+CREATE INDEX postings_pid ON postings (pid);
+CREATE TABLE tokens (token TEXT PRIMARY KEY) WITHOUT ROWID;
+"""
+
+# File kinds: "text" files have postings, "binary" files are never searched
+TEXT, BINARY = "text", "binary"
+
+# A part as stored and scanned: (byte offset, byte length, number of its first line)
+Part = Tuple[int, int, int]
+
+
+def _spans(parts: Optional[List[Part]]) -> List[Tuple[int, Optional[int], int]]:
+    # Adjacent parts are read as one span so line context flows across their boundary
+    if parts is None:
+        return [(0, None, 1)]
+    spans: List[Tuple[int, Optional[int], int]] = []
+    for offset, length, line in parts:
+        if spans and spans[-1][0] + spans[-1][1] == offset:
+            spans[-1] = (spans[-1][0], spans[-1][1] + length, spans[-1][2])
+        else:
+            spans.append((offset, length, line))
+    return spans
+
+
+def file_kind(path: Path) -> str:
+    with open(path, "rb") as f:
+        return BINARY if b"\0" in f.read(BINARY_SNIFF_SIZE) else TEXT
+
+
+def file_parts(path: Path) -> Iterator[Tuple[Part, Counter]]:
+    """Tokenize a text file in chunks into parts of whole lines and their token counts
+
+    Parts are yielded as they fill up, so memory stays bounded by the part
+    limits however large the file is. Every file yields at least one part.
+    """
+    counts: Counter = Counter()
+    start = position = newlines = 0
+    line = 1
+    carry = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            data = carry + chunk
+            if chunk:
+                # Hold back a trailing partial line (or at least a partial token) for the next chunk
+                cut = data.rfind(b"\n") + 1 or data.rfind(b" ") + 1 or len(data)
+                data, carry = data[:cut], data[cut:]
+            counts.update(TOKEN_RE.findall(data.lower()))
+            position += len(data)
+            newlines += data.count(b"\n")
+            if not chunk:
+                if position > start or not start:
+                    yield (start, position - start, line), counts
+                return
+            if data.endswith(b"\n") and (position - start >= PART_SIZE or len(counts) >= MAX_PART_TOKENS):
+                yield (start, position - start, line), counts
+                start, line, counts = position, newlines + 1, Counter()
+
+
+# How a query word relates to the indexed token it falls in
+EXACT, PREFIX, SUFFIX, CONTAINS = "exact", "prefix", "suffix", "contains"
+TERM_ORDER = {EXACT: 0, PREFIX: 1, SUFFIX: 2, CONTAINS: 3}
+
+
+def _literal_terms(text: str, firm_start: bool, firm_end: bool) -> List[Tuple[str, str]]:
+    # Words fully inside a literal are whole index tokens; a word touching an
+    # open end of the literal may continue in the file, so it only matches a
+    # prefix, suffix or substring of a token
+    terms = []
+    for match in WORD_RE.finditer(text.lower()):
+        word = match.group()
+        open_start = match.start() == 0 and not firm_start
+        open_end = match.end() == len(text) and not firm_end
+        mode = {(False, False): EXACT, (False, True): PREFIX,
+                (True, False): SUFFIX, (True, True): CONTAINS}[(open_start, open_end)]
+        if len(word) < (3 if open_start else 2) or len(word) > 64:
+            continue
+        terms.append((word, mode))
+    return terms
+
+
+def query_terms(query: str, regex: bool = False) -> List[Tuple[str, str]]:
+    """Index terms (word, mode) that every matching line must contain
+
+    An empty list means the query can't be narrowed and all files are
+    candidates.
+    """
+    if not regex:
+        terms = _literal_terms(query, False, False)
+        return sorted(terms, key=lambda term: (TERM_ORDER[term[1]], -len(term[0])))
+
+    try:
+        parsed = list(sre_parse.parse(query))
+    except Exception:
+        return []
+    terms, run, firm_start = [], [], False
+    for op, arg in parsed + [(None, None)]:
+        if op is LITERAL:
+            run.append(chr(arg))
+            continue
+        firm_end = op is AT and arg is AT_BOUNDARY
+        if run:
+            terms.extend(_literal_terms("".join(run), firm_start, firm_end))
+            run = []
+        firm_start = op is AT and arg is AT_BOUNDARY
+    # Most selective (and cheapest) lookups first
+    return sorted(terms, key=lambda term: (TERM_ORDER[term[1]], -len(term[0])))
+
+
+class SandboxSearch:
+    """Inverted index over the text files of one directory tree"""
+
+    def __init__(self, db_path: Path, root: Path, refresh_interval: float = REFRESH_INTERVAL):
+        self.db_path = Path(db_path)
+        self.root = Path(root)
+        self.refresh_interval = refresh_interval
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._refreshed_at = 0.0
+        self._dirty = True
+        # Sandbox-relative paths written since the last refresh
+        self._changed: Set[str] = set()
+        self._changed_lock = threading.Lock()
+        with self._writer() as conn:
+            self._ensure_schema(conn)
+
+    def close(self):
+        self._conn.close()
+
+    def mark_dirty(self, target_path: Optional[Path] = None):
+        """Re-index a written file or directory before the next search (hooked to sandbox writes)
+
+        Without a path, or with one outside the indexed tree, the next search
+        rescans the whole tree instead.
+        """
+        path = self._relative(target_path) if target_path is not None else None
+        if not path:
+            self._dirty = True
+            return
+        with self._changed_lock:
+            self._changed.add(path)
+
+    def _relative(self, target_path: Path) -> Optional[str]:
+        for root in (self.root, self.root.resolve()):
+            try:
+                path = Path(target_path).relative_to(root).as_posix()
+            except ValueError:
+                continue
+            return "" if path == "." else f"/{path}"
+        return None
+
+    @contextmanager
+    def _writer(self) -> Iterator[sqlite3.Connection]:
+        # One writer across worker processes; readers keep using the last
+        # committed snapshot while a rescan is in progress
+        with open(f"{self.db_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row and row[0] == str(SCHEMA_VERSION):
+            return
+        with self._transaction():
+            for table in ("tokens", "postings", "parts", "files", "meta"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            conn.execute("INSERT INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+    # ---- incremental indexing ----
+
+    def _walk(self, directory: Path, prefix: str) -> Dict[str, Tuple[int, int]]:
+        found = {}
+        stack = [(directory, prefix)]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append((entry.path, f"{prefix}/{entry.name}"))
+                            elif entry.is_file(follow_symlinks=False):
+                                stat_result = entry.stat(follow_symlinks=False)
+                                found[f"{prefix}/{entry.name}"] = (stat_result.st_size, stat_result.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return found
+
+    def _scope_files(self, scope: str) -> Dict[str, Tuple[int, int]]:
+        # Files at or under a sandbox-relative path ("" is the whole tree)
+        target = self.root / scope.lstrip("/")
+        try:
+            stat_result = os.lstat(target)
+        except OSError:
+            return {}
+        if stat.S_ISDIR(stat_result.st_mode):
+            return self._walk(target, scope)
+        if stat.S_ISREG(stat_result.st_mode):
+            return {scope: (stat_result.st_size, stat_result.st_mtime_ns)}
+        return {}
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """Re-index files whose size or mtime changed; drop deleted ones
+
+        The whole tree is rescanned when forced, every `refresh_interval`, or
+        after a change that couldn't be pinned to a path; otherwise only the
+        paths queued by `mark_dirty` are looked at.
+        """
+        if not (force or self._dirty or self._changed or time.monotonic() - self._refreshed_at >= self.refresh_interval):
+            return {"indexed": 0, "removed": 0}
+        with self._writer() as conn:
+            with self._changed_lock:
+                changed, self._changed = self._changed, set()
+            # Re-checked under the writer lock: another thread may just have finished a rescan
+            full = force or self._dirty or time.monotonic() - self._refreshed_at >= self.refresh_interval
+            if full:
+                self._dirty = False
+            totals = {"indexed": 0, "removed": 0}
+            for scope in [""] if full else sorted(changed):
+                indexed, removed = self._sync(conn, scope)
+                totals["indexed"] += indexed
+                totals["removed"] += removed
+            if full:
+                self._refreshed_at = time.monotonic()
+        return totals
+
+    def _sync(self, conn: sqlite3.Connection, scope: str) -> Tuple[int, int]:
+        found = self._scope_files(scope)
+        with self._lock:
+            if scope:
+                rows = conn.execute("SELECT fid, path, size, mtime_ns FROM files "
+                                    "WHERE path = ? OR (path >= ? AND path < ?)", (scope, f"{scope}/", f"{scope}0"))
+            else:
+                rows = conn.execute("SELECT fid, path, size, mtime_ns FROM files")
+            known = {path: (fid, size, mtime_ns) for fid, path, size, mtime_ns in rows}
+
+        removed = [(known[path][0],) for path in known.keys() - found.keys()]
+        if removed:
+            with self._transaction():
+                conn.executemany("DELETE FROM postings WHERE pid IN (SELECT pid FROM parts WHERE fid = ?)", removed)
+                conn.executemany("DELETE FROM parts WHERE fid = ?", removed)
+                conn.executemany("DELETE FROM files WHERE fid = ?", removed)
+
+        indexed = 0
+        for path, (size, mtime_ns) in found.items():
+            if path in known and known[path][1:] == (size, mtime_ns):
+                continue
+            try:
+                self._index_file(conn, path, size, mtime_ns)
+            except OSError:
+                continue
+            indexed += 1
+        return indexed, len(removed)
+
+    def _index_file(self, conn: sqlite3.Connection, path: str, size: int, mtime_ns: int):
+        full_path = self.root / path.lstrip("/")
+        kind = file_kind(full_path)
+        parts = file_parts(full_path) if kind == TEXT else iter(())
+        if size <= PART_SIZE:
+            # Tokenized up front so the one transaction per file stays short
+            parts = list(parts)
+            with self._transaction():
+                fid = self._reset_file(conn, path, size, mtime_ns, kind)
+                for part, counts in parts:
+                    self._insert_part(conn, fid, part, counts)
+            return
+        # A transaction per part keeps readers unblocked while a big file is
+        # indexed. The row gets its real size and mtime last, so an
+        # interrupted run is redone by the next scan.
+        with self._transaction():
+            fid = self._reset_file(conn, path, -1, -1, kind)
+        for part, counts in parts:
+            with self._transaction():
+                self._insert_part(conn, fid, part, counts)
+        with self._transaction():
+            conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE fid = ?", (size, mtime_ns, fid))
+
+    def _reset_file(self, conn: sqlite3.Connection, path: str, size: int, mtime_ns: int, kind: str) -> int:
+        fid = conn.execute(
+            "INSERT INTO files (path, size, mtime_ns, kind) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, "
+            "mtime_ns = excluded.mtime_ns, kind = excluded.kind RETURNING fid",
+            (path, size, mtime_ns, kind),
+        ).fetchone()[0]
+        conn.execute("DELETE FROM postings WHERE pid IN (SELECT pid FROM parts WHERE fid = ?)", (fid,))
+        conn.execute("DELETE FROM parts WHERE fid = ?", (fid,))
+        return fid
+
+    def _insert_part(self, conn: sqlite3.Connection, fid: int, part: Part, counts: Counter):
+        pid = conn.execute("INSERT INTO parts (fid, offset, length, line) VALUES (?, ?, ?, ?)",
+                           (fid, *part)).lastrowid
+        tokens = [token.decode() for token in counts]
+        conn.executemany("INSERT INTO postings (token, pid, tf) VALUES (?, ?, ?)",
+                         zip(tokens, itertools.repeat(pid), counts.values()))
+        # Vocabulary for suffix/substring terms; stale words only cost a lookup
+        conn.executemany("INSERT OR IGNORE INTO tokens (token) VALUES (?)", ((t,) for t in tokens))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = dict(self._conn.execute("SELECT kind, COUNT(*) FROM files GROUP BY kind").fetchall())
+            parts = self._conn.execute("SELECT COUNT(*) FROM parts").fetchone()[0]
+            tokens = self._conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+        return {"files": sum(kinds.values()), "by_kind": kinds, "parts": parts, "postings": tokens,
+                "index_bytes": self.db_path.stat().st_size}
+
+    # ---- querying ----
+
+    def _postings(self, word: str, mode: str) -> List[Tuple[int, int]]:
+        if mode == EXACT:
+            return self._conn.execute("SELECT pid, tf FROM postings WHERE token = ?", (word,)).fetchall()
+        if mode == PREFIX:
+            return self._conn.execute(
+                "SELECT pid, SUM(tf) FROM postings WHERE token >= ? AND token < ? GROUP BY pid",
+                (word, word + "\x7f")).fetchall()
+        vocabulary = ("SELECT token FROM tokens WHERE substr(token, -?1) = ?2" if mode == SUFFIX
+                      else "SELECT token FROM tokens WHERE instr(token, ?2) > 0")
+        return self._conn.execute(
+            f"SELECT pid, SUM(tf) FROM postings WHERE token IN ({vocabulary}) GROUP BY pid",
+            (len(word), word)).fetchall()
+
+    def _candidates(self, terms: List[Tuple[str, str]],
+                    path_prefix: str) -> List[Tuple[str, float, Optional[List[Part]]]]:
+        # (path, score, parts to read); parts is None when the whole file must be read
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                total = self._conn.execute("SELECT COUNT(*) FROM parts").fetchone()[0]
+                scores: Optional[Dict[int, float]] = None
+                for word, mode in terms:
+                    rows = self._postings(word, mode)
+                    idf = math.log(1 + total / (len(rows) or 1))
+                    term_scores = {pid: idf * (1 + math.log(tf)) for pid, tf in rows}
+                    if scores is None:
+                        scores = term_scores
+                    else:
+                        scores = {pid: s + term_scores[pid] for pid, s in scores.items() if pid in term_scores}
+                    if not scores:
+                        break
+
+                if scores is None:
+                    rows = self._conn.execute("SELECT path FROM files WHERE kind = ?", (TEXT,)).fetchall()
+                elif scores:
+                    rows = self._conn.execute(
+                        "SELECT p.pid, f.path, p.offset, p.length, p.line FROM parts p JOIN files f USING (fid) "
+                        f"WHERE p.pid IN ({','.join('?' * len(scores))})", tuple(scores)).fetchall()
+                else:
+                    rows = []
+            finally:
+                self._conn.execute("COMMIT")
+
+        prefix = path_prefix.rstrip("/") + "/"
+        in_scope = (lambda path: True) if path_prefix in ("", "/") else (lambda path: path.startswith(prefix))
+        if scores is None:
+            ranked = [(path, 0.0, None) for path, in rows if in_scope(path)]
+        else:
+            files: Dict[str, Tuple[float, List[Part]]] = {}
+            for pid, path, offset, length, line in rows:
+                if in_scope(path):
+                    score, parts = files.get(path, (0.0, []))
+                    parts.append((offset, length, line))
+                    files[path] = (score + scores[pid], parts)
+            ranked = [(path, score, sorted(parts)) for path, (score, parts) in files.items()]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked
+
+    def _file_hits(self, path: str, pattern: re.Pattern, context: int, max_lines: int,
+                   parts: Optional[List[Part]] = None) -> Optional[Dict[str, Any]]:
+        matches: List[Dict[str, Any]] = []
+        count, stopped = 0, False
+        try:
+            with open(self.root / path.lstrip("/"), "rb") as f:
+                for offset, length, number in _spans(parts):
+                    f.seek(offset)
+                    remaining = length
+                    before = deque(maxlen=context)
+                    pending: List[Dict[str, Any]] = []   # matches still collecting trailing context
+                    while remaining is None or remaining > 0 or pending:
+                        raw = f.readline()
+                        if not raw:
+                            break
+                        line = raw.rstrip(b"\r\n").decode("utf-8", errors="replace")[:MAX_LINE_LENGTH]
+                        for hit in pending:
+                            hit["after"].append(line)
+                        pending = [hit for hit in pending if len(hit["after"]) < context]
+                        if remaining is not None:
+                            if remaining <= 0:
+                                continue   # trailing context only: lines outside candidate parts can't match
+                            remaining -= len(raw)
+                        if pattern.search(line):
+                            count += 1
+                            if len(matches) < max_lines:
+                                hit = {"line": number, "text": line, "before": list(before), "after": []}
+                                matches.append(hit)
+                                if context:
+                                    pending.append(hit)
+                            elif not pending:
+                                stopped = True
+                                break
+                        before.append(line)
+                        number += 1
+                    if stopped:
+                        break
+        except OSError:
+            return None
+        if not count:
+            return None
+        return {"path": path, "match_count": count, "truncated": stopped or count > len(matches),
+                "matches": matches}
+
+    def search(self, query: str, regex: bool = False, case_sensitive: bool = False, path: str = "/",
+               offset: int = 0, limit: int = 20, context: int = 2, max_lines: int = 20) -> Dict[str, Any]:
+        """Ranked, paginated file hits for a literal or regex query
+
+        Candidate files come from the index in rank order and are read only
+        until the requested page (plus one, to report has_more) is filled.
+        """
+        self.refresh()
+        flags = 0 if case_sensitive else re.IGNORECASE
+        pattern = re.compile(query if regex else re.escape(query), flags)
+        candidates = self._candidates(query_terms(query, regex), path)
+
+        hits, seen = [], 0
+        for candidate, score, parts in candidates:
+            hit = self._file_hits(candidate, pattern, context, max_lines, parts)
+            if hit is None:
+                continue
+            seen += 1
+            if seen <= offset:
+                continue
+            if len(hits) == limit:
+                break
+            hits.append({**hit, "score": round(score, 3)})
+        return {
+            "query": query,
+            "regex": regex,
+            "hits": hits,
+            "offset": offset,
+            "limit": limit,
+            "has_more": seen > offset + len(hits),
+            "candidates": len(candidates),
+        }
@@ -0,0 +1,279 @@
+"""Content-addressed, deduplicated storage for sandbox files.
+
+Where the filesystem supports reflinks, file contents written through the
+API are stored once as read-only blobs named by their SHA-256, and each
+sandbox path gets its own copy-on-write clone of its blob. Tools can write
+to their files freely without touching the blob or any other copy, and
+saving the same scan output or wordlist again costs no extra disk. Support
+is probed when the store opens; without it a blob could only be shared by
+copying it, so files are written straight to their paths and no blobs are
+kept.
+
+A small SQLite ledger records which session owns each path, its digest and
+whether its data is shared with a blob. It drives per-session quotas and
+the usage report, both in real disk bytes: a session is charged once per
+distinct blob its shared files reference, plus the full size of every
+unshared file. Blobs are reclaimed as soon as no path refers to them.
+Writes that don't name a session are charged to one anonymous bucket.
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+FICLONE = 0x40049409   # linux/fs.h: share the source's extents, copy-on-write
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    shared INTEGER NOT NULL DEFAULT 1
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_session ON files (session_id, digest);
+CREATE INDEX IF NOT EXISTS files_digest ON files (digest);
+"""
+
+
+class QuotaExceededError(Exception):
+    """A write would take a session over its storage quota"""
+
+
+# Ledger bucket for writes that don't name a session (reported as session None)
+ANONYMOUS_SESSION = ""
+
+
+def clone_file(source: Path, target: Path) -> bool:
+    """Copy-on-write clone of source where the filesystem supports it, else a plain copy
+
+    Returns whether the clone shares its data with source.
+    """
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return True
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+    return False
+
+
+def reflinks_supported(source_dir: Path, target_dir: Path) -> bool:
+    """Whether files in source_dir can be cloned into target_dir without copying their data"""
+    token = uuid.uuid4().hex
+    source, target = source_dir / f".reflink-probe.{token}", target_dir / f".reflink-probe.{token}"
+    try:
+        source.write_bytes(b"probe")
+        return clone_file(source, target)
+    except OSError:
+        return False
+    finally:
+        source.unlink(missing_ok=True)
+        target.unlink(missing_ok=True)
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Hash-named blobs cloned into a sandbox tree, with a usage ledger"""
+
+    def __init__(self, blob_dir: Path, sandbox_dir: Path, quota_bytes: int, reflinks: Optional[bool] = None):
+        self.blob_dir = Path(blob_dir)
+        self.sandbox_dir = Path(sandbox_dir)
+        self.quota_bytes = quota_bytes
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.sandbox_dir.mkdir(parents=True, exist_ok=True)
+        self.reflinks = reflinks_supported(self.blob_dir, self.sandbox_dir) if reflinks is None else reflinks
+        self._conn = sqlite3.connect(str(self.blob_dir / "ledger.sqlite"), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        if "shared" not in {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}:
+            # Ledgers from before sharing was tracked: assume what this filesystem does
+            self._conn.execute(f"ALTER TABLE files ADD COLUMN shared INTEGER NOT NULL DEFAULT {int(self.reflinks)}")
+        self._lock = threading.RLock()
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE serializes quota checks and ledger updates across workers
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def _charged(self, conn: sqlite3.Connection, session_id: str) -> int:
+        # Once per distinct blob behind shared files, in full for every private copy
+        return conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM "
+            "        (SELECT DISTINCT digest, size FROM files WHERE session_id = ?1 AND shared)) "
+            "     + (SELECT COALESCE(SUM(size), 0) FROM files WHERE session_id = ?1 AND NOT shared)",
+            (session_id,)).fetchone()[0]
+
+    def _check_quota(self, conn: sqlite3.Connection, rel: str, session_id: str, digest: str, size: int):
+        # The session's charge with `rel` taken out and the new content put in
+        def cost(d: str, d_size: int, shared: bool) -> int:
+            if shared and conn.execute("SELECT 1 FROM files WHERE session_id = ? AND digest = ? AND shared "
+                                       "AND path != ? LIMIT 1", (session_id, d, rel)).fetchone():
+                return 0
+            return d_size
+
+        charged = self._charged(conn, session_id)
+        old = conn.execute("SELECT session_id, digest, size, shared FROM files WHERE path = ?", (rel,)).fetchone()
+        if old and old[0] == session_id:
+            charged -= cost(old[1], old[2], old[3])
+        charged += cost(digest, size, self.reflinks)
+        if charged > self.quota_bytes:
+            raise QuotaExceededError(
+                f"Sandbox quota exceeded for session: {charged} of {self.quota_bytes} bytes")
+
+    @staticmethod
+    def _place(target_path: Path, write: Callable[[Path], Any]) -> Any:
+        # Written under a temporary name and renamed over the target, so readers never see a partial file
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target_path.with_name(f".{target_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            result = write(tmp_path)
+            os.replace(tmp_path, target_path)
+            return result
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _release(self, conn: sqlite3.Connection, digest: str):
+        # A blob is only worth keeping while some file shares its data
+        if conn.execute("SELECT 1 FROM files WHERE digest = ? AND shared LIMIT 1", (digest,)).fetchone():
+            return
+        self.blob_path(digest).unlink(missing_ok=True)
+        conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+
+    def _store(self, rel: str, target_path: Path, session_id: Optional[str], digest: str, size: int,
+               materialize: Callable[[Path], None]):
+        # `materialize` writes the content to the path it is given
+        session_id = session_id or ANONYMOUS_SESSION
+        with self._transaction() as conn:
+            self._check_quota(conn, rel, session_id, digest, size)
+            if self.reflinks:
+                blob = self.blob_path(digest)
+                if not blob.exists():
+                    blob.parent.mkdir(exist_ok=True)
+                    self._place(blob, lambda tmp_path: self._seal(tmp_path, materialize))
+                conn.execute("INSERT OR IGNORE INTO blobs (digest, size) VALUES (?, ?)", (digest, size))
+                # The clone is a file of its own: writing to it never reaches the blob
+                shared = self._place(target_path, lambda tmp_path: clone_file(blob, tmp_path))
+            else:
+                self._place(target_path, materialize)
+                shared = False
+            old = conn.execute("SELECT digest FROM files WHERE path = ?", (rel,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO files (path, session_id, digest, size, shared) "
+                         "VALUES (?, ?, ?, ?, ?)", (rel, session_id, digest, size, bool(shared)))
+            if old and old[0] != digest:
+                self._release(conn, old[0])
+            if not shared:
+                self._release(conn, digest)
+
+    @staticmethod
+    def _seal(tmp_path: Path, materialize: Callable[[Path], None]):
+        # Blobs are immutable; sandbox paths get writable clones of them
+        materialize(tmp_path)
+        os.chmod(tmp_path, 0o444)
+
+    def put_bytes(self, rel: str, target_path: Path, data: bytes, session_id: Optional[str] = None):
+        """Store `data` at a sandbox path, sharing a blob with identical content where reflinks allow"""
+        self._store(rel, target_path, session_id, hashlib.sha256(data).hexdigest(), len(data),
+                    lambda path: path.write_bytes(data))
+
+    def put_file(self, rel: str, target_path: Path, source: Path, session_id: Optional[str] = None):
+        """Move a fully written file (e.g. a finished upload) into storage at a sandbox path"""
+        digest = file_digest(source)
+        try:
+            self._store(rel, target_path, session_id, digest, source.stat().st_size,
+                        lambda path: shutil.move(source, path))
+        finally:
+            source.unlink(missing_ok=True)
+
+    def check_quota(self, rel: str, size: int, session_id: Optional[str] = None):
+        """Raise QuotaExceededError if `size` new bytes would not fit (pessimistic: no dedup)"""
+        session_id = session_id or ANONYMOUS_SESSION
+        with self._lock:
+            charged = self._charged(self._conn, session_id)
+        if charged + size > self.quota_bytes:
+            raise QuotaExceededError(
+                f"Sandbox quota exceeded for session: {charged + size} of {self.quota_bytes} bytes")
+
+    def forget(self, rel: str):
+        """Drop ledger entries at or below a sandbox path (after it was deleted) and reclaim blobs"""
+        prefix = rel.rstrip("/") + "/"
+        with self._transaction() as conn:
+            digests = [row[0] for row in conn.execute(
+                "SELECT DISTINCT digest FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+                (rel, len(prefix), prefix))]
+            conn.execute("DELETE FROM files WHERE path = ? OR substr(path, 1, ?) = ?", (rel, len(prefix), prefix))
+            for digest in digests:
+                self._release(conn, digest)
+
+    def usage(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Per-session logical vs charged bytes, plus physical totals
+
+        `session_id` narrows the report to one session; pass ANONYMOUS_SESSION
+        for writes that named none.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                query = ("SELECT session_id, COUNT(*), SUM(size), COUNT(DISTINCT digest) FROM files"
+                         + (" WHERE session_id = ?" if session_id is not None else "")
+                         + " GROUP BY session_id ORDER BY session_id")
+                rows = self._conn.execute(query, (session_id,) if session_id is not None else ()).fetchall()
+                sessions = [
+                    {
+                        "session_id": sid or None,
+                        "files": files,
+                        "logical_bytes": logical,
+                        "unique_blobs": blobs,
+                        "charged_bytes": self._charged(self._conn, sid),
+                        "quota_bytes": self.quota_bytes,
+                    }
+                    for sid, files, logical, blobs in rows
+                ]
+                physical_blobs, physical = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+                physical += self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM files WHERE NOT shared").fetchone()[0]
+                logical_total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+            finally:
+                self._conn.execute("COMMIT")
+        for entry in sessions:
+            entry["quota_used_pct"] = round(100 * entry["charged_bytes"] / self.quota_bytes, 2) if self.quota_bytes else None
+        return {
+            "sessions": sessions,
+            "reflinks": self.reflinks,
+            "blobs": physical_blobs,
+            "physical_bytes": physical,
+            "logical_bytes": logical_total,
+            "dedup_saved_bytes": logical_total - physical,
+        }
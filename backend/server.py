@@ -1,31 +1,68 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Body, Query, Request, Response
 from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse, FileResponse, ORJSONResponse
+from fastapi.encoders import jsonable_encoder
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Dict, Any
 import uuid
+import threading
 from datetime import datetime, timezone
 import json
+import re
 import subprocess
 import asyncio
-
+import heapq
+import itertools
+import time
+import hmac
+import orjson
+from contextlib import asynccontextmanager
+
+# Load .env before the sibling modules: they read their settings from the environment when imported
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# LLM Integration
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from vulndb import open_store, apply_delta
+from findings import extract_findings, finding_documents, FINDING_TYPES
+from sandbox import (run_io, sandbox_file_operation, ensure_sandbox, shutdown_io_pool, sandbox_file, parse_range,
+                     stream_file_range, read_window, list_directory, directory_tree, create_upload,
+                     upload_status, append_upload, finish_upload, abort_upload, sweep_uploads, UploadOffsetError,
+                     FILE_OPERATIONS, IO_METRICS, UPLOAD_FLUSH_SIZE, SANDBOX_DIR,
+                     CHANGE_HOOKS, UPLOAD_SWEEP_INTERVAL, get_blob_store, close_blob_store)
+from sandbox_search import SandboxSearch
+from sandbox_storage import QuotaExceededError
+from metrics import (MetricsMiddleware, mongo_command_listener, LLM_REQUEST_SECONDS, LLM_TOKENS, TOOL_SIMULATION_SECONDS,
+                     CONTENT_TYPE as METRICS_CONTENT_TYPE, estimate_tokens, render as render_metrics)
+from compression import CompressionMiddleware, etag_matches
+from coalesce import ReadCoalescer
+from history_cache import HistoryCache, HISTORY_CONTEXT_MESSAGES
+from idempotency import (IdempotencyStore, IdempotencyKeyReused, IdempotencyInProgress, IDEMPOTENCY_TTL,
+                         MAX_KEY_LENGTH, REPLAYED_HEADER)
+from profiling import ProfilingMiddleware, PROFILE_TOKEN, profile_path, token_matches
+from reports import report_body, ndjson_to_report, drop_cached_reports, normalize_format, REPORT_MEDIA_TYPES
+
+# MongoDB connection, opened by the app lifespan (Motor/pymongo are imported only then)
+client = None
+db = None
+
+# LLM Integration, imported on first use (see llm_classes)
+LlmChat = None
+UserMessage = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
 
-# Create the main app without a prefix
-app = FastAPI()
+# Create the main app without a prefix (orjson for every JSON response)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -81,6 +118,7 @@ class FileOperation(BaseModel):
     operation: str  # "read", "write", "list", "delete", "execute"
     path: str
     content: Optional[str] = None
+    session_id: Optional[str] = None  # owner charged for written content (an anonymous bucket if unset)
 
 class Session(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -89,6 +127,7 @@ class Session(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     message_count: int = 0
+    content_version: int = 0  # bumped by chat, tool and workflow writes
 
 # ============ KALI TOOLS DEFINITIONS ============
 
@@ -279,6 +318,10 @@ def get_all_tools():
         all_tools.extend(tools)
     return all_tools
 
+# The catalogues never change at runtime, so they are serialized once
+TOOL_CATALOG_JSON = orjson.dumps({"tools": KALI_TOOLS, "categories": list(KALI_TOOLS.keys())})
+WORKFLOW_CATALOG_JSON = orjson.dumps({"workflows": SCAN_WORKFLOWS})
+
 def simulate_tool_execution(tool_name: str, params: Dict[str, Any]) -> Dict[str, Any]:
     """Simulate Kali tool execution with realistic output"""
     import time
@@ -940,73 +983,39 @@ Password: Oracle_SYS_123
 
 async def execute_file_operation(operation: FileOperation) -> Dict[str, Any]:
     """Execute file system operations for MCP file access"""
-    sandbox_dir = Path("/tmp/pentest_sandbox")
-    sandbox_dir.mkdir(exist_ok=True)
-    
-    # Normalize path to stay within sandbox
+    # All filesystem work happens on the sandbox I/O pool, never on the event loop
+    name = operation.operation if operation.operation in FILE_OPERATIONS else "unknown"
     try:
-        target_path = (sandbox_dir / operation.path.lstrip("/")).resolve()
-        if not str(target_path).startswith(str(sandbox_dir)):
-            return {"status": "error", "output": "Access denied: Path outside sandbox"}
-    except Exception as e:
-        return {"status": "error", "output": f"Invalid path: {str(e)}"}
-    
-    if operation.operation == "read":
-        try:
-            if target_path.exists():
-                content = target_path.read_text()
-                return {"status": "success", "output": content}
-            else:
-                return {"status": "error", "output": f"File not found: {operation.path}"}
-        except Exception as e:
-            return {"status": "error", "output": str(e)}
-    
-    elif operation.operation == "write":
-        try:
-            target_path.parent.mkdir(parents=True, exist_ok=True)
-            target_path.write_text(operation.content or "")
-            return {"status": "success", "output": f"File written: {operation.path}"}
-        except Exception as e:
-            return {"status": "error", "output": str(e)}
-    
-    elif operation.operation == "list":
-        try:
-            if target_path.is_dir():
-                items = []
-                for item in target_path.iterdir():
-                    items.append({
-                        "name": item.name,
-                        "type": "directory" if item.is_dir() else "file",
-                        "size": item.stat().st_size if item.is_file() else 0
-                    })
-                return {"status": "success", "output": json.dumps(items, indent=2), "items": items}
-            else:
-                return {"status": "error", "output": "Not a directory"}
-        except Exception as e:
-            return {"status": "error", "output": str(e)}
-    
-    elif operation.operation == "delete":
-        try:
-            if target_path.exists():
-                if target_path.is_file():
-                    target_path.unlink()
-                else:
-                    import shutil
-                    shutil.rmtree(target_path)
-                return {"status": "success", "output": f"Deleted: {operation.path}"}
-            else:
-                return {"status": "error", "output": "File not found"}
-        except Exception as e:
-            return {"status": "error", "output": str(e)}
-    
-    elif operation.operation == "execute":
-        # Simulate script execution with safety
-        return {
-            "status": "success", 
-            "output": f"[SIMULATED] Script execution: {operation.path}\n[OUTPUT] Script ran successfully"
-        }
-    
-    return {"status": "error", "output": "Unknown operation"}
+        return await run_io(name, sandbox_file_operation, operation.operation, operation.path, operation.content,
+                            operation.session_id)
+    except asyncio.TimeoutError:
+        return {"status": "error", "output": f"File operation timed out: {operation.operation}"}
+
+# Full-text index over the sandbox, rescanned incrementally before searches.
+# Opened on first use (normally during startup), so importing the app touches no disk
+SANDBOX_SEARCH = None
+_sandbox_search_lock = threading.Lock()
+
+def get_sandbox_search() -> SandboxSearch:
+    global SANDBOX_SEARCH
+    if SANDBOX_SEARCH is None:
+        with _sandbox_search_lock:
+            if SANDBOX_SEARCH is None:
+                search = SandboxSearch(
+                    Path(os.environ.get('SANDBOX_SEARCH_DB', '/tmp/nexus_sandbox_search.sqlite')),
+                    SANDBOX_DIR,
+                )
+                CHANGE_HOOKS.append(search.mark_dirty)
+                SANDBOX_SEARCH = search
+    return SANDBOX_SEARCH
+
+def close_sandbox_search():
+    global SANDBOX_SEARCH
+    with _sandbox_search_lock:
+        if SANDBOX_SEARCH is not None:
+            CHANGE_HOOKS.remove(SANDBOX_SEARCH.mark_dirty)
+            SANDBOX_SEARCH.close()
+            SANDBOX_SEARCH = None
 
 # ============ LLM CHAT SETUP ============
 
@@ -1046,6 +1055,27 @@ Example flow for "scan example.com":
 
 You operate in a sandboxed environment - all tool executions are simulated but realistic."""
 
+LLM_MODEL = "gpt-5.2"
+
+def llm_classes():
+    """Import the LLM client on first use; it is by far the heaviest dependency"""
+    global LlmChat, UserMessage
+    if LlmChat is None:
+        from emergentintegrations.llm.chat import LlmChat
+    if UserMessage is None:
+        from emergentintegrations.llm.chat import UserMessage
+    return LlmChat, UserMessage
+
+def parse_tool_calls(response: str) -> Optional[List[Dict[str, str]]]:
+    """Extract `EXECUTE_TOOL:` lines from an LLM response"""
+    tool_calls = []
+    if "EXECUTE_TOOL:" in response:
+        # Simple tool call detection
+        for line in response.split('\n'):
+            if "EXECUTE_TOOL:" in line:
+                tool_calls.append({"raw": line.replace("EXECUTE_TOOL:", "").strip()})
+    return tool_calls or None
+
 async def get_llm_response(session_id: str, user_message: str, history: List[Dict]) -> Dict[str, Any]:
     """Get response from LLM with context"""
     try:
@@ -1053,11 +1083,12 @@ async def get_llm_response(session_id: str, user_message: str, history: List[Dic
         if not api_key:
             return {"response": "LLM API key not configured", "tool_calls": None}
         
-        chat = LlmChat(
+        chat_class, message_class = llm_classes()
+        chat = chat_class(
             api_key=api_key,
             session_id=session_id,
             system_message=SYSTEM_PROMPT
-        ).with_model("openai", "gpt-5.2")
+        ).with_model("openai", LLM_MODEL)
         
         # Build context from recent history
         context = ""
@@ -1068,20 +1099,18 @@ async def get_llm_response(session_id: str, user_message: str, history: List[Dic
         # Add current message with context
         full_message = f"Previous conversation:\n{context}\n\nCurrent request: {user_message}"
         
-        message = UserMessage(text=full_message)
-        response = await chat.send_message(message)
-        
-        # Parse for tool calls in response
-        tool_calls = []
-        if "EXECUTE_TOOL:" in response:
-            # Simple tool call detection
-            lines = response.split('\n')
-            for line in lines:
-                if "EXECUTE_TOOL:" in line:
-                    tool_info = line.replace("EXECUTE_TOOL:", "").strip()
-                    tool_calls.append({"raw": tool_info})
+        message = message_class(text=full_message)
+        started = time.perf_counter()
+        try:
+            response = await chat.send_message(message)
+        except Exception:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, LLM_MODEL, "error")
+            raise
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, LLM_MODEL, "ok")
+        LLM_TOKENS.observe(estimate_tokens(full_message), LLM_MODEL, "prompt")
+        LLM_TOKENS.observe(estimate_tokens(response), LLM_MODEL, "completion")
         
-        return {"response": response, "tool_calls": tool_calls if tool_calls else None}
+        return {"response": response, "tool_calls": parse_tool_calls(response)}
     except Exception as e:
         logger.error(f"LLM error: {str(e)}")
         return {"response": f"Error communicating with AI: {str(e)}", "tool_calls": None}
@@ -1109,16 +1138,54 @@ async def get_status_checks():
             check['timestamp'] = datetime.fromisoformat(check['timestamp'])
     return status_checks
 
+# Concurrent identical reads share one query; writes invalidate the session's reads and the session list
+READS = ReadCoalescer()
+SESSIONS_SCOPE = "sessions"
+
+def reads_changed(session_id: str):
+    """Invalidate coalesced reads after a write to a session"""
+    READS.invalidate(session_id, SESSIONS_SCOPE)
+
+# Recent messages per session, tagged with the session's history_version (bumped after every message insert)
+HISTORY_CACHE = HistoryCache()
+
+async def bump_history_version(session_id: str, update: Dict[str, Any]) -> Optional[int]:
+    """Apply a session update that increments history_version; the new version, or None without a session"""
+    # return_document=True is ReturnDocument.AFTER, without importing pymongo here
+    session = await db.sessions.find_one_and_update(
+        {"id": session_id}, update, projection={"history_version": 1}, return_document=True)
+    return session.get("history_version") if session else None
+
+# Retried POSTs carrying an Idempotency-Key get the stored (or in-flight) result instead of running again
+IDEMPOTENCY = IdempotencyStore()
+
+async def idempotent(endpoint: str, key: Optional[str], request: BaseModel, response: Response, handler):
+    """Run `handler` at most once per endpoint and Idempotency-Key"""
+    if key is None:
+        return await handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+    async def run():
+        return jsonable_encoder(await handler())
+
+    try:
+        replayed, result = await IDEMPOTENCY.run(db.idempotency_keys, f"{endpoint}:{key}", request.model_dump(), run)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
 # Chat endpoints
 @api_router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
     """Process chat message and get AI response"""
-    # Get chat history for context
-    history = await db.chat_messages.find(
-        {"session_id": request.session_id}, 
-        {"_id": 0}
-    ).sort("timestamp", 1).to_list(50)
-    
+    return await idempotent("chat", idempotency_key, request, response, lambda: process_chat(request))
+
+async def process_chat(request: ChatRequest) -> ChatResponse:
     # Save user message
     user_msg = ChatMessage(
         session_id=request.session_id,
@@ -1128,6 +1195,18 @@ async def chat(request: ChatRequest):
     user_doc = user_msg.model_dump()
     user_doc['timestamp'] = user_doc['timestamp'].isoformat()
     await db.chat_messages.insert_one(user_doc)
+    version = await bump_history_version(request.session_id, {"$inc": {"history_version": 1}})
+    reads_changed(request.session_id)
+    
+    # Get chat history for context: cached unless another write happened since this process last saw the session
+    history = HISTORY_CACHE.get(request.session_id, version - 1 if version else None)
+    if history is None:
+        recent = await db.chat_messages.find(
+            {"session_id": request.session_id, "id": {"$ne": user_doc["id"]}},
+            {"_id": 0}
+        ).sort("timestamp", -1).to_list(HISTORY_CONTEXT_MESSAGES)
+        history = recent[::-1]
+    HISTORY_CACHE.put(request.session_id, version, history + [user_doc])
     
     # Get LLM response
     llm_result = await get_llm_response(request.session_id, request.message, history)
@@ -1144,13 +1223,12 @@ async def chat(request: ChatRequest):
     await db.chat_messages.insert_one(assistant_doc)
     
     # Update session
-    await db.sessions.update_one(
-        {"id": request.session_id},
-        {
-            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()},
-            "$inc": {"message_count": 2}
-        }
-    )
+    version = await bump_history_version(request.session_id, {
+        "$set": {"updated_at": datetime.now(timezone.utc).isoformat()},
+        "$inc": {"message_count": 2, "content_version": 1, "history_version": 1}
+    })
+    HISTORY_CACHE.append(request.session_id, version, assistant_doc)
+    reads_changed(request.session_id)
     
     return ChatResponse(
         response=llm_result["response"],
@@ -1161,11 +1239,12 @@ async def chat(request: ChatRequest):
 @api_router.get("/chat/history/{session_id}")
 async def get_chat_history(session_id: str):
     """Get chat history for a session"""
-    messages = await db.chat_messages.find(
+    messages = await READS.read("chat_history", session_id, None, lambda: db.chat_messages.find(
         {"session_id": session_id}, 
         {"_id": 0}
-    ).sort("timestamp", 1).to_list(100)
-    return {"messages": messages}
+    ).sort("timestamp", 1).to_list(100))
+    # Documents come straight from Mongo without _id, so they need no jsonable_encoder pass
+    return ORJSONResponse({"messages": messages})
 
 # Session endpoints
 @api_router.post("/sessions")
@@ -1176,12 +1255,14 @@ async def create_session(name: str = "New Session"):
     doc['created_at'] = doc['created_at'].isoformat()
     doc['updated_at'] = doc['updated_at'].isoformat()
     await db.sessions.insert_one(doc)
+    reads_changed(session.id)
     return {"id": session.id, "name": session.name}
 
 @api_router.get("/sessions")
 async def get_sessions():
     """Get all chat sessions"""
-    sessions = await db.sessions.find({}, {"_id": 0}).sort("updated_at", -1).to_list(50)
+    sessions = await READS.read("sessions", SESSIONS_SCOPE, None,
+                                lambda: db.sessions.find({}, {"_id": 0}).sort("updated_at", -1).to_list(50))
     return {"sessions": sessions}
 
 @api_router.delete("/sessions/{session_id}")
@@ -1189,17 +1270,116 @@ async def delete_session(session_id: str):
     """Delete a chat session and its messages"""
     await db.sessions.delete_one({"id": session_id})
     await db.chat_messages.delete_many({"session_id": session_id})
+    await db.findings.delete_many({"session_id": session_id})
+    HISTORY_CACHE.drop(session_id)
+    reads_changed(session_id)
+    await asyncio.to_thread(drop_cached_reports, session_id)
     return {"status": "deleted"}
 
+def _bundle_lookup(collection: str, limit: int) -> Dict[str, Any]:
+    # Newest `limit` documents of the session, read through the (session_id, timestamp) index
+    return {"$lookup": {
+        "from": collection,
+        "let": {"session_id": "$id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$session_id", "$$session_id"]}}},
+            {"$sort": {"timestamp": -1}},
+            {"$limit": limit},
+            {"$project": {"_id": 0}},
+        ],
+        "as": collection,
+    }}
+
+async def load_session_bundle(session_id: str, limit: int = 200) -> Optional[Dict[str, Any]]:
+    """Session with its newest `limit` messages and executions as one timestamp-ordered timeline"""
+    bundles = await db.sessions.aggregate([
+        {"$match": {"id": session_id}},
+        {"$limit": 1},
+        _bundle_lookup("chat_messages", limit),
+        _bundle_lookup("tool_executions", limit),
+        {"$project": {"_id": 0}},
+    ]).to_list(1)
+    if bundles:
+        session = bundles[0]
+        messages, executions = session.pop("chat_messages"), session.pop("tool_executions")
+    else:
+        # History can outlive its session document; serve it like the per-collection endpoints do
+        session = None
+        messages, executions = await asyncio.gather(*(
+            collection.find({"session_id": session_id}, {"_id": 0}).sort("timestamp", -1).to_list(limit)
+            for collection in (db.chat_messages, db.tool_executions)))
+        if not messages and not executions:
+            return None
+
+    # Both lists are newest first, so the newest `limit` items overall are among them
+    newest = heapq.merge(({"kind": "message", **m} for m in messages),
+                         ({"kind": "execution", **e} for e in executions),
+                         key=lambda item: item.get("timestamp", ""), reverse=True)
+    timeline = list(itertools.islice(newest, limit))
+    timeline.reverse()
+    message_count = sum(1 for item in timeline if item["kind"] == "message")
+    return {
+        "session": session,
+        "timeline": timeline,
+        "message_count": message_count,
+        "execution_count": len(timeline) - message_count,
+    }
+
+@api_router.get("/sessions/{session_id}/bundle")
+async def get_session_bundle(session_id: str, limit: int = 200):
+    """Get a session with its chat messages and tool executions as one timeline"""
+    limit = max(1, min(limit, 1000))
+    bundle = await READS.read("session_bundle", session_id, limit, lambda: load_session_bundle(session_id, limit))
+    if bundle is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return ORJSONResponse(bundle)
+
+async def bump_content_version(session_id: str):
+    """Mark a session's content as changed so cached reports are re-rendered"""
+    await db.sessions.update_one({"id": session_id}, {"$inc": {"content_version": 1}})
+    reads_changed(session_id)
+
+# Findings are parsed once, when an execution is stored
+async def store_findings(execution_log: Dict[str, Any], output: str):
+    """Extract structured findings from tool output and persist them"""
+    findings = extract_findings(execution_log["tool_name"], output, execution_log.get("parameters") or {})
+    if findings:
+        await db.findings.insert_many(finding_documents(
+            findings,
+            session_id=execution_log["session_id"],
+            execution_id=execution_log["id"],
+            tool_name=execution_log["tool_name"],
+            timestamp=execution_log["timestamp"],
+        ))
+
+async def get_session_services(session_id: str) -> List[str]:
+    """Distinct product/version strings found in a session"""
+    products = await db.findings.distinct("product", {"session_id": session_id, "type": "service"})
+    return [p for p in products if p]
+
+@api_router.get("/findings/{session_id}")
+async def get_findings(session_id: str, type: Optional[str] = None, limit: int = 500):
+    """Get structured findings extracted from a session's tool executions"""
+    if type and type not in FINDING_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown finding type: {type}")
+    query = {"session_id": session_id}
+    if type:
+        query["type"] = type
+    findings = await db.findings.find(query, {"_id": 0}).sort("timestamp", 1).to_list(max(1, min(limit, 5000)))
+    return {"findings": findings, "count": len(findings)}
+
 # Tools endpoints
 @api_router.get("/tools")
 async def get_tools():
     """Get all available Kali tools"""
-    return {"tools": KALI_TOOLS, "categories": list(KALI_TOOLS.keys())}
+    return Response(TOOL_CATALOG_JSON, media_type="application/json")
 
 @api_router.post("/tools/execute", response_model=ToolExecutionResponse)
-async def execute_tool(request: ToolExecutionRequest):
+async def execute_tool(request: ToolExecutionRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
     """Execute a Kali tool (simulated)"""
+    return await idempotent("tools/execute", idempotency_key, request, response, lambda: run_tool(request))
+
+async def run_tool(request: ToolExecutionRequest) -> ToolExecutionResponse:
     # Log tool execution
     execution_log = {
         "id": str(uuid.uuid4()),
@@ -1210,32 +1390,37 @@ async def execute_tool(request: ToolExecutionRequest):
         "status": "running"
     }
     await db.tool_executions.insert_one(execution_log)
+    reads_changed(request.session_id)
     
     # Execute tool
-    result = simulate_tool_execution(request.tool_name, request.parameters)
+    with TOOL_SIMULATION_SECONDS.time(request.tool_name):
+        result = simulate_tool_execution(request.tool_name, request.parameters)
     
     # Update log with result
     await db.tool_executions.update_one(
         {"id": execution_log["id"]},
         {"$set": {"status": result["status"], "output": result["output"]}}
     )
+    reads_changed(request.session_id)
+    await store_findings(execution_log, result["output"])
+    await bump_content_version(request.session_id)
     
     return ToolExecutionResponse(**result)
 
 @api_router.get("/tools/executions/{session_id}")
 async def get_tool_executions(session_id: str):
     """Get tool execution history for a session"""
-    executions = await db.tool_executions.find(
+    executions = await READS.read("tool_executions", session_id, None, lambda: db.tool_executions.find(
         {"session_id": session_id}, 
         {"_id": 0}
-    ).sort("timestamp", -1).to_list(50)
-    return {"executions": executions}
+    ).sort("timestamp", -1).to_list(50))
+    return ORJSONResponse({"executions": executions})
 
 # Workflow endpoints
 @api_router.get("/workflows")
 async def get_workflows():
     """Get available scan workflows"""
-    return {"workflows": SCAN_WORKFLOWS}
+    return Response(WORKFLOW_CATALOG_JSON, media_type="application/json")
 
 class WorkflowExecutionRequest(BaseModel):
     workflow_id: str
@@ -1243,15 +1428,20 @@ class WorkflowExecutionRequest(BaseModel):
     session_id: str
 
 @api_router.post("/workflows/execute")
-async def execute_workflow(request: WorkflowExecutionRequest):
+async def execute_workflow(request: WorkflowExecutionRequest, response: Response,
+                           idempotency_key: Optional[str] = Header(None)):
     """Execute a complete scan workflow"""
+    return await idempotent("workflows/execute", idempotency_key, request, response, lambda: run_workflow(request))
+
+async def run_workflow(request: WorkflowExecutionRequest) -> Dict[str, Any]:
     workflow = SCAN_WORKFLOWS.get(request.workflow_id)
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
     results = []
     for tool_name in workflow["tools"]:
-        result = simulate_tool_execution(tool_name, {"target": request.target})
+        with TOOL_SIMULATION_SECONDS.time(tool_name):
+            result = simulate_tool_execution(tool_name, {"target": request.target})
         results.append({
             "tool": tool_name,
             "status": result["status"],
@@ -1269,6 +1459,9 @@ async def execute_workflow(request: WorkflowExecutionRequest):
             "status": result["status"]
         }
         await db.tool_executions.insert_one(execution_log)
+        reads_changed(request.session_id)
+        await store_findings(execution_log, result["output"])
+    await bump_content_version(request.session_id)
     
     return {
         "workflow": workflow["name"],
@@ -1279,105 +1472,142 @@ async def execute_workflow(request: WorkflowExecutionRequest):
 
 # Vulnerability database (simulated)
 VULNERABILITY_DB = [
-    {"id": "CVE-2024-0001", "severity": "CRITICAL", "service": "apache", "description": "Remote code execution in Apache 2.4.x", "exploit": "metasploit/exploit/multi/http/apache_rce"},
-    {"id": "CVE-2024-0002", "severity": "HIGH", "service": "mysql", "description": "SQL injection in MySQL 8.0", "exploit": "sqlmap"},
-    {"id": "CVE-2024-0003", "severity": "HIGH", "service": "ssh", "description": "Authentication bypass in OpenSSH", "exploit": "hydra"},
+    {"id": "CVE-2024-0001", "severity": "CRITICAL", "service": "apache", "description": "Remote code execution in Apache 2.4.x", "exploit": "metasploit/exploit/multi/http/apache_rce",
+     "affected": [{"product": "apache", "version_start_including": "2.4.0", "version_end_excluding": "2.5"}]},
+    {"id": "CVE-2024-0002", "severity": "HIGH", "service": "mysql", "description": "SQL injection in MySQL 8.0", "exploit": "sqlmap",
+     "affected": [{"product": "mysql", "version_start_including": "8.0", "version_end_excluding": "8.1"}]},
+    {"id": "CVE-2024-0003", "severity": "HIGH", "service": "ssh", "description": "Authentication bypass in OpenSSH", "exploit": "hydra",
+     "affected": [{"product": "openssh", "version_end_excluding": "9.3p2"}]},
     {"id": "CVE-2024-0004", "severity": "MEDIUM", "service": "http", "description": "XSS vulnerability in web applications", "exploit": "manual"},
     {"id": "CVE-2024-0005", "severity": "MEDIUM", "service": "ftp", "description": "Anonymous FTP access enabled", "exploit": "netcat"},
     {"id": "CVE-2024-0006", "severity": "LOW", "service": "http", "description": "Missing security headers", "exploit": "nikto"},
     {"id": "CVE-2023-44487", "severity": "HIGH", "service": "http", "description": "HTTP/2 Rapid Reset Attack", "exploit": "custom"},
-    {"id": "CVE-2023-4863", "severity": "CRITICAL", "service": "chrome", "description": "WebP heap buffer overflow", "exploit": "metasploit"},
+    {"id": "CVE-2023-4863", "severity": "CRITICAL", "service": "chrome", "description": "WebP heap buffer overflow", "exploit": "metasploit",
+     "affected": [{"product": "chrome", "version_end_excluding": "116.0.5845.187"}]},
 ]
 
+# Indexed store built from VULN_FEED_PATH (NVD JSON dump) or, if unset, the builtin list above.
+# Opened on first use (building it from a large feed can take a while), normally during startup
+VULN_STORE = None
+
+def get_vuln_store():
+    global VULN_STORE
+    if VULN_STORE is None:
+        VULN_STORE = open_store(
+            Path(os.environ.get('VULN_DB_PATH', '/tmp/nexus_vulndb.sqlite')),
+            feed_path=os.environ.get('VULN_FEED_PATH') or None,
+            builtin=VULNERABILITY_DB,
+        )
+    return VULN_STORE
+
 @api_router.get("/vulnerabilities/search")
-async def search_vulnerabilities(service: str = None, severity: str = None):
+async def search_vulnerabilities(service: str = None, severity: str = None, limit: int = 100, offset: int = 0):
     """Search vulnerability database"""
-    results = VULNERABILITY_DB
-    if service:
-        results = [v for v in results if service.lower() in v["service"].lower()]
-    if severity:
-        results = [v for v in results if v["severity"].upper() == severity.upper()]
-    return {"vulnerabilities": results, "count": len(results)}
+    # SQLite reads run off the event loop; the store serializes them on its connection
+    results, total = await asyncio.to_thread(get_vuln_store().search, service, severity,
+                                             limit=max(1, min(limit, 1000)), offset=max(0, offset))
+    return {"vulnerabilities": results, "count": total}
+
+@api_router.get("/vulnerabilities/feed")
+async def get_vulnerability_feed():
+    """Get the version of the vulnerability feed being served"""
+    return await asyncio.to_thread(get_vuln_store().feed_info)
+
+@api_router.get("/vulnerabilities/{cve_id}")
+async def get_vulnerability(cve_id: str):
+    """Get a single vulnerability by CVE id"""
+    vuln = await asyncio.to_thread(get_vuln_store().get, cve_id)
+    if not vuln:
+        raise HTTPException(status_code=404, detail="Vulnerability not found")
+    return vuln
 
 @api_router.post("/vulnerabilities/correlate")
-async def correlate_vulnerabilities(services: List[str]):
+async def correlate_vulnerabilities(services: Optional[List[str]] = Body(None), session_id: Optional[str] = None,
+                                    limit_per_service: int = 100):
     """Correlate discovered services with known vulnerabilities"""
-    correlations = []
-    for service in services:
-        matches = [v for v in VULNERABILITY_DB if service.lower() in v["service"].lower()]
-        if matches:
-            correlations.append({
-                "service": service,
-                "vulnerabilities": matches,
-                "risk_level": max(m["severity"] for m in matches) if matches else "NONE"
-            })
+    if services is None:
+        if not session_id:
+            raise HTTPException(status_code=400, detail="Provide services or a session_id")
+        services = await get_session_services(session_id)
+    correlations = await asyncio.to_thread(get_vuln_store().correlate, services,
+                                           limit_per_service=max(1, min(limit_per_service, 1000)))
     return {"correlations": correlations}
 
+class VulnerabilityDelta(BaseModel):
+    version: Optional[str] = None
+    added: List[Dict[str, Any]] = []
+    modified: List[Dict[str, Any]] = []
+    withdrawn: List[str] = []
+
+def require_admin(token: Optional[str]):
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token or not token or not hmac.compare_digest(token, admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@api_router.post("/admin/vulnerabilities/delta")
+async def ingest_vulnerability_delta(delta: VulnerabilityDelta, x_admin_token: Optional[str] = Header(None)):
+    """Apply an incremental vulnerability feed update without a reload"""
+    require_admin(x_admin_token)
+    try:
+        # Committed in one WAL transaction; readers switch to the new version atomically
+        result = await asyncio.to_thread(apply_delta, get_vuln_store().db_path, delta.model_dump())
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid delta: {str(e)}")
+    logger.info(f"Vulnerability feed updated to {result['feed_version']}")
+    return result
+
 # Export endpoints
 class ExportRequest(BaseModel):
     session_id: str
-    format: str = "txt"  # txt, json, html
+    format: str = "txt"  # txt, json, html, md
 
 @api_router.post("/export/report")
-async def export_report(request: ExportRequest):
+async def export_report(request: ExportRequest, if_none_match: Optional[str] = Header(None)):
     """Export session results as a report"""
-    # Get all executions for session
-    executions = await db.tool_executions.find(
-        {"session_id": request.session_id}, 
-        {"_id": 0}
-    ).sort("timestamp", 1).to_list(100)
-    
-    # Get chat messages
-    messages = await db.chat_messages.find(
-        {"session_id": request.session_id}, 
-        {"_id": 0}
-    ).sort("timestamp", 1).to_list(100)
-    
+    etag, _, body = await report_body(db, request.session_id, request.format)
+    headers = {}
+    if etag:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        headers["ETag"] = etag
+    text = "".join([chunk async for chunk in body])
+
     if request.format == "json":
-        return {
-            "report": {
-                "session_id": request.session_id,
-                "generated_at": datetime.now(timezone.utc).isoformat(),
-                "tool_executions": executions,
-                "chat_history": messages
-            }
-        }
-    else:
-        # Generate text report
-        report_lines = [
-            "=" * 60,
-            "NEXUS PENETRATION TEST REPORT",
-            "=" * 60,
-            f"Session ID: {request.session_id}",
-            f"Generated: {datetime.now(timezone.utc).isoformat()}",
-            "",
-            "-" * 60,
-            "TOOL EXECUTIONS",
-            "-" * 60,
-        ]
-        
-        for exe in executions:
-            report_lines.append(f"\n[{exe.get('timestamp', 'N/A')}] {exe.get('tool_name', 'Unknown')}")
-            report_lines.append(f"Status: {exe.get('status', 'N/A')}")
-            if exe.get('parameters'):
-                report_lines.append(f"Parameters: {exe.get('parameters')}")
-        
-        report_lines.extend([
-            "",
-            "-" * 60,
-            "FINDINGS SUMMARY",
-            "-" * 60,
-            f"Total tools executed: {len(executions)}",
-            "See individual tool outputs for detailed findings.",
-            "",
-            "=" * 60,
-            "END OF REPORT",
-            "=" * 60,
-        ])
-        
-        return {"report": "\n".join(report_lines)}
+        return ORJSONResponse({"report": ndjson_to_report(text)}, headers=headers)
+    return ORJSONResponse({"report": text}, headers=headers)
+
+@api_router.post("/export/report/stream")
+async def export_report_stream(request: ExportRequest, if_none_match: Optional[str] = Header(None)):
+    """Stream a session report (NDJSON for json, chunked text/HTML/Markdown otherwise)"""
+    format = normalize_format(request.format)
+    extension = "ndjson" if format == "json" else format
+    media_type = REPORT_MEDIA_TYPES[format]
+    headers = {"Content-Disposition": f'attachment; filename="nexus-report-{request.session_id}.{extension}"'}
+    
+    etag, cached_path, body = await report_body(db, request.session_id, request.format)
+    if etag:
+        headers["ETag"] = etag
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    if cached_path:
+        return FileResponse(cached_path, media_type=media_type, headers=headers)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
 
 # File operations endpoints
+def sandbox_http_error(e: Exception) -> HTTPException:
+    """Map sandbox I/O failures onto HTTP errors"""
+    if isinstance(e, PermissionError):
+        return HTTPException(status_code=403, detail=str(e))
+    if isinstance(e, FileNotFoundError):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, asyncio.TimeoutError):
+        return HTTPException(status_code=504, detail="File operation timed out")
+    if isinstance(e, QuotaExceededError):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, UploadOffsetError):
+        return HTTPException(status_code=409, detail={"message": str(e), "offset": e.received})
+    return HTTPException(status_code=400, detail=str(e))
+
 @api_router.post("/files/operation")
 async def file_operation(operation: FileOperation):
     """Execute file operation"""
@@ -1385,38 +1615,169 @@ async def file_operation(operation: FileOperation):
     return result
 
 @api_router.get("/files/list")
-async def list_files(path: str = "/"):
-    """List files in directory"""
-    operation = FileOperation(operation="list", path=path)
-    result = await execute_file_operation(operation)
-    return result
+async def list_files(path: str = "/", sort: str = "name", order: str = "asc", offset: int = 0,
+                     limit: int = 1000, pattern: Optional[str] = None, type: Optional[str] = None):
+    """List files in directory (paged; sort by name, size, mtime or type)"""
+    try:
+        return await run_io("list", list_directory, path, sort, order, offset, limit, pattern, type)
+    except (OSError, ValueError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
+
+@api_router.get("/files/tree")
+async def get_file_tree(path: str = "/", depth: int = 2, max_nodes: int = 1000,
+                        include: Optional[List[str]] = Query(None), exclude: Optional[List[str]] = Query(None),
+                        cursor: Optional[str] = None):
+    """Get a depth-limited, size-capped subtree; pass `expand`/`next` tokens back as cursor"""
+    try:
+        return await run_io("list", directory_tree, path, depth, max_nodes, include, exclude, cursor)
+    except (OSError, ValueError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
+
+@api_router.get("/files/search")
+async def search_files(q: str, regex: bool = False, case_sensitive: bool = False, path: str = "/",
+                       offset: int = 0, limit: int = 20, context: int = 2):
+    """Search sandbox file contents (literal or regex), ranked and paginated with line context"""
+    if not q:
+        raise HTTPException(status_code=400, detail="Empty query")
+    try:
+        return await run_io("search", lambda: get_sandbox_search().search(
+            q, regex, case_sensitive, path, max(0, offset), max(1, min(limit, 100)), max(0, min(context, 10))))
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid regex: {e}")
+    except (OSError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
+
+@api_router.get("/files/search/index")
+async def get_search_index():
+    """Get sandbox search index statistics"""
+    return await run_io("search", lambda: get_sandbox_search().stats())
+
+@api_router.get("/files/usage")
+async def get_storage_usage(session_id: Optional[str] = None):
+    """Get sandbox storage usage per session (logical vs charged bytes) and dedup savings"""
+    return await run_io("usage", lambda: get_blob_store().usage(session_id))
+
+@api_router.get("/files/read")
+async def read_file_window(path: str, offset: int = 0, length: int = 65536,
+                           line: Optional[int] = None, lines: Optional[int] = None):
+    """Read a byte window (offset/length) or line window (line/lines) of a sandbox file"""
+    try:
+        return await run_io("preview", read_window, path, offset, length, line, lines)
+    except (OSError, ValueError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
 
-@api_router.post("/files/init-sandbox")
-async def init_sandbox():
-    """Initialize sandbox with sample files"""
-    sandbox_dir = Path("/tmp/pentest_sandbox")
-    sandbox_dir.mkdir(exist_ok=True)
-    
-    # Create sample directories and files
-    (sandbox_dir / "scans").mkdir(exist_ok=True)
-    (sandbox_dir / "results").mkdir(exist_ok=True)
-    (sandbox_dir / "scripts").mkdir(exist_ok=True)
-    (sandbox_dir / "wordlists").mkdir(exist_ok=True)
-    (sandbox_dir / "exploits").mkdir(exist_ok=True)
+@api_router.get("/files/download")
+async def download_file(path: str, range_header: Optional[str] = Header(None, alias="Range")):
+    """Download a sandbox file, honouring single byte-range requests"""
+    try:
+        target_path, stat = await run_io("download", sandbox_file, path)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
     
-    # Sample files
-    (sandbox_dir / "scans" / "nmap_results.txt").write_text("# Nmap scan results\n# Run scans to populate")
-    (sandbox_dir / "scripts" / "recon.sh").write_text("#!/bin/bash\n# Reconnaissance script\necho 'Starting recon...'\nwhois $1\nnmap -sV $1")
-    (sandbox_dir / "scripts" / "web_audit.sh").write_text("#!/bin/bash\n# Web audit script\nnikto -h $1\ndirb http://$1")
-    (sandbox_dir / "wordlists" / "common.txt").write_text("admin\npassword\n123456\nroot\ntest\nuser\nguest\ndefault")
-    (sandbox_dir / "wordlists" / "passwords.txt").write_text("password\n123456\nadmin123\nletmein\nwelcome\npassword1")
-    (sandbox_dir / "README.txt").write_text("NEXUS Pentest Sandbox\n===================\nStore your scan results and scripts here.\n\nDirectories:\n- scans/: Store scan outputs\n- results/: Analysis results\n- scripts/: Custom scripts\n- wordlists/: Password lists\n- exploits/: Exploit code")
+    headers = {"Accept-Ranges": "bytes"}
+    try:
+        byte_range = parse_range(range_header, stat.st_size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{stat.st_size}"})
+    if byte_range is None:
+        return FileResponse(target_path, stat_result=stat, filename=target_path.name,
+                            media_type="application/octet-stream", headers=headers)
     
-    return {"status": "success", "message": "Sandbox initialized"}
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(stream_file_range(target_path, start, end), status_code=206,
+                             media_type="application/octet-stream", headers=headers)
+
+class UploadRequest(BaseModel):
+    path: str
+    size: int
+    session_id: Optional[str] = None
+
+@api_router.post("/files/uploads")
+async def start_upload(request: UploadRequest):
+    """Start a resumable upload; send the bytes with PUT /files/uploads/{upload_id}"""
+    try:
+        return await run_io("upload", create_upload, request.path, request.size, request.session_id)
+    except (OSError, ValueError, QuotaExceededError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
+
+@api_router.get("/files/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Get upload progress; `offset` is where to resume"""
+    try:
+        return await run_io("upload", upload_status, upload_id)
+    except (OSError, ValueError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
+
+@api_router.put("/files/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """Append the raw request body at `offset`, streaming it to disk"""
+    try:
+        buffered, size = [], 0
+        async for data in request.stream():
+            buffered.append(data)
+            size += len(data)
+            if size >= UPLOAD_FLUSH_SIZE:
+                offset = await run_io("upload", append_upload, upload_id, offset, buffered)
+                buffered, size = [], 0
+        if buffered:
+            offset = await run_io("upload", append_upload, upload_id, offset, buffered)
+        return await run_io("upload", finish_upload, upload_id)
+    except (OSError, ValueError, UploadOffsetError, QuotaExceededError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
+
+@api_router.delete("/files/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    """Abandon an upload and discard the received bytes"""
+    try:
+        await run_io("upload", abort_upload, upload_id)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise sandbox_http_error(e)
+    return {"status": "deleted"}
+
+@api_router.post("/files/init-sandbox")
+async def init_sandbox():
+    """Initialize sandbox with sample files (no-op when already up to date)"""
+    try:
+        result = await ensure_sandbox()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Sandbox initialization timed out")
+    message = "Sandbox already initialized" if result["status"] == "current" else "Sandbox initialized"
+    return {"status": "success", "message": message, "created": result["created"]}
+
+@api_router.get("/files/metrics")
+async def get_file_io_metrics():
+    """Get sandbox file I/O pool counters and timings"""
+    return IO_METRICS.snapshot()
+
+@api_router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_profile: Optional[str] = Header(None)):
+    """Download a saved request profile (needs the profiling token)"""
+    if not token_matches(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+    path = profile_path(profile_id) if re.fullmatch(r"[0-9a-f]{32}", profile_id) else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=path.name, media_type="application/octet-stream")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(MetricsMiddleware)
+
+# Only installed when a profiling token is configured, so unprofiled requests pay nothing
+if PROFILE_TOKEN:
+    app.add_middleware(ProfilingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1425,6 +1786,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+def connect_db():
+    global client, db
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=[mongo_command_listener()])
+    db = client[os.environ['DB_NAME']]
+
+async def create_indexes():
+    await db.chat_messages.create_index([("session_id", 1), ("timestamp", 1)])
+    await db.tool_executions.create_index([("session_id", 1), ("timestamp", 1)])
+    await db.findings.create_index([("session_id", 1), ("type", 1), ("timestamp", 1)])
+    await db.findings.create_index([("session_id", 1), ("product", 1)], sparse=True)
+    await db.findings.create_index("execution_id")
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL)
+
+async def ensure_indexes():
+    try:
+        await create_indexes()
+    except Exception as e:
+        logger.error(f"Index creation failed: {str(e)}")
+
+async def sweep_uploads_periodically():
+    # Abandoned resumable uploads would otherwise keep their partial data forever
+    while True:
+        try:
+            removed = await run_io("upload", sweep_uploads)
+            if removed:
+                logger.info(f"Swept {removed} abandoned uploads")
+        except Exception as e:
+            logger.error(f"Upload sweep failed: {str(e)}")
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL)
+
+_background_tasks = set()
+
+def start_background_task(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def startup():
+    # A database injected before startup (benchmarks, tests) is kept
+    if db is None:
+        connect_db()
+    # Indexes are idempotent and only needed for speed, so don't hold up readiness on them
+    start_background_task(ensure_indexes())
+    start_background_task(sweep_uploads_periodically())
+    await asyncio.to_thread(get_vuln_store)
+    await asyncio.to_thread(get_blob_store)
+    await asyncio.to_thread(get_sandbox_search)
+
+async def shutdown():
+    for task in list(_background_tasks):
+        task.cancel()
+    if client is not None:
+        client.close()
+    if VULN_STORE is not None:
+        VULN_STORE.close()
+    close_sandbox_search()
+    close_blob_store()
+    shutdown_io_pool()
@@ -0,0 +1,776 @@
+"""Indexed vulnerability store backed by a compact on-disk SQLite file.
+
+The store is built once from a local CVE feed (NVD JSON 1.1 / 2.0 dumps, or a
+plain list of records in the VULNERABILITY_DB shape) and then opened read-only
+by every worker. Lookups go through B-tree indexes so RSS stays small and
+queries stay sub-millisecond even with hundreds of thousands of records.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import fcntl
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
+
+SEVERITY_RANK = {"NONE": 0, "LOW": 1, "MEDIUM": 2, "HIGH": 3, "CRITICAL": 4}
+SEVERITY_BY_RANK = {rank: severity for severity, rank in SEVERITY_RANK.items()}
+
+# Bumped whenever the on-disk layout changes so stale store files get rebuilt
+SCHEMA_VERSION = 6
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+KEY_RE = re.compile(r"[a-z0-9][a-z0-9_.+-]*")
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+CREATE TABLE vulns (
+    rid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    severity TEXT NOT NULL,
+    severity_rank INTEGER NOT NULL,
+    service TEXT NOT NULL,
+    description TEXT NOT NULL,
+    exploit TEXT NOT NULL,
+    affected TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX vulns_severity ON vulns (severity_rank, rid);
+CREATE TABLE service_suffixes (
+    suffix TEXT NOT NULL,
+    rid INTEGER NOT NULL,
+    PRIMARY KEY (suffix, rid)
+) WITHOUT ROWID;
+CREATE INDEX service_suffixes_rid ON service_suffixes (rid, suffix);
+CREATE TABLE service_keys (
+    key TEXT NOT NULL,
+    rid INTEGER NOT NULL,
+    PRIMARY KEY (key, rid)
+) WITHOUT ROWID;
+CREATE TABLE affected_ranges (
+    key TEXT NOT NULL,
+    rid INTEGER NOT NULL,
+    start_key TEXT NOT NULL,
+    start_flag INTEGER NOT NULL,
+    end_key TEXT NOT NULL,
+    end_flag INTEGER NOT NULL
+);
+CREATE INDEX affected_ranges_key ON affected_ranges (key);
+CREATE INDEX affected_ranges_rid ON affected_ranges (rid);
+"""
+
+VULN_COLUMNS = "id, severity, service, description, exploit"
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a service/product string into lowercase index tokens"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def token_suffixes(text: str) -> Iterable[str]:
+    """Every suffix of every token: a substring of a token is a prefix of one of its suffixes"""
+    for token in set(tokenize(text)):
+        for start in range(len(token)):
+            yield token[start:]
+
+
+def service_keys(text: str) -> List[str]:
+    """Whole vendor/product names of a record ("apache http_server" -> apache, http_server)"""
+    return KEY_RE.findall(text.lower())
+
+
+def product_key(product: str) -> str:
+    """Key an affected range is indexed under: the product name without its vendor
+
+    "apache http_server" (CPE vendor and product) -> http_server, so ranges of
+    one product never match another product of the same vendor.
+    """
+    keys = service_keys(product)
+    return keys[-1] if keys else ""
+
+
+# Scanner banner names (as "_"-joined word pairs) whose CPE product name differs
+SCAN_ALIASES = {
+    "apache_httpd": "http_server",
+    "microsoft_iis": "internet_information_services",
+    "apache_tomcat": "tomcat",
+}
+
+
+def scan_keys(text: str) -> List[str]:
+    """Candidate product keys in a scanned service string, incl. "_"-joined word pairs"""
+    words = [w.strip(".+-") for w in KEY_RE.findall(text.lower())]
+    words = [w for w in words if w and not w[0].isdigit()]
+    pairs = [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    return words + pairs + [SCAN_ALIASES[pair] for pair in pairs if pair in SCAN_ALIASES]
+
+
+def normalize_severity(severity: Optional[str]) -> str:
+    severity = (severity or "NONE").upper()
+    return severity if severity in SEVERITY_RANK else "NONE"
+
+
+# ============ VERSIONS ============
+
+VERSION_SEGMENT_RE = re.compile(r"\d+|[a-z]+")
+
+# Sentinel keys for open-ended ranges; every real version key sorts between them
+VERSION_MIN = ""
+VERSION_MAX = "\uffff"
+
+
+def version_key(version: str) -> str:
+    """Encode a version string so plain string comparison orders versions
+
+    Numeric segments are zero-padded and sort after alphabetic ones, so
+    "2.4.9" < "2.4.52" and "8.9" < "8.9p1" < "8.10".
+    """
+    segments = []
+    for segment in VERSION_SEGMENT_RE.findall(version.lower()):
+        if segment.isdigit():
+            segments.append(f"N{int(segment):010d}")
+        else:
+            segments.append(f"A{segment}")
+    return ".".join(segments)
+
+
+def scan_version(text: str) -> Optional[str]:
+    """First version-looking word of a scanned service string ("OpenSSH 8.9p1" -> 8.9p1)"""
+    for word in KEY_RE.findall(text.lower()):
+        if word[0].isdigit():
+            return word
+    return None
+
+
+def range_bounds(entry: Dict[str, Any]) -> Tuple[Tuple[str, int], Tuple[str, int]]:
+    """Turn an affected entry into comparable (start, end) bounds
+
+    Bounds are (key, flag) tuples and a version v is inside the range when
+    start <= (version_key(v), 1) <= end; the flag encodes inclusivity.
+    """
+    if entry.get("version_start_including"):
+        start = (version_key(entry["version_start_including"]), 0)
+    elif entry.get("version_start_excluding"):
+        start = (version_key(entry["version_start_excluding"]), 2)
+    else:
+        start = (VERSION_MIN, 0)
+    if entry.get("version_end_including"):
+        end = (version_key(entry["version_end_including"]), 2)
+    elif entry.get("version_end_excluding"):
+        end = (version_key(entry["version_end_excluding"]), 0)
+    else:
+        end = (VERSION_MAX, 2)
+    return start, end
+
+
+class IntervalIndex:
+    """Static interval tree over sorted ranges; stabbing queries are O(log n + k)
+
+    Intervals are kept sorted by start in flat lists, and max_end holds the
+    largest end within the implicit balanced subtree rooted at each midpoint,
+    so whole subtrees that end before the queried point are skipped.
+    """
+
+    def __init__(self, intervals: List[Tuple[Tuple[str, int], Tuple[str, int], int]]):
+        intervals.sort()
+        self.starts = [i[0] for i in intervals]
+        self.ends = [i[1] for i in intervals]
+        self.values = [i[2] for i in intervals]
+        self.max_end = list(self.ends)
+        self._build(0, len(intervals))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _build(self, lo: int, hi: int):
+        # Iterative post-order pass so deep products don't hit the recursion limit
+        stack = [(lo, hi, False)]
+        while stack:
+            lo, hi, done = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if not done:
+                stack.extend([(lo, hi, True), (lo, mid, False), (mid + 1, hi, False)])
+                continue
+            best = self.ends[mid]
+            if lo < mid:
+                best = max(best, self.max_end[(lo + mid) // 2])
+            if mid + 1 < hi:
+                best = max(best, self.max_end[(mid + 1 + hi) // 2])
+            self.max_end[mid] = best
+
+    def stab(self, point: Tuple[str, int]) -> List[int]:
+        """Values of every interval containing point"""
+        found = []
+        stack = [(0, len(self.values))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] < point:
+                continue
+            stack.append((lo, mid))
+            if self.starts[mid] <= point:
+                if point <= self.ends[mid]:
+                    found.append(self.values[mid])
+                stack.append((mid + 1, hi))
+        return found
+
+
+# ============ FEED PARSING ============
+
+def _cpe_matches(nodes: Iterable[Dict[str, Any]], match_key: str, uri_key: str,
+                 products: List[str], affected: List[Dict[str, Any]]):
+    for node in nodes or []:
+        for match in node.get(match_key, []):
+            if not match.get("vulnerable", True):
+                continue
+            parts = match.get(uri_key, "").split(":")
+            if len(parts) <= 5:
+                continue
+            product = f"{parts[3]} {parts[4]}"
+            if product not in products:
+                products.append(product)
+            entry = {"product": product}
+            if parts[5] not in ("*", "-", ""):
+                entry["version_start_including"] = entry["version_end_including"] = parts[5]
+            for field in ("versionStartIncluding", "versionStartExcluding",
+                          "versionEndIncluding", "versionEndExcluding"):
+                if match.get(field):
+                    entry[re.sub(r"([A-Z])", r"_\1", field).lower()] = match[field]
+            # A match without version bounds affects every version of the product
+            affected.append(entry)
+        _cpe_matches(node.get("children"), match_key, uri_key, products, affected)
+
+
+def _normalize_nvd2(cve: Dict[str, Any]) -> Dict[str, Any]:
+    metrics = cve.get("metrics", {})
+    severity = None
+    for key in ("cvssMetricV40", "cvssMetricV31", "cvssMetricV30"):
+        if metrics.get(key):
+            severity = metrics[key][0].get("cvssData", {}).get("baseSeverity")
+            break
+    if severity is None and metrics.get("cvssMetricV2"):
+        severity = metrics["cvssMetricV2"][0].get("baseSeverity")
+
+    products, affected = [], []
+    for config in cve.get("configurations", []):
+        _cpe_matches(config.get("nodes"), "cpeMatch", "criteria", products, affected)
+
+    return {
+        "id": cve["id"],
+        "severity": normalize_severity(severity),
+        "service": " ".join(products),
+        "description": next((d["value"] for d in cve.get("descriptions", []) if d.get("lang") == "en"), ""),
+        "exploit": "manual",
+        "affected": affected,
+    }
+
+
+def _normalize_nvd1(item: Dict[str, Any]) -> Dict[str, Any]:
+    cve = item["cve"]
+    impact = item.get("impact", {})
+    severity = impact.get("baseMetricV3", {}).get("cvssV3", {}).get("baseSeverity")
+    if severity is None:
+        severity = impact.get("baseMetricV2", {}).get("severity")
+
+    products, affected = [], []
+    _cpe_matches(item.get("configurations", {}).get("nodes"), "cpe_match", "cpe23Uri", products, affected)
+
+    descriptions = cve.get("description", {}).get("description_data", [])
+    return {
+        "id": cve["CVE_data_meta"]["ID"],
+        "severity": normalize_severity(severity),
+        "service": " ".join(products),
+        "description": next((d["value"] for d in descriptions if d.get("lang") == "en"), ""),
+        "exploit": "manual",
+        "affected": affected,
+    }
+
+
+def normalize_record(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an NVD item or a native record into the store record shape"""
+    if "cve" in item:
+        record = _normalize_nvd1(item) if "CVE_data_meta" in item["cve"] else _normalize_nvd2(item["cve"])
+    else:
+        record = {
+            "id": item["id"],
+            "severity": normalize_severity(item.get("severity")),
+            "service": item.get("service", ""),
+            "description": item.get("description", ""),
+            "exploit": item.get("exploit", "manual"),
+            "affected": item.get("affected", []),
+        }
+    # Ids are stored upper case; lookups and withdrawals upper-case theirs too
+    record["id"] = record["id"].strip().upper()
+    return record
+
+
+def read_feed(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield normalized records from a local feed file (optionally gzipped)"""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("vulnerabilities") or data.get("CVE_Items") or []
+    for item in data:
+        yield normalize_record(item)
+
+
+# ============ STORE ============
+
+def _insert_records(conn: sqlite3.Connection, records: Iterable[Dict[str, Any]]):
+    for record in records:
+        cursor = conn.execute(
+            "INSERT OR REPLACE INTO vulns (id, severity, severity_rank, service, description, exploit, affected) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record["id"], record["severity"], SEVERITY_RANK[record["severity"]],
+             record["service"], record["description"], record["exploit"],
+             json.dumps(record.get("affected") or [])),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO service_suffixes (suffix, rid) VALUES (?, ?)",
+            ((suffix, cursor.lastrowid) for suffix in token_suffixes(record["service"])),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO service_keys (key, rid) VALUES (?, ?)",
+            ((key, cursor.lastrowid) for key in set(service_keys(record["service"]))),
+        )
+        ranges = []
+        for entry in record.get("affected") or []:
+            (start_key, start_flag), (end_key, end_flag) = range_bounds(entry)
+            ranges.append((product_key(entry["product"]), cursor.lastrowid, start_key, start_flag, end_key, end_flag))
+        conn.executemany("INSERT INTO affected_ranges VALUES (?, ?, ?, ?, ?, ?)", ranges)
+
+
+def _schema_statements() -> List[str]:
+    return [stmt.strip() for stmt in SCHEMA.split(";") if stmt.strip()]
+
+
+def _drop_records(conn: sqlite3.Connection, cve_ids: Iterable[str]) -> int:
+    dropped = 0
+    for cve_id in cve_ids:
+        row = conn.execute("SELECT rid FROM vulns WHERE id = ?", (cve_id.upper(),)).fetchone()
+        if not row:
+            continue
+        conn.execute("DELETE FROM service_suffixes WHERE rid IN (SELECT rid FROM service_suffixes "
+                     "INDEXED BY service_suffixes_rid WHERE rid = ?)", row)
+        conn.execute("DELETE FROM service_keys WHERE rid = ?", row)
+        conn.execute("DELETE FROM affected_ranges WHERE rid = ?", row)
+        conn.execute("DELETE FROM vulns WHERE rid = ?", row)
+        dropped += 1
+    return dropped
+
+
+def _write_counts(conn: sqlite3.Connection, feed_version: str) -> int:
+    count = conn.execute("SELECT COUNT(*) FROM vulns").fetchone()[0]
+    meta = [
+        ("record_count", str(count)),
+        ("feed_version", feed_version),
+        ("updated_at", datetime.now(timezone.utc).isoformat()),
+    ]
+    # Severity bucket sizes, so severity-only searches never count rows
+    for severity, rank in SEVERITY_RANK.items():
+        bucket = conn.execute("SELECT COUNT(*) FROM vulns WHERE severity_rank = ?", (rank,)).fetchone()[0]
+        meta.append((f"count:{severity}", str(bucket)))
+    conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta)
+    return count
+
+
+@contextmanager
+def _writer(db_path: Path) -> Iterator[sqlite3.Connection]:
+    """Exclusive write transaction on the store, serialized across processes
+
+    The store runs in WAL mode, so readers keep serving the previous
+    snapshot until COMMIT and then switch to the new one atomically.
+    """
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{db_path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        conn = sqlite3.connect(str(db_path), isolation_level=None, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+
+def build_store(db_path: Path, records: Iterable[Dict[str, Any]], source: str,
+                only_if_stale: bool = False) -> int:
+    """(Re)build the whole store from records in a single write transaction"""
+    with _writer(db_path) as conn:
+        if only_if_stale:
+            # Another worker may have rebuilt it while we waited for the lock
+            try:
+                current = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+            except sqlite3.OperationalError:
+                current = None
+            if current and current[0] == source:
+                return conn.execute("SELECT COUNT(*) FROM vulns").fetchone()[0]
+        existing = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        for table in existing:
+            conn.execute(f"DROP TABLE {table}")
+        for stmt in _schema_statements():
+            conn.execute(stmt)
+        _insert_records(conn, records)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('source', ?)", (source,))
+        base_version = "base-" + hashlib.sha1(source.encode()).hexdigest()[:12]
+        conn.execute("INSERT INTO meta (key, value) VALUES ('base_version', ?)", (base_version,))
+        count = _write_counts(conn, base_version)
+        conn.execute("ANALYZE")
+    return count
+
+
+def read_delta(path: Path) -> Dict[str, Any]:
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return json.load(f)
+
+
+def apply_delta(db_path: Path, delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply an incremental feed update to the store in one atomic transaction
+
+    The delta is {"version": ..., "added": [...], "modified": [...],
+    "withdrawn": ["CVE-..."]}; added/modified entries may be NVD items or
+    native records.
+    """
+    added = [normalize_record(item) for item in delta.get("added", [])]
+    modified = [normalize_record(item) for item in delta.get("modified", [])]
+    withdrawn = [cve_id for cve_id in delta.get("withdrawn", [])]
+
+    with _writer(db_path) as conn:
+        meta = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('base_version', 'deltas_applied')"))
+        deltas = int(meta.get("deltas_applied", 0)) + 1
+        # Unnamed deltas are numbered from the last named version, so the name never grows
+        if delta.get("version"):
+            version = str(delta["version"])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('base_version', ?)", (version,))
+        else:
+            version = f"{meta.get('base_version', 'base')}+{deltas}"
+
+        removed = _drop_records(conn, withdrawn)
+        _drop_records(conn, [record["id"] for record in added + modified])
+        _insert_records(conn, added + modified)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('deltas_applied', ?)", (str(deltas),))
+        count = _write_counts(conn, version)
+
+    return {
+        "feed_version": version,
+        "added": len(added),
+        "modified": len(modified),
+        "withdrawn": removed,
+        "record_count": count,
+    }
+
+
+def _vuln_row(row: Tuple) -> Dict[str, Any]:
+    return {"id": row[0], "severity": row[1], "service": row[2], "description": row[3], "exploit": row[4]}
+
+
+def _consistent(method):
+    """Run a VulnStore read method inside a single read snapshot"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._snapshot():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class VulnStore:
+    """Read-side handle on an indexed vulnerability store file"""
+
+    def __init__(self, db_path: Path, mmap_size: int = 256 * 1024 * 1024):
+        self.db_path = Path(db_path)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA query_only=1")
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.execute("PRAGMA cache_size=-2048")
+        # Interval indexes are built lazily per product key and kept in a small LRU
+        self._ranges: "OrderedDict[str, Tuple[IntervalIndex, frozenset]]" = OrderedDict()
+        self._ranges_capacity = 512
+        self._data_version = None
+        self._lock = threading.RLock()
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _snapshot(self) -> Iterator[sqlite3.Connection]:
+        # Every public read runs in one read transaction, so it sees a single
+        # consistent feed version even while a delta is being committed
+        with self._lock:
+            if self._conn.in_transaction:
+                yield self._conn
+                return
+            self._conn.execute("BEGIN")
+            try:
+                data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version != self._data_version:
+                    self._ranges.clear()
+                    self._data_version = data_version
+                yield self._conn
+            finally:
+                self._conn.execute("COMMIT")
+
+    def meta(self, key: str) -> Optional[str]:
+        with self._snapshot() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self) -> int:
+        return int(self.meta("record_count") or 0)
+
+    def feed_info(self) -> Dict[str, Any]:
+        """Version and size of the feed currently served"""
+        with self._snapshot() as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        return {
+            "feed_version": meta.get("feed_version"),
+            "record_count": int(meta.get("record_count", 0)),
+            "deltas_applied": int(meta.get("deltas_applied", 0)),
+            "updated_at": meta.get("updated_at"),
+        }
+
+    @_consistent
+    def get(self, cve_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a single record by CVE id"""
+        row = self._conn.execute(
+            f"SELECT {VULN_COLUMNS}, affected FROM vulns WHERE id = ?", (cve_id.upper(),)
+        ).fetchone()
+        if not row:
+            return None
+        vuln = _vuln_row(row)
+        vuln["affected"] = json.loads(row[5])
+        return vuln
+
+    def _range_index(self, key: str) -> Tuple[IntervalIndex, frozenset]:
+        if key in self._ranges:
+            self._ranges.move_to_end(key)
+            return self._ranges[key]
+        rows = self._conn.execute(
+            "SELECT start_key, start_flag, end_key, end_flag, rid FROM affected_ranges WHERE key = ?", (key,)
+        ).fetchall()
+        entry = (
+            IntervalIndex([((r[0], r[1]), (r[2], r[3]), r[4]) for r in rows]),
+            frozenset(r[4] for r in rows),
+        )
+        self._ranges[key] = entry
+        if len(self._ranges) > self._ranges_capacity:
+            self._ranges.popitem(last=False)
+        return entry
+
+    @_consistent
+    def lookup(self, product: str, version: str) -> List[Dict[str, Any]]:
+        """Records whose affected ranges for product include version"""
+        index, _ = self._range_index(product_key(product))
+        rids = sorted(set(index.stab((version_key(version), 1))))
+        rows = self._conn.execute(
+            f"SELECT {VULN_COLUMNS} FROM vulns WHERE rid IN (SELECT value FROM json_each(?))", (json.dumps(rids),)
+        ).fetchall()
+        return [_vuln_row(row) for row in rows]
+
+    def _service_query(self, needle: str, tokens: List[str], severity_rank: Optional[int]) -> Tuple[str, List[Any]]:
+        # Substring match, as a prefix range scan over token suffixes ("sql" matches "mysql"):
+        # the longest token drives the scan, the others are probed per candidate
+        tokens = sorted(set(tokens), key=len, reverse=True)
+        sql = ["FROM service_suffixes t"]
+        where = ["t.suffix >= ? AND t.suffix < ?"]
+        params: List[Any] = [tokens[0], tokens[0] + "\uffff"]
+        for token in tokens[1:]:
+            where.append("EXISTS (SELECT 1 FROM service_suffixes t2 INDEXED BY service_suffixes_rid "
+                         "WHERE t2.rid = t.rid AND t2.suffix >= ? AND t2.suffix < ?)")
+            params.extend([token, token + "\uffff"])
+        # A single alphanumeric needle is matched exactly by the scan; anything else (several
+        # words, punctuation) is confirmed against the whole service string
+        exact = tokens == [needle]
+        if severity_rank is not None or not exact:
+            sql.append("JOIN vulns v ON v.rid = t.rid")
+        if not exact:
+            where.append("instr(lower(v.service), ?) > 0")
+            params.append(needle)
+        if severity_rank is not None:
+            where.append("v.severity_rank = ?")
+            params.append(severity_rank)
+        return " ".join(sql) + " WHERE " + " AND ".join(where), params
+
+    @_consistent
+    def search(self, service: Optional[str] = None, severity: Optional[str] = None,
+               limit: int = 100, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Return one page of records whose service contains `service` (case-insensitive), and the total"""
+        severity_rank = SEVERITY_RANK.get(severity.upper(), -1) if severity else None
+        needle = (service or "").lower()
+        tokens = tokenize(needle)
+
+        if needle and not tokens:
+            # Nothing indexable (punctuation only): scan
+            severity_sql = " AND severity_rank = ?" if severity_rank is not None else ""
+            params = [needle] + ([severity_rank] if severity_rank is not None else [])
+            rows = self._conn.execute(
+                f"SELECT {VULN_COLUMNS} FROM vulns WHERE instr(lower(service), ?) > 0{severity_sql} "
+                "ORDER BY rid LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM vulns WHERE instr(lower(service), ?) > 0{severity_sql}", params).fetchone()[0]
+        elif tokens:
+            body, params = self._service_query(needle, tokens, severity_rank)
+            rids = [row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT t.rid {body} ORDER BY t.rid LIMIT ? OFFSET ?", params + [limit, offset])]
+            rows = self._conn.execute(
+                f"SELECT {VULN_COLUMNS} FROM vulns WHERE rid IN ({','.join('?' * len(rids))}) ORDER BY rid",
+                rids,
+            ).fetchall() if rids else []
+            if offset == 0 and len(rows) < limit:
+                total = len(rows)
+            else:
+                total = self._conn.execute(f"SELECT COUNT(DISTINCT t.rid) {body}", params).fetchone()[0]
+        elif severity_rank is not None:
+            rows = self._conn.execute(
+                f"SELECT {VULN_COLUMNS} FROM vulns WHERE severity_rank = ? ORDER BY rid LIMIT ? OFFSET ?",
+                (severity_rank, limit, offset),
+            ).fetchall()
+            total = int(self.meta(f"count:{severity.upper()}") or 0)
+        else:
+            rows = self._conn.execute(
+                f"SELECT {VULN_COLUMNS} FROM vulns ORDER BY rid LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+            total = len(self)
+        return [_vuln_row(row) for row in rows], total
+
+    @_consistent
+    def correlate(self, services: List[str], limit_per_service: int = 100) -> List[Dict[str, Any]]:
+        """Match a batch of scanned service strings against the key index in one pass"""
+        keys_by_service = [set(scan_keys(service)) for service in services]
+        versions = [scan_version(service) for service in services]
+        all_keys = set().union(*keys_by_service) if keys_by_service else set()
+        if not all_keys:
+            return []
+
+        # One indexed query for every distinct key across the whole batch. Records with affected
+        # ranges match a versioned service only through their product keys (below); otherwise,
+        # and for bare service names ("ssh"), records match any of their keys
+        unranged_by_key: Dict[str, List[int]] = {}
+        ranged_by_key: Dict[str, List[int]] = {}
+        rank_by_rid: Dict[int, int] = {}
+        for key, rid, rank, ranged in self._conn.execute(
+            "SELECT k.key, k.rid, v.severity_rank, EXISTS (SELECT 1 FROM affected_ranges a WHERE a.rid = k.rid) "
+            "FROM service_keys k JOIN vulns v ON v.rid = k.rid WHERE k.key IN (SELECT value FROM json_each(?))",
+            (json.dumps(sorted(all_keys)),),
+        ):
+            (ranged_by_key if ranged else unranged_by_key).setdefault(key, []).append(rid)
+            rank_by_rid[rid] = rank
+
+        product_keys = {row[0] for row in self._conn.execute(
+            "SELECT DISTINCT key FROM affected_ranges WHERE key IN (SELECT value FROM json_each(?))",
+            (json.dumps(sorted(all_keys)),),
+        )}
+
+        matched = []
+        for service, keys, version in zip(services, keys_by_service, versions):
+            rids = set()
+            for key in keys:
+                rids.update(unranged_by_key.get(key, ()))
+                if not version:
+                    rids.update(ranged_by_key.get(key, ()))
+                if key in product_keys:
+                    index, ranged = self._range_index(key)
+                    # Interval lookup per (product, version); O(log n) in the product's ranges
+                    rids.update(index.stab((version_key(version), 1)) if version else ranged)
+            if not rids:
+                continue
+            missing = [rid for rid in rids if rid not in rank_by_rid]
+            if missing:
+                rank_by_rid.update(self._conn.execute(
+                    "SELECT rid, severity_rank FROM vulns WHERE rid IN (SELECT value FROM json_each(?))",
+                    (json.dumps(missing),)))
+            ranked = sorted(rids, key=lambda rid: (-rank_by_rid[rid], rid))
+            matched.append((service, version, ranked))
+
+        # Fetch full rows for every rid that will be returned, again in one query
+        wanted = {rid for _, _, ranked in matched for rid in ranked[:limit_per_service]}
+        rows = {
+            row[0]: _vuln_row(row[1:])
+            for row in self._conn.execute(
+                f"SELECT rid, {VULN_COLUMNS} FROM vulns WHERE rid IN (SELECT value FROM json_each(?))",
+                (json.dumps(sorted(wanted)),),
+            )
+        }
+
+        return [
+            {
+                "service": service,
+                "version": version,
+                "vulnerabilities": [rows[rid] for rid in ranked[:limit_per_service]],
+                "match_count": len(ranked),
+                "risk_level": SEVERITY_BY_RANK[rank_by_rid[ranked[0]]],
+            }
+            for service, version, ranked in matched
+        ]
+
+
+def _source_signature(feed_path: Optional[Path], builtin: List[Dict[str, Any]]) -> str:
+    if feed_path:
+        stat = Path(feed_path).stat()
+        return f"v{SCHEMA_VERSION}:feed:{Path(feed_path).resolve()}:{stat.st_mtime_ns}:{stat.st_size}"
+    digest = hashlib.sha1(json.dumps(builtin, sort_keys=True).encode()).hexdigest()
+    return f"v{SCHEMA_VERSION}:builtin:{digest}"
+
+
+def open_store(db_path: Path, feed_path: Optional[Path] = None,
+               builtin: Optional[List[Dict[str, Any]]] = None) -> VulnStore:
+    """Open the store at db_path, rebuilding it only if its source changed"""
+    builtin = builtin or []
+    source = _source_signature(feed_path, builtin)
+    if Path(db_path).exists():
+        store = VulnStore(db_path)
+        try:
+            if store.meta("source") == source:
+                return store
+        except sqlite3.DatabaseError:
+            pass
+        store.close()
+
+    records = read_feed(Path(feed_path)) if feed_path else (normalize_record(v) for v in builtin)
+    build_store(db_path, records, source, only_if_stale=True)
+    return VulnStore(db_path)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Manage the indexed vulnerability store")
+    parser.add_argument("--db", default=os.environ.get("VULN_DB_PATH", "/tmp/nexus_vulndb.sqlite"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index a full NVD JSON feed (.json or .json.gz)")
+    build.add_argument("feed")
+    ingest = commands.add_parser("ingest", help="apply a delta feed to a live store")
+    ingest.add_argument("delta")
+    commands.add_parser("info", help="show the served feed version")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_store(Path(args.db), read_feed(Path(args.feed)), _source_signature(Path(args.feed), []))
+        print(f"Indexed {count} vulnerabilities into {args.db}")
+    elif args.command == "ingest":
+        print(json.dumps(apply_delta(Path(args.db), read_delta(Path(args.delta))), indent=2))
+    else:
+        store = VulnStore(Path(args.db))
+        print(json.dumps(store.feed_info(), indent=2))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Import-time and startup budget report for NEXUS Pentest LLM
+Imports server.py in fresh interpreters under `python -X importtime`,
+reports the total and the heaviest modules (self and cumulative), times
+the app lifespan startup, and checks that dependencies meant to load
+lazily (Motor/pymongo, the LLM client) are not pulled in at import time.
+Exits non-zero when a budget is exceeded or a lazy module is imported.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent / "backend"
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_load import prepare_environment  # noqa: E402
+
+# Only imported on first use (lifespan startup or the first LLM call)
+LAZY_MODULES = ["motor", "pymongo", "emergentintegrations", "litellm"]
+
+STARTUP_SCRIPT = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+from memory_db import MemoryDatabase
+server.db = MemoryDatabase()
+asyncio.run(server.startup())
+ready = time.perf_counter()
+print(json.dumps({"import": imported - started, "startup": ready - imported,
+                  "lazy_loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), str(BENCH_DIR), env.get("PYTHONPATH")]))
+    return env
+
+
+def parse_importtime(stderr):
+    """Module -> (self us, cumulative us) from `-X importtime` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_imports(env):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr)
+
+
+def measure_startup(env):
+    result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT % (LAZY_MODULES,)], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=15, help="modules to list")
+    parser.add_argument("--budget-ms", type=float, help="fail if the median `import server` exceeds this")
+    parser.add_argument("--startup-budget-ms", type=float, help="fail if median import + startup exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(Path(tmp))
+        env = child_env()
+        runs = [measure_imports(env) for _ in range(args.runs)]
+        startups = [measure_startup(env) for _ in range(args.runs)]
+
+    self_us, cumulative_us = defaultdict(list), defaultdict(list)
+    for modules in runs:
+        for name, (own, cumulative) in modules.items():
+            self_us[name].append(own)
+            cumulative_us[name].append(cumulative)
+    total_ms = statistics.median(r["server"][1] for r in runs) / 1e3
+    import_ms = statistics.median(s["import"] for s in startups) * 1e3
+    startup_ms = statistics.median(s["startup"] for s in startups) * 1e3
+
+    print(f"import server: {total_ms:.1f}ms (-X importtime, median of {args.runs})")
+    print(f"import + lifespan startup: {import_ms:.1f}ms + {startup_ms:.1f}ms = {import_ms + startup_ms:.1f}ms")
+    for title, table in (("cumulative", cumulative_us), ("self", self_us)):
+        print(f"\nheaviest modules by {title} time:")
+        ranked = sorted(table.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+        for name, samples in ranked[:args.top]:
+            print(f"  {statistics.median(samples) / 1e3:8.1f}ms  {name}")
+
+    failures = []
+    eager = sorted({m.split(".")[0] for r in runs for m in r} & set(LAZY_MODULES))
+    eager += sorted(set(m for s in startups for m in s["lazy_loaded"]) - set(eager))
+    if eager:
+        failures.append(f"imported at startup but meant to be lazy: {', '.join(eager)}")
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        failures.append(f"import server took {total_ms:.1f}ms, budget {args.budget_ms:g}ms")
+    if args.startup_budget_ms is not None and import_ms + startup_ms > args.startup_budget_ms:
+        failures.append(f"import + startup took {import_ms + startup_ms:.1f}ms, budget {args.startup_budget_ms:g}ms")
+    for failure in failures:
+        print(f"\nOVER BUDGET {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark for NEXUS Pentest LLM
+Runs the FastAPI app in-process against an in-memory Mongo stand-in and a
+stubbed LLM, drives a weighted mix of chat, tool, workflow, history and
+export traffic at a fixed concurrency, and reports latency percentiles and
+throughput per endpoint. With --baseline it exits non-zero when an
+endpoint's p95 or throughput regressed beyond --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "backend"))
+sys.path.insert(0, str(BENCH_DIR))
+
+DEFAULT_BASELINE = BENCH_DIR / "baselines" / "load.json"
+
+# Endpoint -> relative weight in the traffic mix
+DEFAULT_MIX = {"chat": 3, "tool": 4, "workflow": 1, "history": 3, "export": 1}
+
+TOOLS = ["nmap", "nikto", "gobuster", "sqlmap", "whois", "subfinder", "hydra", "wpscan"]
+WORKFLOWS = ["quick_recon", "web_app_audit", "network_sweep"]
+FORMATS = ["txt", "json", "html", "md"]
+
+STUB_RESPONSE = """Starting reconnaissance on {target}.
+EXECUTE_TOOL: nmap -sV {target}
+EXECUTE_TOOL: nikto -h {target}
+I'll report the open services and web findings once the scans complete."""
+
+
+def prepare_environment(workdir: Path):
+    """Point every on-disk store at a scratch directory before the app is imported"""
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "nexus_bench")
+    os.environ["EMERGENT_LLM_KEY"] = "bench"
+    for name, path in {
+        "SANDBOX_DIR": "sandbox",
+        "SANDBOX_BLOB_DIR": "blobs",
+        "SANDBOX_UPLOAD_DIR": "uploads",
+        "SANDBOX_SEARCH_DB": "search.sqlite",
+        "REPORT_CACHE_DIR": "reports",
+        "VULN_DB_PATH": "vulndb.sqlite",
+    }.items():
+        os.environ[name] = str(workdir / path)
+
+
+class StubLlmChat:
+    """Stands in for LlmChat: fixed latency and a canned reply with tool calls"""
+
+    latency = 0.05
+
+    def __init__(self, api_key, session_id, system_message):
+        self.session_id = session_id
+
+    def with_model(self, provider, model):
+        return self
+
+    async def send_message(self, message):
+        await asyncio.sleep(self.latency)
+        return STUB_RESPONSE.format(target=f"10.0.0.{len(message.text) % 250}")
+
+
+class StubUserMessage:
+    """Stands in for UserMessage, so the LLM client is never imported"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+# Chat replies get_llm_response sends when the LLM call itself failed; counted as errors
+LLM_ERROR_PREFIXES = ("Error communicating with AI", "LLM API key not configured")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class LoadRun:
+    def __init__(self, client, sessions, mix, seed):
+        self.client = client
+        self.sessions = sessions
+        self.endpoints = list(mix)
+        self.weights = [mix[e] for e in self.endpoints]
+        self.rng = random.Random(seed)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, endpoint):
+        session_id = self.rng.choice(self.sessions)
+        target = f"10.0.{self.rng.randint(0, 20)}.{self.rng.randint(1, 254)}"
+        if endpoint == "chat":
+            return "POST", "/api/chat", {"session_id": session_id, "message": f"Scan {target} and summarise"}
+        if endpoint == "tool":
+            return "POST", "/api/tools/execute", {
+                "session_id": session_id, "tool_name": self.rng.choice(TOOLS), "parameters": {"target": target}}
+        if endpoint == "workflow":
+            return "POST", "/api/workflows/execute", {
+                "session_id": session_id, "workflow_id": self.rng.choice(WORKFLOWS), "target": target}
+        if endpoint == "history":
+            return "GET", f"/api/sessions/{session_id}/bundle", None
+        return "POST", "/api/export/report", {"session_id": session_id, "format": self.rng.choice(FORMATS)}
+
+    async def worker(self, deadline):
+        while time.perf_counter() < deadline:
+            endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+            method, url, body = self.request(endpoint)
+            started = time.perf_counter()
+            response = await self.client.request(method, url, json=body)
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            if response.status_code >= 400 or (
+                    endpoint == "chat" and response.json().get("response", "").startswith(LLM_ERROR_PREFIXES)):
+                self.errors[endpoint] += 1
+
+    async def run(self, concurrency, duration):
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(self.worker(deadline) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            endpoint: {
+                "requests": len(samples),
+                "errors": self.errors[endpoint],
+                "throughput_rps": len(samples) / elapsed,
+                "p50_ms": percentile(samples, 50) * 1e3,
+                "p95_ms": percentile(samples, 95) * 1e3,
+                "p99_ms": percentile(samples, 99) * 1e3,
+            }
+            for endpoint, samples in sorted(self.latencies.items())
+        }
+
+
+async def benchmark(args):
+    import httpx
+    import server
+    from memory_db import MemoryDatabase
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server.db = MemoryDatabase()
+    server.LlmChat = StubLlmChat
+    server.UserMessage = StubUserMessage
+    StubLlmChat.latency = args.llm_latency
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        sessions = []
+        for n in range(args.sessions):
+            response = await client.post("/api/sessions", params={"name": f"bench-{n}"})
+            sessions.append(response.json()["id"])
+
+        mix = {k: v for k, v in args.mix.items() if v > 0}
+        # Warm-up: fills sessions with history and findings, primes caches
+        await LoadRun(client, sessions, mix, seed=0).run(args.concurrency, args.warmup)
+        return await LoadRun(client, sessions, mix, seed=1).run(args.concurrency, args.duration)
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages for endpoints slower (p95) or with lower throughput than the baseline"""
+    failures = []
+    for endpoint, expected in baseline.get("endpoints", {}).items():
+        actual = results.get(endpoint)
+        if actual is None:
+            continue
+        if actual["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            failures.append(f"{endpoint}: p95 {actual['p95_ms']:.1f}ms > baseline {expected['p95_ms']:.1f}ms")
+        if actual["throughput_rps"] < expected["throughput_rps"] * (1 - tolerance):
+            failures.append(f"{endpoint}: {actual['throughput_rps']:.1f} req/s < baseline "
+                            f"{expected['throughput_rps']:.1f} req/s")
+    return failures
+
+
+def parse_mix(value):
+    mix = {endpoint: 0 for endpoint in DEFAULT_MIX}
+    for part in filter(None, value.split(",")):
+        endpoint, _, weight = part.partition("=")
+        if endpoint not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {endpoint!r} (choose from {', '.join(DEFAULT_MIX)})")
+        mix[endpoint] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before the run")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stubbed LLM reply delay in seconds")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="endpoint weights, e.g. chat=1,tool=5 (unlisted endpoints are disabled)")
+    parser.add_argument("--baseline", type=Path, nargs="?", const=DEFAULT_BASELINE,
+                        help=f"compare against a baseline file (default {DEFAULT_BASELINE.relative_to(BENCH_DIR)})")
+    parser.add_argument("--save-baseline", type=Path, nargs="?", const=DEFAULT_BASELINE,
+                        help="write this run's results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    # Checked before the run, so a missing baseline fails fast instead of after the whole benchmark
+    baseline = None
+    if args.baseline:
+        try:
+            baseline = json.loads(args.baseline.read_text())
+        except FileNotFoundError:
+            parser.error(f"baseline {args.baseline} does not exist; record one first with --save-baseline")
+        except ValueError as e:
+            parser.error(f"baseline {args.baseline} is not valid JSON: {e}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(Path(tmp))
+        results = asyncio.run(benchmark(args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"concurrency={args.concurrency} duration={args.duration:g}s llm_latency={args.llm_latency * 1e3:g}ms")
+        for endpoint, r in results.items():
+            print(f"{endpoint:<9} {r['throughput_rps']:8.1f} req/s  p50={r['p50_ms']:8.1f}ms  "
+                  f"p95={r['p95_ms']:8.1f}ms  p99={r['p99_ms']:8.1f}ms  n={r['requests']}  errors={r['errors']}")
+
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps({
+            "config": {"concurrency": args.concurrency, "duration": args.duration,
+                       "llm_latency": args.llm_latency, "sessions": args.sessions, "mix": args.mix},
+            "endpoints": results,
+        }, indent=2) + "\n")
+        print(f"baseline written to {args.save_baseline}")
+
+    failed = any(r["errors"] for r in results.values())
+    if baseline is not None:
+        failures = compare(results, baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+CPU hot-path microbenchmarks for NEXUS Pentest LLM
+Times tool simulation, the tool catalogue, vulnerability search/correlation
+over synthetic feeds, text report building and tool-call parsing, in the
+manner of pytest-benchmark (calibrated iterations per round, min/median/
+mean/stddev per benchmark). Each run is appended to a JSON-lines history
+file; --compare-fail exits non-zero when a benchmark's median regressed
+against recent runs on the same machine.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "backend"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_load import STUB_RESPONSE, prepare_environment  # noqa: E402
+
+DEFAULT_HISTORY = BENCH_DIR / "history" / "micro.jsonl"
+
+# Slowdowns above this are printed even when --compare-fail isn't set
+REPORT_THRESHOLD = 0.1
+
+
+class Runner:
+    """Calibrates iterations so a round lasts at least min_time, then times `rounds` rounds"""
+
+    def __init__(self, rounds, min_time, pattern=None):
+        self.rounds = rounds
+        self.min_time = min_time
+        self.pattern = pattern
+        self.results = {}
+
+    @staticmethod
+    def _time(fn, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return time.perf_counter() - started
+
+    def bench(self, name, fn):
+        if self.pattern and self.pattern not in name:
+            return
+        iterations = 1
+        while (elapsed := self._time(fn, iterations)) < self.min_time:
+            iterations = max(iterations * 2, int(iterations * self.min_time / max(elapsed, 1e-9)))
+        samples = [self._time(fn, iterations) / iterations for _ in range(self.rounds)]
+        result = self.results[name] = {
+            "min": min(samples),
+            "max": max(samples),
+            "mean": statistics.fmean(samples),
+            "stddev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            "median": statistics.median(samples),
+            "rounds": self.rounds,
+            "iterations": iterations,
+        }
+        print(f"{name:<48} min={result['min'] * 1e6:11.2f}us  median={result['median'] * 1e6:11.2f}us  "
+              f"mean={result['mean'] * 1e6:11.2f}us  stddev={result['stddev'] * 1e6:9.2f}us  "
+              f"ops={1 / result['median']:12,.0f}/s")
+
+    def wants(self, *names):
+        """Whether any of these benchmarks (or name prefixes) will run, to skip expensive setup"""
+        return not self.pattern or any(self.pattern in name or name in self.pattern for name in names)
+
+
+def bench_tools(runner, server):
+    runner.bench("get_all_tools", server.get_all_tools)
+    params = {"target": "10.0.0.5", "url": "http://10.0.0.5", "domain": "example.com"}
+    for tool in server.get_all_tools():
+        runner.bench(f"simulate_tool_execution[{tool['id']}]",
+                     lambda tool_id=tool["id"]: server.simulate_tool_execution(tool_id, params))
+
+
+def bench_vulnerabilities(runner, server, loop, workdir, sizes):
+    import vulndb
+    from bench_vulndb import make_feed, make_version
+
+    rng = random.Random(3)
+    for records in sizes:
+        if not runner.wants(f"search_vulnerabilities[{records}]", f"correlate_vulnerabilities[{records}x"):
+            continue
+        feed, db_path = workdir / f"feed-{records}.json", workdir / f"vulndb-{records}.sqlite"
+        products = make_feed(feed, records, max(10, records // 100))
+        server.VULN_STORE = vulndb.open_store(db_path, feed_path=feed)
+        vendors = itertools.cycle([vendor for vendor, _ in products[:200]])
+        runner.bench(f"search_vulnerabilities[{records}]",
+                     lambda: loop.run_until_complete(server.search_vulnerabilities(next(vendors), None, 100, 0)))
+        services = [f"{product} {make_version(rng)}" for _, product in rng.sample(products, min(100, len(products)))]
+        runner.bench(f"correlate_vulnerabilities[{records}x{len(services)}]",
+                     lambda: loop.run_until_complete(server.correlate_vulnerabilities(services, None, 100)))
+        server.VULN_STORE.close()
+
+
+def bench_export(runner, server, loop, executions):
+    from bench_reports import SESSION_ID, populate
+    from memory_db import MemoryDatabase
+
+    if not runner.wants(f"export_report[txt,{executions}]"):
+        return
+    server.db = MemoryDatabase()
+    populate(server.db, executions)
+    # An untracked session is never served from the report cache, so every call builds the report
+    server.db.sessions.docs.clear()
+    request = server.ExportRequest(session_id=SESSION_ID, format="txt")
+    runner.bench(f"export_report[txt,{executions}]",
+                 lambda: loop.run_until_complete(server.export_report(request, None)))
+
+
+def bench_parsing(runner, server):
+    response = STUB_RESPONSE.format(target="10.0.0.5")
+    runner.bench("parse_tool_calls[short]", lambda: server.parse_tool_calls(response))
+    long_response = "\n".join([f"Observation {n}: nothing notable on port {n}." for n in range(500)] + [response] * 20)
+    runner.bench("parse_tool_calls[long]", lambda: server.parse_tool_calls(long_response))
+    runner.bench("parse_tool_calls[none]", lambda: server.parse_tool_calls("No tools needed for this request."))
+
+
+def machine_id():
+    return f"{platform.node()}/{platform.machine()}/{platform.python_implementation()}-{platform.python_version()}"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+def compare(results, history, machine, window, threshold):
+    """Benchmarks whose median is more than `threshold` slower than the median of the last `window` runs"""
+    previous = [run for run in history if run.get("machine") == machine][-window:]
+    regressions = []
+    for name, result in results.items():
+        medians = [run["benchmarks"][name]["median"] for run in previous if name in run.get("benchmarks", {})]
+        if not medians:
+            continue
+        reference = statistics.median(medians)
+        change = result["median"] / reference - 1
+        if change > threshold:
+            regressions.append(f"{name}: median {result['median'] * 1e6:.2f}us is {change:+.0%} "
+                               f"vs {reference * 1e6:.2f}us over {len(medians)} runs")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--min-time", type=float, default=0.02, help="minimum seconds per round")
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    parser.add_argument("--feed-sizes", default="10000,100000",
+                        help="comma-separated synthetic feed sizes (e.g. 10000,100000,500000)")
+    parser.add_argument("--executions", type=int, default=10_000, help="executions in the exported session")
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to the history")
+    parser.add_argument("--compare-window", type=int, default=5, help="previous runs to compare against")
+    parser.add_argument("--compare-fail", type=float, metavar="FRACTION",
+                        help="exit 1 if a median regressed by more than this (e.g. 0.2)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        prepare_environment(workdir)
+        import server
+
+        runner = Runner(args.rounds, args.min_time, args.pattern)
+        loop = asyncio.new_event_loop()
+        try:
+            bench_tools(runner, server)
+            bench_parsing(runner, server)
+            bench_vulnerabilities(runner, server, loop, workdir, [int(n) for n in args.feed_sizes.split(",") if n])
+            bench_export(runner, server, loop, args.executions)
+        finally:
+            loop.close()
+
+    machine = machine_id()
+    history = load_history(args.history)
+    threshold = args.compare_fail if args.compare_fail is not None else REPORT_THRESHOLD
+    regressions = compare(runner.results, history, machine, args.compare_window, threshold)
+    for regression in regressions:
+        print(f"{'REGRESSION' if args.compare_fail is not None else 'slower'} {regression}")
+
+    if not args.no_save:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.history, "a") as f:
+            f.write(json.dumps({
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "commit": git_commit(),
+                "machine": machine,
+                "benchmarks": runner.results,
+            }, sort_keys=True) + "\n")
+
+    sys.exit(1 if args.compare_fail is not None and regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Report rendering benchmark for NEXUS Pentest LLM
+Renders a synthetic session with many tool executions in every export format
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from findings import extract_findings, finding_documents  # noqa: E402
+from memory_db import MemoryDatabase  # noqa: E402
+from reports import REPORT_MEDIA_TYPES, stream_report  # noqa: E402
+
+SESSION_ID = "bench-session"
+
+OUTPUTS = {
+    "nmap": """Starting Nmap 7.94
+Nmap scan report for {target}
+PORT     STATE SERVICE VERSION
+22/tcp   open  ssh     OpenSSH 8.2p1 Ubuntu
+80/tcp   open  http    Apache httpd 2.4.41
+3306/tcp open  mysql   MySQL 8.0.28
+""",
+    "gobuster": """/admin                (Status: 200) [Size: 1234]
+/backup               (Status: 403) [Size: 287]
+/uploads              (Status: 301) [Size: 312]
+""",
+    "nikto": """+ Server: Apache/2.4.41
++ /config.php: PHP config file may contain <database> credentials & "secrets"
++ OSVDB-3092: /admin/: This might be interesting...
+""",
+}
+
+
+def populate(db, executions, seed=1):
+    """Fill the collections the way execute_tool would for one session"""
+    rng = random.Random(seed)
+    for n in range(executions):
+        tool = rng.choice(list(OUTPUTS))
+        target = f"10.0.{n % 250}.{rng.randint(1, 254)}"
+        output = OUTPUTS[tool].format(target=target)
+        execution_id = f"exe-{n}"
+        timestamp = f"2024-01-01T00:{n // 60 % 60:02d}:{n % 60:02d}+00:00"
+        db.tool_executions.docs.append({
+            "id": execution_id,
+            "session_id": SESSION_ID,
+            "tool_name": tool,
+            "parameters": {"target": target},
+            "status": "success",
+            "output": output,
+            "timestamp": timestamp,
+        })
+        findings = extract_findings(tool, output, {"target": target})
+        db.findings.docs.extend(finding_documents(findings, SESSION_ID, execution_id, tool, timestamp))
+        if n % 10 == 0:
+            db.chat_messages.docs.append({
+                "id": f"msg-{n}",
+                "session_id": SESSION_ID,
+                "role": "user" if n % 20 else "assistant",
+                "content": f"Run {tool} against {target} and summarise <results>",
+                "timestamp": timestamp,
+            })
+    db.sessions.docs.append({"id": SESSION_ID, "content_version": 1})
+
+
+async def render(db, format):
+    size = chunks = 0
+    async for chunk in stream_report(db, SESSION_ID, format):
+        size += len(chunk)
+        chunks += 1
+    return size, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--executions", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    db = MemoryDatabase()
+    populate(db, args.executions)
+    print(f"session: {args.executions} executions, {len(db.findings.docs)} findings, "
+          f"{len(db.chat_messages.docs)} chat messages")
+
+    for format in REPORT_MEDIA_TYPES:
+        best = None
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            size, chunks = asyncio.run(render(db, format))
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        tracemalloc.start()
+        asyncio.run(render(db, format))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{format:<5} {best * 1e3:9.1f}ms  {args.executions / best:10,.0f} executions/s  "
+              f"{size / 1e6:6.2f} MB in {chunks} chunks  peak alloc {peak / 1e6:6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
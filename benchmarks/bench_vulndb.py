@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Vulnerability store benchmark for NEXUS Pentest LLM
+Builds a synthetic NVD 2.0 feed, indexes it and times version-aware lookups
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import vulndb  # noqa: E402
+
+SEVERITIES = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+
+def make_version(rng):
+    return f"{rng.randint(0, 12)}.{rng.randint(0, 20)}.{rng.randint(0, 60)}"
+
+
+def make_feed(path, records, products, seed=1):
+    """Write a synthetic NVD 2.0 feed with ranged CPE matches"""
+    rng = random.Random(seed)
+    product_names = [(f"vendor{i}", f"product{i}") for i in range(products)]
+    product_names[:3] = [("apache", "http_server"), ("openbsd", "openssh"), ("oracle", "mysql")]
+    items = []
+    for n in range(records):
+        vendor, product = rng.choice(product_names)
+        start, end = sorted([make_version(rng), make_version(rng)], key=vulndb.version_key)
+        items.append({"cve": {
+            "id": f"CVE-{2000 + n % 25}-{n:07d}",
+            "descriptions": [{"lang": "en", "value": f"Synthetic issue {n} in {product}"}],
+            "metrics": {"cvssMetricV31": [{"cvssData": {"baseSeverity": rng.choice(SEVERITIES)}}]},
+            "configurations": [{"nodes": [{"cpeMatch": [{
+                "vulnerable": True,
+                "criteria": f"cpe:2.3:a:{vendor}:{product}:*:*:*:*:*:*:*:*",
+                "versionStartIncluding": start,
+                "versionEndExcluding": end,
+            }]}]}],
+        }})
+    path.write_text(json.dumps({"vulnerabilities": items}))
+    return product_names
+
+
+def percentile(samples, pct):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def report(name, samples):
+    print(f"{name:<28} p50={statistics.median(samples) * 1e6:9.1f}us  "
+          f"p99={percentile(samples, 99) * 1e6:9.1f}us  n={len(samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--batch", type=int, default=2_000, help="services per correlate call")
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        feed, db = Path(tmp) / "feed.json", Path(tmp) / "vulndb.sqlite"
+        products = make_feed(feed, args.records, args.products)
+
+        started = time.perf_counter()
+        store = vulndb.open_store(db, feed_path=feed)
+        print(f"indexed {len(store)} records in {time.perf_counter() - started:.2f}s "
+              f"({db.stat().st_size / 1e6:.1f} MB on disk)")
+
+        # Warm the per-product interval indexes once, as a long-lived worker would
+        for _, product in products:
+            store.lookup(product, "1.0")
+
+        samples = []
+        for _ in range(args.queries):
+            _, product = rng.choice(products)
+            version = make_version(rng)
+            started = time.perf_counter()
+            store.lookup(product, version)
+            samples.append(time.perf_counter() - started)
+        report("lookup(product, version)", samples)
+
+        samples = []
+        for _ in range(args.queries):
+            vendor, _ = rng.choice(products)
+            started = time.perf_counter()
+            store.search(vendor, limit=50)
+            samples.append(time.perf_counter() - started)
+        report("search(service)", samples)
+
+        services = [f"{rng.choice(products)[1]} {make_version(rng)}" for _ in range(args.batch)]
+        started = time.perf_counter()
+        correlations = store.correlate(services, limit_per_service=20)
+        elapsed = time.perf_counter() - started
+        matched = sum(c["match_count"] for c in correlations)
+        print(f"correlate({args.batch} services)      {elapsed * 1e3:9.1f}ms  "
+              f"{args.batch / elapsed:,.0f} services/s, {matched} version-matched CVEs")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+In-memory stand-in for the subset of the Motor API the backend uses
+Lets benchmarks drive the real report/query code without a MongoDB server
+"""
+
+import copy
+from typing import Any, Dict, List
+
+
+def _get(doc, dotted):
+    for part in dotted.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def _matches(doc, query):
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in condition):
+                return False
+            continue
+        value = _get(doc, key)
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$exists" and (value is not None) != bool(operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$lte" and not (value is not None and value <= operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    included = [k for k, v in projection.items() if v and k != "_id"]
+    if included:
+        return {k: copy.deepcopy(doc[k]) for k in included if k in doc}
+    excluded = {k for k, v in projection.items() if not v}
+    return {k: copy.deepcopy(v) for k, v in doc.items() if k not in excluded}
+
+
+def _sort_key(value):
+    # None sorts first, like MongoDB
+    return (value is not None, value if value is not None else 0)
+
+
+class DuplicateKeyError(Exception):
+    code = 11000
+
+
+class MemoryCursor:
+    def __init__(self, docs: List[Dict[str, Any]], projection=None):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        keys = key_or_list if isinstance(key_or_list, list) else [(key_or_list, direction or 1)]
+        for key, order in reversed(keys):
+            self._docs.sort(key=lambda d: _sort_key(_get(d, key)), reverse=order < 0)
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def _selected(self):
+        docs = self._docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return docs
+
+    async def to_list(self, length=None):
+        docs = self._selected()
+        if length:
+            docs = docs[:length]
+        return [_project(d, self._projection) for d in docs]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._selected():
+            yield _project(doc, self._projection)
+
+
+class MemoryCollection:
+    def __init__(self, name, database=None):
+        self.name = name
+        self.database = database
+        self.docs: List[Dict[str, Any]] = []
+
+    async def create_index(self, *args, **kwargs):
+        return None
+
+    async def insert_one(self, doc):
+        if "_id" in doc and any(d.get("_id") == doc["_id"] for d in self.docs):
+            raise DuplicateKeyError(f"duplicate key {doc['_id']!r} in {self.name}")
+        self.docs.append(copy.deepcopy(doc))
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(copy.deepcopy(d) for d in docs)
+
+    def find(self, query=None, projection=None):
+        return MemoryCursor([d for d in self.docs if _matches(d, query)], projection)
+
+    async def find_one(self, query=None, projection=None):
+        for doc in self.docs:
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    async def count_documents(self, query):
+        return sum(1 for d in self.docs if _matches(d, query))
+
+    async def distinct(self, key, query=None):
+        values = []
+        for doc in self.docs:
+            value = _get(doc, key)
+            if value is not None and _matches(doc, query) and value not in values:
+                values.append(value)
+        return values
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs:
+            if _matches(doc, query):
+                self._apply(doc, update)
+                return
+        if upsert:
+            doc = {k: v for k, v in query.items() if not k.startswith("$")}
+            self._apply(doc, update)
+            self.docs.append(doc)
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=False, upsert=False):
+        for doc in self.docs:
+            if _matches(doc, query):
+                before = _project(doc, projection)
+                self._apply(doc, update)
+                return _project(doc, projection) if return_document else before
+        if upsert:
+            await self.update_one(query, update, upsert=True)
+            return _project(self.docs[-1], projection) if return_document else None
+        return None
+
+    @staticmethod
+    def _apply(doc, update):
+        for key, value in update.get("$set", {}).items():
+            doc[key] = copy.deepcopy(value)
+        for key, value in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + value
+        for key, value in update.get("$push", {}).items():
+            doc.setdefault(key, []).append(copy.deepcopy(value))
+
+    async def delete_one(self, query):
+        for i, doc in enumerate(self.docs):
+            if _matches(doc, query):
+                del self.docs[i]
+                return
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+
+    def aggregate(self, pipeline):
+        return _Aggregation(self, pipeline)
+
+
+def _resolve(expression, doc, variables):
+    if isinstance(expression, str) and expression.startswith("$$"):
+        return variables.get(expression[2:])
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get(doc, expression[1:])
+    return expression
+
+
+def _expr_matches(doc, expression, variables):
+    (op, (left, right)), = expression.items()
+    if op != "$eq":
+        raise NotImplementedError(f"Unsupported $expr operator: {op}")
+    return _resolve(left, doc, variables) == _resolve(right, doc, variables)
+
+
+def _run_pipeline(docs, pipeline, database, variables=None):
+    variables = variables or {}
+    for stage in pipeline:
+        if "$match" in stage:
+            query = dict(stage["$match"])
+            expression = query.pop("$expr", None)
+            docs = [d for d in docs if _matches(d, query)
+                    and (expression is None or _expr_matches(d, expression, variables))]
+        elif "$group" in stage:
+            spec = stage["$group"]
+            key_expr = spec["_id"]
+            groups: Dict[Any, Dict[str, Any]] = {}
+            for doc in docs:
+                key = _get(doc, key_expr[1:]) if isinstance(key_expr, str) else key_expr
+                group = groups.setdefault(key, {"_id": key, **{f: 0 for f in spec if f != "_id"}})
+                for field, acc in spec.items():
+                    if field == "_id":
+                        continue
+                    operand = acc["$sum"]
+                    group[field] += (_get(doc, operand[1:]) or 0) if isinstance(operand, str) else operand
+            docs = list(groups.values())
+        elif "$sort" in stage:
+            cursor = MemoryCursor(list(docs)).sort(list(stage["$sort"].items()))
+            docs = cursor._docs
+        elif "$limit" in stage:
+            docs = docs[:stage["$limit"]]
+        elif "$project" in stage:
+            docs = [_project(d, stage["$project"]) for d in docs]
+        elif "$lookup" in stage:
+            spec = stage["$lookup"]
+            foreign = database[spec["from"]].docs
+            joined = []
+            for doc in docs:
+                if "pipeline" in spec:
+                    let = {name: _resolve(expr, doc, variables) for name, expr in spec.get("let", {}).items()}
+                    matches = _run_pipeline(foreign, spec["pipeline"], database, let)
+                else:
+                    value = _get(doc, spec["localField"])
+                    matches = [f for f in foreign if _get(f, spec["foreignField"]) == value]
+                joined.append({**doc, spec["as"]: matches})
+            docs = joined
+        else:
+            raise NotImplementedError(f"Unsupported pipeline stage: {list(stage)}")
+    return docs
+
+
+class _Aggregation:
+    def __init__(self, collection, pipeline):
+        self._collection = collection
+        self._pipeline = pipeline
+
+    def _run(self):
+        return _run_pipeline(self._collection.docs, self._pipeline, self._collection.database)
+
+    async def to_list(self, length=None):
+        return copy.deepcopy(self._run()[:length] if length else self._run())
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._run():
+            yield copy.deepcopy(doc)
+
+
+class MemoryDatabase:
+    """Attribute/item access to lazily created in-memory collections"""
+
+    def __init__(self):
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name, self)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
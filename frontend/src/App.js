@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useRef } from "react";
 import "@/App.css";
 import { BrowserRouter, Routes, Route } from "react-router-dom";
 import axios from "axios";
@@ -17,6 +17,8 @@ import { QuickActions } from "@/components/QuickActions";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+// Prefetched directory listings are reused for this long at most
+const FILE_TREE_CACHE_TTL_MS = 10000;
 
 function Dashboard() {
   const [sessions, setSessions] = useState([]);
@@ -60,7 +62,8 @@ function Dashboard() {
     }
   }, []);
 
-  // Fetch chat history
+  // Fetch chat history (from the messages themselves: the session bundle's limit
+  // covers tool executions too, so a burst of tool runs would push the chat out)
   const fetchChatHistory = useCallback(async (sessionId) => {
     try {
       const response = await axios.get(`${API}/chat/history/${sessionId}`);
@@ -70,16 +73,43 @@ function Dashboard() {
     }
   }, []);
 
-  // Fetch files
+  // Fetch files: one tree request prefetches the listings of the next levels,
+  // so navigating into a subdirectory is served from the cache. The cache is
+  // short-lived (writes may come from other clients) and cleared after anything
+  // that can change the sandbox
+  const fileTreeCache = useRef({ listings: {}, fetchedAt: 0 });
+  const currentPathRef = useRef("/");
+  const invalidateFileTree = useCallback(() => {
+    fileTreeCache.current = { listings: {}, fetchedAt: 0 };
+  }, []);
   const fetchFiles = useCallback(async (path = "/") => {
+    const fresh = Date.now() - fileTreeCache.current.fetchedAt < FILE_TREE_CACHE_TTL_MS;
+    const cached = fresh && fileTreeCache.current.listings[path];
+    if (cached && path !== currentPathRef.current) {
+      setFiles(cached);
+      setCurrentPath(path);
+      currentPathRef.current = path;
+      return;
+    }
     try {
-      const response = await axios.get(`${API}/files/list?path=${encodeURIComponent(path)}`);
-      if (response.data.status === "success" && response.data.items) {
-        setFiles(response.data.items);
+      const response = await axios.get(`${API}/files/tree`, {
+        params: { path, depth: 3, max_nodes: 2000 }
+      });
+      if (response.data.status === "success" && response.data.tree) {
+        const listings = {};
+        const visit = (node) => {
+          if (!node.children || node.next) return;
+          listings[node.path] = node.children.map(({ name, type, size }) => ({ name, type, size }));
+          node.children.forEach(visit);
+        };
+        visit(response.data.tree);
+        fileTreeCache.current = { listings, fetchedAt: Date.now() };
+        setFiles(listings[response.data.tree.path] || response.data.tree.children || []);
       } else {
         setFiles([]);
       }
       setCurrentPath(path);
+      currentPathRef.current = path;
     } catch (e) {
       console.error("Error fetching files:", e);
       setFiles([]);
@@ -90,11 +120,12 @@ function Dashboard() {
   const initSandbox = useCallback(async () => {
     try {
       await axios.post(`${API}/files/init-sandbox`);
+      invalidateFileTree();
       fetchFiles("/");
     } catch (e) {
       console.error("Error initializing sandbox:", e);
     }
-  }, [fetchFiles]);
+  }, [fetchFiles, invalidateFileTree]);
 
   // Create new session
   const createSession = async (name = "New Session") => {
@@ -194,6 +225,7 @@ function Dashboard() {
         session_id: currentSession.id
       });
 
+      invalidateFileTree();
       const output = `\n[+] ${toolName.toUpperCase()} Results:\n${response.data.output}\n[*] Execution time: ${response.data.execution_time.toFixed(2)}s\n`;
       setTerminalOutput(prev => prev + output);
       toast.success(`${toolName} executed successfully`);
@@ -229,6 +261,7 @@ function Dashboard() {
         session_id: sessionId
       });
 
+      invalidateFileTree();
       // Display results
       for (const result of response.data.results) {
         setTerminalOutput(prev => prev + `\n[+] ${result.tool.toUpperCase()}:\n${result.output}\n`);
@@ -245,17 +278,15 @@ function Dashboard() {
   // File operations
   const readFile = async (path) => {
     try {
-      const response = await axios.post(`${API}/files/operation`, {
-        operation: "read",
-        path: path
+      // Preview the first lines only; large files are read as a window, not whole
+      const response = await axios.get(`${API}/files/read`, {
+        params: { path, line: 0, lines: 200 }
       });
-      if (response.data.status === "success") {
-        setTerminalOutput(prev => prev + `\n[*] Reading ${path}:\n${response.data.output}\n`);
-      } else {
-        toast.error(response.data.output);
-      }
+      const { content, eof, size } = response.data;
+      const more = eof ? "" : `[...] preview truncated (${size} bytes total)\n`;
+      setTerminalOutput(prev => prev + `\n[*] Reading ${path}:\n${content}\n${more}`);
     } catch (e) {
-      toast.error("Failed to read file");
+      toast.error(e.response?.data?.detail || "Failed to read file");
     }
   };
 
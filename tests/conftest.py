@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+# The backend modules read these when imported, so point them at scratch space first
+SCRATCH = Path(tempfile.mkdtemp(prefix="nexus-tests-"))
+for name, path in {
+    "SANDBOX_DIR": "sandbox",
+    "SANDBOX_BLOB_DIR": "blobs",
+    "SANDBOX_UPLOAD_DIR": "uploads",
+    "SANDBOX_SEARCH_DB": "search.sqlite",
+    "SANDBOX_MANIFEST_STAMP": "sandbox.manifest",
+    "REPORT_CACHE_DIR": "reports",
+    "PROFILE_DIR": "profiles",
+}.items():
+    os.environ.setdefault(name, str(SCRATCH / path))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "nexus_tests")
@@ -0,0 +1,44 @@
+import sys
+
+import pytest
+
+import bench_load
+
+
+def run_main(monkeypatch, *argv):
+    def no_benchmark(args):
+        raise AssertionError("the benchmark must not run")
+
+    monkeypatch.setattr(bench_load, "benchmark", no_benchmark)
+    monkeypatch.setattr(sys, "argv", ["bench_load.py", *argv])
+    with pytest.raises(SystemExit) as exit_info:
+        bench_load.main()
+    return exit_info.value.code
+
+
+def test_missing_baseline_fails_before_running(monkeypatch, tmp_path, capsys):
+    assert run_main(monkeypatch, "--baseline", str(tmp_path / "load.json")) == 2
+    assert "does not exist; record one first with --save-baseline" in capsys.readouterr().err
+
+
+def test_invalid_baseline_fails_before_running(monkeypatch, tmp_path, capsys):
+    path = tmp_path / "load.json"
+    path.write_text("{")
+    assert run_main(monkeypatch, "--baseline", str(path)) == 2
+    assert "is not valid JSON" in capsys.readouterr().err
+
+
+def test_compare_flags_slower_p95_and_lower_throughput():
+    baseline = {"endpoints": {
+        "chat": {"p95_ms": 100.0, "throughput_rps": 50.0},
+        "tool": {"p95_ms": 10.0, "throughput_rps": 200.0},
+        "export": {"p95_ms": 20.0, "throughput_rps": 10.0},
+    }}
+    results = {
+        "chat": {"p95_ms": 124.0, "throughput_rps": 38.0},
+        "tool": {"p95_ms": 13.0, "throughput_rps": 140.0},
+    }
+    assert bench_load.compare(results, baseline, tolerance=0.25) == [
+        "tool: p95 13.0ms > baseline 10.0ms",
+        "tool: 140.0 req/s < baseline 200.0 req/s",
+    ]
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from coalesce import ReadCoalescer
+
+
+class Query:
+    """A read that counts its executions and blocks until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return {"call": self.calls}
+
+
+def test_concurrent_identical_reads_share_one_query():
+    async def scenario():
+        reads = ReadCoalescer()
+        query = Query()
+        waiting = [asyncio.ensure_future(reads.read("sessions", "s1", 50, query)) for _ in range(5)]
+        other = asyncio.ensure_future(reads.read("sessions", "s1", 100, query))
+        await asyncio.sleep(0)
+        query.release.set()
+        results = await asyncio.gather(*waiting, other)
+        assert query.calls == 2
+        assert results[:5] == [{"call": 1}] * 5
+        # Nothing is kept once the query is done (no TTL)
+        await reads.read("sessions", "s1", 50, query)
+        assert query.calls == 3
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_detaches_in_flight_reads():
+    async def scenario():
+        reads = ReadCoalescer()
+        before, after = Query(), Query()
+        joined = asyncio.ensure_future(reads.read("history", "s1", None, before))
+        await asyncio.sleep(0)
+        reads.invalidate("s1")
+        # A read starting after the write queries again instead of joining the stale one
+        fresh = asyncio.ensure_future(reads.read("history", "s1", None, after))
+        await asyncio.sleep(0)
+        before.release.set()
+        after.release.set()
+        assert await joined == {"call": 1}
+        assert await fresh == {"call": 1}
+        assert (before.calls, after.calls) == (1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_ttl_cache_is_dropped_by_invalidate():
+    async def scenario():
+        reads = ReadCoalescer(ttl=60)
+        query = Query()
+        query.release.set()
+        await reads.read("history", "s1", None, query)
+        await reads.read("history", "s1", None, query)
+        await reads.read("history", "s2", None, query)
+        assert query.calls == 2
+        reads.invalidate("s1")
+        await reads.read("history", "s1", None, query)
+        await reads.read("history", "s2", None, query)
+        assert query.calls == 3
+
+    asyncio.run(scenario())
+
+
+def test_failed_reads_are_not_cached():
+    async def scenario():
+        reads = ReadCoalescer(ttl=60)
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            raise RuntimeError("database down")
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await reads.read("sessions", "sessions", None, failing)
+        assert calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_cache_is_bounded():
+    async def scenario():
+        reads = ReadCoalescer(ttl=60, max_entries=2)
+        query = Query()
+        query.release.set()
+        for key in (1, 2, 3, 1):
+            await reads.read("history", "s1", key, query)
+        assert query.calls == 4
+
+    asyncio.run(scenario())
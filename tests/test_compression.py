@@ -0,0 +1,111 @@
+import asyncio
+import gzip
+
+import pytest
+
+import compression
+from compression import CompressionMiddleware, choose_encoding, etag_matches
+
+BODY = b"x" * 4096
+
+
+def app_sending(status=200, headers=(), chunks=(BODY,)):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+def call(app, accept_encoding="gzip"):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request"}
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=1024)(scope, receive, send))
+    headers = {}
+    for name, value in sent[0]["headers"]:
+        headers.setdefault(name.decode(), []).append(value.decode())
+    return sent[0]["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("GZIP;q=0.5, br;q=0", "gzip"),
+])
+def test_choose_encoding(monkeypatch, header, expected):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding(header) == expected
+
+
+def test_brotli_is_preferred_when_available():
+    if compression.brotli is None:
+        pytest.skip("brotli is not installed")
+    assert choose_encoding("gzip, br") == "br"
+
+
+def test_compressed_response_weakens_etag_and_merges_vary(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    app = app_sending(headers=[(b"content-type", b"application/json"), (b"content-length", b"4096"),
+                               (b"etag", b'"report.v1"'), (b"vary", b"Origin")])
+    status, headers, body = call(app)
+    assert status == 200
+    assert gzip.decompress(body) == BODY
+    assert headers["content-encoding"] == ["gzip"]
+    assert headers["etag"] == ['W/"report.v1"']
+    assert headers["vary"] == ["Origin, Accept-Encoding"]
+    assert headers["content-length"] == [str(len(body))]
+
+
+def test_streamed_response_is_compressed_in_chunks(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    status, headers, body = call(app_sending(headers=[(b"content-type", b"application/x-ndjson")],
+                                             chunks=(b"a" * 10, b"b" * 10, b"")))
+    assert gzip.decompress(body) == b"a" * 10 + b"b" * 10
+    assert headers["vary"] == ["Accept-Encoding"]
+    assert "content-length" not in headers
+
+
+@pytest.mark.parametrize("status, headers, chunks", [
+    (200, [(b"content-type", b"application/json")], (b"{}",)),                       # below the threshold
+    (200, [(b"content-type", b"application/octet-stream")], (BODY,)),                # binary download
+    (206, [(b"content-type", b"text/plain"), (b"content-range", b"bytes 0-4095/8192")], (BODY,)),
+])
+def test_responses_passed_through(status, headers, chunks):
+    result_status, result_headers, body = call(app_sending(status, headers, chunks))
+    assert result_status == status
+    assert body == b"".join(chunks)
+    assert "content-encoding" not in result_headers
+
+
+def test_not_modified_carries_the_weak_etag(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    status, headers, _ = call(app_sending(304, [(b"etag", b'"report.v1"')], (b"",)))
+    assert status == 304
+    assert headers["etag"] == ['W/"report.v1"']
+
+
+def test_identity_clients_are_left_alone():
+    _, headers, body = call(app_sending(headers=[(b"content-type", b"text/plain"), (b"etag", b'"a"')]),
+                            accept_encoding="identity")
+    assert body == BODY
+    assert headers["etag"] == ['"a"']
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    ('"report.v1"', True),
+    ('W/"report.v1"', True),
+    ('"other", W/"report.v1"', True),
+    ("*", True),
+    ('"report.v2"', False),
+    (None, False),
+])
+def test_etag_matches_uses_weak_comparison(if_none_match, matches):
+    assert etag_matches(if_none_match, '"report.v1"') is matches
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Imports server with load_dotenv pointed at a scratch .env, then reports what the sibling modules saw
+SCRIPT = """
+import json, sys, dotenv
+load = dotenv.load_dotenv
+dotenv.load_dotenv = lambda path=None, **kwargs: load(sys.argv[1], **kwargs)
+import server, profiling, sandbox, history_cache
+print(json.dumps({
+    "profile_token": profiling.PROFILE_TOKEN,
+    "session_quota": sandbox.SESSION_QUOTA_BYTES,
+    "history_cache_bytes": history_cache.HISTORY_CACHE_BYTES,
+    "profiling_installed": any(m.cls.__name__ == "ProfilingMiddleware" for m in server.app.user_middleware),
+}))
+"""
+
+
+def test_dotenv_settings_reach_sibling_modules(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text("PROFILE_TOKEN=secret123\nSANDBOX_SESSION_QUOTA=4096\nHISTORY_CACHE_BYTES=2048\n")
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("PROFILE_TOKEN", "ADMIN_TOKEN", "SANDBOX_SESSION_QUOTA", "HISTORY_CACHE_BYTES")}
+    result = subprocess.run([sys.executable, "-c", SCRIPT, str(env_file)], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == (
+        '{"profile_token": "secret123", "session_quota": 4096, "history_cache_bytes": 2048, '
+        '"profiling_installed": true}')
+
+
+def test_importing_the_app_touches_no_disk(tmp_path):
+    state = tmp_path / "state"
+    env = {**os.environ, **{name: str(state / name.lower()) for name in (
+        "SANDBOX_DIR", "SANDBOX_BLOB_DIR", "SANDBOX_UPLOAD_DIR", "SANDBOX_SEARCH_DB", "SANDBOX_MANIFEST_STAMP",
+        "REPORT_CACHE_DIR", "PROFILE_DIR", "VULN_DB_PATH")}}
+    subprocess.run([sys.executable, "-c", "import server"], cwd=BACKEND_DIR, env=env, check=True)
+    assert not state.exists()
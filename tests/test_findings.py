@@ -0,0 +1,76 @@
+from findings import extract_findings, finding_documents
+
+NMAP_OUTPUT = """Starting Nmap 7.94 ( https://nmap.org )
+Nmap scan report for 10.0.0.5
+PORT     STATE    SERVICE VERSION
+22/tcp   open     ssh     OpenSSH 8.9p1 Ubuntu 3ubuntu0.1
+80/tcp   open     http    Apache httpd 2.4.52
+3306/tcp filtered mysql
+| vulners: CVE-2023-38408 CVE-2023-38408
+"""
+
+
+def by_type(findings, type):
+    return [f for f in findings if f["type"] == type]
+
+
+def test_nmap_ports_services_and_cves():
+    findings = extract_findings("nmap", NMAP_OUTPUT, {"target": "10.0.0.0/24"})
+    ports = by_type(findings, "port")
+    assert [(p["host"], p["port"], p["state"], p["service"]) for p in ports] == [
+        ("10.0.0.5", 22, "open", "ssh"),
+        ("10.0.0.5", 80, "open", "http"),
+        ("10.0.0.5", 3306, "filtered", "mysql"),
+    ]
+    assert [s["product"] for s in by_type(findings, "service")] == ["OpenSSH 8.9p1 Ubuntu 3ubuntu0.1",
+                                                                    "Apache httpd 2.4.52"]
+    # Repeated CVE references collapse into one finding
+    assert by_type(findings, "cve") == [{"type": "cve", "cve_id": "CVE-2023-38408", "host": "10.0.0.0/24"}]
+
+
+def test_paths_from_dirb_gobuster_and_nikto():
+    output = "\n".join([
+        "+ http://10.0.0.5/admin (CODE:403|SIZE:277)",
+        "/uploads              (Status: 301) [Size: 316]",
+        "+ /phpinfo.php: Output from the phpinfo() function was found.",
+        "+ Target IP: 10.0.0.5",
+    ])
+    paths = by_type(extract_findings("dirb", output, {}), "path")
+    assert [(p["path"], p.get("status")) for p in paths] == [
+        ("http://10.0.0.5/admin", 403), ("/uploads", 301), ("/phpinfo.php", None)]
+    assert paths[2]["note"] == "Output from the phpinfo() function was found."
+
+
+def test_service_banners_and_technology_lists():
+    output = "Server: nginx/1.18.0\nweb application technology: PHP 7.4.3, Apache 2.4.41\n"
+    services = by_type(extract_findings("sqlmap", output, {"target": "web"}), "service")
+    assert [(s["service"], s["product"], s["host"]) for s in services] == [
+        ("http", "nginx 1.18.0", "web"), (None, "PHP 7.4.3", "web"), (None, "Apache 2.4.41", "web")]
+
+
+def test_credentials_keep_markers_but_never_secrets():
+    output = "\n".join([
+        "[22][ssh] host: 10.0.0.5   login: admin   password: hunter2",
+        "SMB 10.0.0.7 445 DC [+] CORP\\svc_backup:Passw0rd! (Pwn3d!)",
+        "Username: root",
+        "Password: toor",
+    ])
+    credentials = by_type(extract_findings("hydra", output, {}), "credential")
+    assert [(c["host"], c["username"], c["privileged"]) for c in credentials] == [
+        ("10.0.0.5", "admin", False), (None, "CORP\\svc_backup", True), (None, "root", True)]
+    assert not any(secret in str(credentials) for secret in ("hunter2", "Passw0rd!", "toor"))
+
+
+def test_john_cracked_hashes_only_for_john():
+    output = "secret123        (alice)\n"
+    assert [c["username"] for c in by_type(extract_findings("john", output, {}), "credential")] == ["alice"]
+    assert by_type(extract_findings("hashcat", output, {}), "credential") == []
+
+
+def test_finding_documents_are_numbered_per_execution():
+    findings = extract_findings("nmap", NMAP_OUTPUT, {})
+    documents = finding_documents(findings, session_id="s1", execution_id="e1", tool_name="nmap",
+                                  timestamp="2026-01-01T00:00:00")
+    assert [d["id"] for d in documents] == [f"e1:{i}" for i in range(len(findings))]
+    assert all(d["session_id"] == "s1" and d["tool_name"] == "nmap" for d in documents)
+    assert extract_findings("nmap", "", {}) == []
@@ -0,0 +1,68 @@
+from history_cache import HistoryCache, message_size
+
+
+def message(n, content="hello"):
+    return {"_id": n, "id": f"m{n}", "role": "user", "content": content}
+
+
+def ids(messages):
+    return [m["id"] for m in messages]
+
+
+def test_entries_are_served_only_at_their_version():
+    cache = HistoryCache()
+    cache.put("s1", 3, [message(1), message(2)])
+    assert ids(cache.get("s1", 3)) == ["m1", "m2"]
+    assert cache.get("s1", 4) is None
+    assert cache.get("s1", None) is None
+    assert cache.get("s2", 3) is None
+    assert "_id" not in cache.get("s1", 3)[0]
+
+
+def test_append_advances_the_version_or_drops_a_stale_entry():
+    cache = HistoryCache()
+    cache.put("s1", 1, [message(1)])
+    cache.append("s1", 2, message(2))
+    assert ids(cache.get("s1", 2)) == ["m1", "m2"]
+
+    # Version 3 was written elsewhere, so appending 4 would leave a gap
+    cache.append("s1", 4, message(4))
+    assert cache.get("s1", 4) is None
+    assert cache.size == 0
+    cache.append("s1", 5, message(5))    # nothing cached: nothing to extend
+    assert cache.get("s1", 5) is None
+
+
+def test_entries_keep_only_the_newest_messages():
+    cache = HistoryCache(max_messages=3)
+    cache.put("s1", 1, [message(n) for n in range(5)])
+    cache.append("s1", 2, message(5))
+    assert ids(cache.get("s1", 2)) == ["m3", "m4", "m5"]
+    assert cache.size == sum(message_size({k: v for k, v in message(n).items() if k != "_id"}) for n in (3, 4, 5))
+
+
+def test_least_recently_used_sessions_are_evicted_by_size():
+    one_message = message_size({"id": "m0", "role": "user", "content": "x" * 100})
+    cache = HistoryCache(max_bytes=2 * one_message)
+    cache.put("s1", 1, [message(0, "x" * 100)])
+    cache.put("s2", 1, [message(0, "x" * 100)])
+    assert cache.get("s1", 1) is not None    # s2 is now the least recently used
+    cache.put("s3", 1, [message(0, "x" * 100)])
+    assert cache.get("s2", 1) is None
+    assert cache.get("s1", 1) is not None and cache.get("s3", 1) is not None
+    assert cache.size == 2 * one_message
+
+    cache.drop("s1")
+    cache.drop("unknown")
+    assert cache.size == one_message
+
+
+def test_put_replaces_the_previous_entry():
+    cache = HistoryCache()
+    cache.put("s1", 1, [message(1), message(2)])
+    cache.put("s1", 7, [message(3)])
+    assert cache.get("s1", 1) is None
+    assert ids(cache.get("s1", 7)) == ["m3"]
+    assert cache.size == message_size({"id": "m3", "role": "user", "content": "hello"})
+    cache.put("s1", None, [message(4)])
+    assert cache.size == 0
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from idempotency import IdempotencyInProgress, IdempotencyKeyReused, IdempotencyStore, fingerprint
+from memory_db import MemoryDatabase
+
+
+class Handler:
+    def __init__(self, result=None, error=None, delay=0):
+        self.calls = 0
+        self.result = result if result is not None else {"ok": True}
+        self.error = error
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return dict(self.result, call=self.calls)
+
+
+@pytest.fixture
+def collection():
+    return MemoryDatabase().idempotency_keys
+
+
+def test_repeated_request_replays_the_stored_result(collection):
+    async def scenario():
+        store, handler = IdempotencyStore(), Handler()
+        first = await store.run(collection, "tool:k1", {"a": 1}, handler)
+        second = await store.run(collection, "tool:k1", {"a": 1}, handler)
+        assert first == (False, {"ok": True, "call": 1})
+        assert second == (True, {"ok": True, "call": 1})
+        # A restarted worker replays from the record alone
+        assert await IdempotencyStore().run(collection, "tool:k1", {"a": 1}, handler) == second
+        assert handler.calls == 1
+        record = await collection.find_one({"_id": "tool:k1"})
+        assert record["status"] == "completed"
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_duplicates_attach_to_the_running_request(collection):
+    async def scenario():
+        store, handler = IdempotencyStore(), Handler(delay=0.01)
+        results = await asyncio.gather(*(store.run(collection, "chat:k", {"m": "hi"}, handler) for _ in range(3)))
+        assert handler.calls == 1
+        assert sorted(replayed for replayed, _ in results) == [False, True, True]
+        assert len({str(result) for _, result in results}) == 1
+
+    asyncio.run(scenario())
+
+
+def test_reusing_a_key_for_another_request_is_rejected(collection):
+    async def scenario():
+        store = IdempotencyStore()
+        running = asyncio.ensure_future(store.run(collection, "tool:k", {"a": 1}, Handler(delay=0.01)))
+        await asyncio.sleep(0)
+        with pytest.raises(IdempotencyKeyReused):
+            await store.run(collection, "tool:k", {"a": 2}, Handler())
+        await running
+        with pytest.raises(IdempotencyKeyReused):
+            await IdempotencyStore().run(collection, "tool:k", {"a": 2}, Handler())
+
+    asyncio.run(scenario())
+
+
+def test_failed_requests_release_their_key(collection):
+    async def scenario():
+        store = IdempotencyStore()
+        with pytest.raises(RuntimeError):
+            await store.run(collection, "tool:k", {"a": 1}, Handler(error=RuntimeError("boom")))
+        assert await collection.find_one({"_id": "tool:k"}) is None
+        assert await store.run(collection, "tool:k", {"a": 1}, Handler()) == (False, {"ok": True, "call": 1})
+
+    asyncio.run(scenario())
+
+
+def test_request_running_in_another_worker(collection):
+    async def scenario():
+        now = datetime.now(timezone.utc)
+        await collection.insert_one({"_id": "tool:k", "fingerprint": fingerprint({"a": 1}),
+                                     "status": "in_progress", "created_at": now, "started_at": now})
+        handler = Handler()
+        with pytest.raises(IdempotencyInProgress):
+            await IdempotencyStore(wait=0.1).run(collection, "tool:k", {"a": 1}, handler)
+        assert handler.calls == 0
+
+        # The other worker finishes while we wait: its result is replayed
+        async def finish():
+            await asyncio.sleep(0.05)
+            await collection.update_one({"_id": "tool:k"}, {"$set": {"status": "completed", "response": {"x": 1}}})
+        asyncio.ensure_future(finish())
+        assert await IdempotencyStore(wait=5).run(collection, "tool:k", {"a": 1}, handler) == (True, {"x": 1})
+        assert handler.calls == 0
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_records_are_taken_over(collection):
+    async def scenario():
+        long_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+        await collection.insert_one({"_id": "tool:k", "fingerprint": fingerprint({"a": 1}),
+                                     "status": "in_progress", "created_at": long_ago, "started_at": long_ago})
+        handler = Handler()
+        store = IdempotencyStore(wait=5, lock_seconds=60)
+        assert await store.run(collection, "tool:k", {"a": 1}, handler) == (False, {"ok": True, "call": 1})
+        assert (await collection.find_one({"_id": "tool:k"}))["status"] == "completed"
+
+    asyncio.run(scenario())
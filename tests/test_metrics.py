@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import metrics
+import server
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = []
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    return registry
+
+
+def test_counter_and_gauge_rendering(registry):
+    requests = metrics.Counter("requests_total", "Requests", ("path",))
+    requests.inc('/a"b')
+    requests.inc('/a"b', amount=2)
+    requests.inc("/c\\d\n")
+    workers = metrics.Gauge("workers", "Busy workers", ("pool",))
+    workers.inc("io")
+    workers.inc("io")
+    workers.dec("io")
+    assert metrics.render() == "\n".join([
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a\\"b"} 3',
+        'requests_total{path="/c\\\\d\\n"} 1',
+        "# HELP workers Busy workers",
+        "# TYPE workers gauge",
+        'workers{pool="io"} 1',
+    ]) + "\n"
+
+
+def test_gauge_function_is_read_at_scrape_time(registry):
+    depth = [4]
+    gauge = metrics.Gauge("queue_depth", "Queued jobs")
+    gauge.set_function(lambda: depth[0])
+    assert "queue_depth 4" in metrics.render()
+    depth[0] = 7
+    assert "queue_depth 7" in metrics.render()
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    latency = metrics.Histogram("latency_seconds", "Latency", ("route",), buckets=(0.5, 0.1, 1.0))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        latency.observe(value, "/x")
+    with latency.time("/y"):
+        pass
+    lines = metrics.render().splitlines()
+    assert lines[:8] == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/x",le="0.1"} 2',
+        'latency_seconds_bucket{route="/x",le="0.5"} 3',
+        'latency_seconds_bucket{route="/x",le="1.0"} 3',
+        'latency_seconds_bucket{route="/x",le="+Inf"} 4',
+        'latency_seconds_sum{route="/x"} 2.45',
+        'latency_seconds_count{route="/x"} 4',
+    ]
+    assert 'latency_seconds_bucket{route="/y",le="0.1"} 1' in lines
+    assert 'latency_seconds_count{route="/y"} 1' in lines
+
+
+def sample(text, prefix):
+    """Value of the first exposition line starting with `prefix`, or 0"""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_middleware_records_route_templates_and_statuses():
+    client = TestClient(server.app)
+    count = 'http_request_duration_seconds_count{method="GET",route="/api/files/uploads/{upload_id}",status="404"}'
+    before = sample(client.get("/metrics").text, count)
+
+    for upload_id in ("f" * 32, "e" * 32):
+        assert client.get(f"/api/files/uploads/{upload_id}").status_code == 404
+    response = client.get("/metrics")
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    assert sample(response.text, count) == before + 2
+    assert "/api/files/uploads/" + "f" * 32 not in response.text
+    assert 'http_requests_in_flight{method="GET"}' in response.text
+
+
+def test_mongo_listener_times_commands_per_collection(registry, monkeypatch):
+    histogram = metrics.Histogram("mongodb_command_duration_seconds", "MongoDB command latency",
+                                  ("collection", "command", "outcome"), buckets=metrics.FAST_BUCKETS)
+    monkeypatch.setattr(metrics, "MONGO_COMMAND_SECONDS", histogram)
+    listener = metrics.mongo_command_listener()
+
+    def run(command_name, command, outcome, micros):
+        started = SimpleNamespace(connection_id=("db", 27017), request_id=len(command_name),
+                                  command_name=command_name, command=command)
+        listener.started(started)
+        finished = SimpleNamespace(connection_id=started.connection_id, request_id=started.request_id,
+                                   command_name=command_name, duration_micros=micros)
+        getattr(listener, "succeeded" if outcome == "ok" else "failed")(finished)
+
+    run("find", {"find": "findings"}, "ok", 2000)
+    run("getMore", {"getMore": 123, "collection": "findings"}, "ok", 1000)
+    run("insert", {"insert": "sessions"}, "error", 500)
+    run("ping", {"ping": 1}, "ok", 100)
+
+    text = metrics.render()
+    assert 'mongodb_command_duration_seconds_sum{collection="findings",command="find",outcome="ok"} 0.002' in text
+    assert 'mongodb_command_duration_seconds_count{collection="findings",command="getMore",outcome="ok"} 1' in text
+    assert 'mongodb_command_duration_seconds_count{collection="sessions",command="insert",outcome="error"} 1' in text
+    assert 'mongodb_command_duration_seconds_count{collection="",command="ping",outcome="ok"} 1' in text
+    assert listener._collections == {}
@@ -0,0 +1,94 @@
+import json
+import os
+import pstats
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import profiling
+import server
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def client(profile_dir):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        time.sleep(0.02)  # keep the loop thread busy long enough to be sampled
+        return {"done": True}
+
+    @app.get("/api/profiles/{profile_id}")
+    async def fetch(profile_id: str):
+        return {"id": profile_id}
+
+    app.add_middleware(profiling.ProfilingMiddleware)
+    return TestClient(app)
+
+
+def test_requests_without_the_token_are_not_profiled(client, profile_dir):
+    assert "x-profile-id" not in client.get("/work").headers
+    assert "x-profile-id" not in client.get("/work", headers={"X-Profile": "wrong"}).headers
+    assert "x-profile-id" not in client.get("/work", params={"profile": "wrong"}).headers
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_header_token_saves_a_pstats_profile(client, profile_dir):
+    response = client.get("/work", headers={"X-Profile": TOKEN})
+    assert response.json() == {"done": True}
+    profile_id = response.headers["x-profile-id"]
+    path = profiling.profile_path(profile_id)
+    assert path == profile_dir / f"{profile_id}.pstats"
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_query_token_saves_a_speedscope_profile(client, profile_dir):
+    response = client.get("/work", params={"profile": TOKEN, "profile_format": "speedscope"})
+    path = profiling.profile_path(response.headers["x-profile-id"])
+    assert path.name.endswith(".speedscope.json")
+    profile = json.loads(path.read_text())
+    sampled = profile["profiles"][0]
+    assert sampled["name"] == "GET /work"
+    assert sampled["samples"] and len(sampled["samples"]) == len(sampled["weights"])
+    assert all(0 <= index < len(profile["shared"]["frames"]) for stack in sampled["samples"] for index in stack)
+
+
+def test_profile_downloads_are_not_profiled(client, profile_dir):
+    response = client.get(f"/api/profiles/{'a' * 32}", headers={"X-Profile": TOKEN})
+    assert "x-profile-id" not in response.headers
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_retention_keeps_the_newest_profiles(client, profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_RETENTION", 2)
+    ids = []
+    for age in range(3):
+        ids.append(client.get("/work", headers={"X-Profile": TOKEN}).headers["x-profile-id"])
+        # Age the earlier profiles explicitly rather than relying on mtime resolution
+        for older, profile_id in enumerate(reversed(ids)):
+            path = profiling.profile_path(profile_id)
+            if path:
+                os.utime(path, (1000 - older, 1000 - older))
+    assert sorted(p.name for p in profile_dir.iterdir()) == sorted(f"{i}.pstats" for i in ids[1:])
+
+
+def test_profile_endpoint_requires_the_token(profile_dir):
+    profile_id = "b" * 32
+    (profile_dir / f"{profile_id}.pstats").write_bytes(b"profile")
+    client = TestClient(server.app)
+    assert client.get(f"/api/profiles/{profile_id}").status_code == 403
+    response = client.get(f"/api/profiles/{profile_id}", headers={"X-Profile": TOKEN})
+    assert response.status_code == 200
+    assert response.content == b"profile"
+    assert client.get("/api/profiles/../../etc", headers={"X-Profile": TOKEN}).status_code == 404
@@ -0,0 +1,152 @@
+import asyncio
+
+import orjson
+
+import reports
+from bench_reports import SESSION_ID, populate
+from memory_db import MemoryDatabase
+from report_templates import code_fence
+
+
+def make_db(executions=300):
+    db = MemoryDatabase()
+    populate(db, executions)
+    return db
+
+
+async def drain(stream):
+    return "".join([chunk async for chunk in stream])
+
+
+def test_concurrent_renders_of_the_same_report_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_CACHE_DIR", tmp_path)
+    db = make_db()
+
+    async def interleaved():
+        _, _, first = await reports.report_body(db, SESSION_ID, "txt")
+        _, _, second = await reports.report_body(db, SESSION_ID, "txt")
+        outputs = [[], []]
+        streams = [first, second]
+        # Step both renders alternately, as two overlapping requests would
+        while streams[0] or streams[1]:
+            for i, stream in enumerate(streams):
+                if stream is None:
+                    continue
+                try:
+                    outputs[i].append(await stream.__anext__())
+                except StopAsyncIteration:
+                    streams[i] = None
+        return ["".join(output) for output in outputs]
+
+    first, second = asyncio.run(interleaved())
+    # Each render stamps its own generation time; the cache holds one of them intact
+    assert reports.cached_report_path(SESSION_ID, "txt", 1).read_text() in (first, second)
+    assert len(first) > 10_000 and abs(len(first) - len(second)) < 100
+    assert list(tmp_path.glob(f"{SESSION_ID}/*.tmp")) == []
+
+
+def test_markdown_fence_outlasts_tildes_in_tool_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_CACHE_DIR", tmp_path)
+    db = MemoryDatabase()
+    output = "banner\n~~~~~~\n## not a heading\n~~~~"
+
+    async def render():
+        await db.sessions.insert_one({"id": "s1", "content_version": 1})
+        await db.tool_executions.insert_one({"id": "e1", "session_id": "s1", "tool_name": "nc",
+                                             "timestamp": "2026-01-01T00:00:00", "output": output})
+        _, _, body = await reports.report_body(db, "s1", "md")
+        return await drain(body)
+
+    text = asyncio.run(render())
+    assert f"\n~~~~~~~\n{output}\n~~~~~~~\n" in text
+    assert code_fence("no tildes") == "~~~~"
+
+
+def test_report_is_cached_per_content_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_CACHE_DIR", tmp_path)
+    db = make_db(20)
+
+    async def scenario():
+        etag, path, body = await reports.report_body(db, SESSION_ID, "md")
+        assert (etag, path) == (f'"{SESSION_ID}.md.v1"', None)
+        rendered = await drain(body)
+
+        etag_again, path, body = await reports.report_body(db, SESSION_ID, "md")
+        assert etag_again == etag
+        assert path == reports.cached_report_path(SESSION_ID, "md", 1)
+        assert await drain(body) == rendered
+
+        # A write bumps the version: new ETag, fresh render, the old artifact is replaced
+        await db.sessions.update_one({"id": SESSION_ID}, {"$inc": {"content_version": 1}})
+        etag_new, path, body = await reports.report_body(db, SESSION_ID, "md")
+        assert (etag_new, path) == (f'"{SESSION_ID}.md.v2"', None)
+        await drain(body)
+        assert sorted(p.name for p in (tmp_path / SESSION_ID).iterdir()) == ["v2.md"]
+
+        reports.drop_cached_reports(SESSION_ID)
+        assert not (tmp_path / SESSION_ID).exists()
+
+    asyncio.run(scenario())
+
+
+def test_report_written_to_while_rendering_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_CACHE_DIR", tmp_path)
+    db = make_db(20)
+
+    async def scenario():
+        _, _, body = await reports.report_body(db, SESSION_ID, "txt")
+        first = await body.__anext__()
+        await db.sessions.update_one({"id": SESSION_ID}, {"$inc": {"content_version": 1}})
+        first += await drain(body)
+        assert first
+        assert list((tmp_path / SESSION_ID).iterdir()) == []
+
+    asyncio.run(scenario())
+
+
+def test_untracked_sessions_are_rendered_without_an_etag(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_CACHE_DIR", tmp_path)
+    etag, path, body = asyncio.run(reports.report_body(MemoryDatabase(), "unknown", "txt"))
+    assert (etag, path) == (None, None)
+    assert asyncio.run(drain(body))
+
+
+def test_ndjson_report_streams_every_record_in_bounded_chunks(monkeypatch):
+    monkeypatch.setattr(reports, "CHUNK_SIZE", 4096)
+    db = make_db(600)
+
+    async def collect():
+        return [chunk async for chunk in reports.stream_report(db, SESSION_ID, "json")]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 1
+    # A chunk is flushed as soon as it passes CHUNK_SIZE, so it overshoots by at most one line
+    longest_line = max(len(line) + 1 for line in "".join(chunks).splitlines())
+    assert all(len(chunk) < 4096 + longest_line for chunk in chunks)
+
+    report = reports.ndjson_to_report("".join(chunks))
+    assert report["session_id"] == SESSION_ID
+    assert len(report["tool_executions"]) == 600
+    assert len(report["findings"]) == len(db.findings.docs)
+    assert len(report["chat_history"]) == len(db.chat_messages.docs)
+    timestamps = [e["timestamp"] for e in report["tool_executions"]]
+    assert timestamps == sorted(timestamps)
+    footer = orjson.loads("".join(chunks).splitlines()[-1])
+    assert footer == {"record": "footer", "counts": {"tool_executions": 600, "findings": len(db.findings.docs),
+                                                      "chat_messages": len(db.chat_messages.docs)}}
+
+
+def test_text_report_lists_every_execution_and_finding_section():
+    db = make_db(150)
+    text = asyncio.run(drain(reports.stream_report(db, SESSION_ID, "txt")))
+    assert text.count("Status: success") == 150
+    assert "Total tools executed: 150" in text
+    for finding_type in {f["type"] for f in db.findings.docs}:
+        count = sum(1 for f in db.findings.docs if f["type"] == finding_type)
+        assert f"\n{finding_type.upper()} ({count})\n" in text
+    assert text.endswith("END OF REPORT\n" + "=" * 60)
+
+
+def test_unknown_formats_fall_back_to_text():
+    assert reports.normalize_format("pdf") == "txt"
+    assert reports.normalize_format("md") == "md"
@@ -0,0 +1,386 @@
+import asyncio
+import mmap
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import sandbox
+import server
+from sandbox import parse_range
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),     # end clamped to the file
+    ("bytes=-24", (1000, 1023)),           # suffix range
+    ("bytes=-5000", (0, 1023)),
+    (" bytes=5-5 ", (5, 5)),
+    ("bytes=-", None),
+    ("bytes=0-1,5-6", None),               # multiple ranges: the whole file is served
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=2000-3000", "bytes=10-5", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, len(CONTENT))
+
+
+@pytest.fixture
+def client():
+    path = sandbox.SANDBOX_DIR / "downloads" / "blob.bin"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(CONTENT)
+    yield TestClient(server.app)
+    path.unlink()
+
+
+def download(client, range_header=None):
+    headers = {"Range": range_header} if range_header else {}
+    return client.get("/api/files/download", params={"path": "downloads/blob.bin"}, headers=headers)
+
+
+def test_download_whole_file(client):
+    response = download(client)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_download_partial_content(client):
+    response = download(client, "bytes=100-199")
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert response.headers["content-length"] == "100"
+
+    tail = download(client, "bytes=-10")
+    assert tail.status_code == 206
+    assert tail.content == CONTENT[-10:]
+
+
+def test_download_unsatisfiable_range(client):
+    response = download(client, f"bytes={len(CONTENT)}-")
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_download_missing_file(client):
+    response = client.get("/api/files/download", params={"path": "downloads/missing.bin"})
+    assert response.status_code == 404
+
+
+def test_run_io_keeps_the_event_loop_responsive():
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        assert await sandbox.run_io("test-sleep", lambda: time.sleep(0.2) or "done") == "done"
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
+
+
+def test_run_io_records_outcomes_and_timeouts():
+    def failing():
+        raise OSError("disk on fire")
+
+    async def scenario():
+        assert (await sandbox.run_io("test-outcome", lambda: {"status": "error", "output": "nope"}))["status"] == "error"
+        with pytest.raises(OSError):
+            await sandbox.run_io("test-outcome", failing)
+        with pytest.raises(asyncio.TimeoutError):
+            await sandbox.run_io("test-outcome", time.sleep, 0.3, timeout=0.05)
+
+    asyncio.run(scenario())
+    stats = sandbox.IO_METRICS.snapshot()
+    entry = stats["operations"]["test-outcome"]
+    assert (entry["count"], entry["errors"], entry["timeouts"]) == (3, 2, 1)
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.parametrize("path", ["../etc/passwd", "/../../etc", "scans/../../outside"])
+def test_paths_outside_the_sandbox_are_rejected(path):
+    with pytest.raises(PermissionError):
+        sandbox.resolve_sandbox_path(path)
+    assert sandbox.sandbox_file_operation("read", path)["status"] == "error"
+
+
+def test_concurrent_line_seeks_share_one_consistent_index(tmp_path):
+    path = tmp_path / "big.log"
+    line_count = 40 * sandbox.LINE_INDEX_STRIDE
+    path.write_bytes(b"".join(b"line %d\n" % n for n in range(line_count)))
+    expected = {}
+    position = 0
+    for n in range(line_count):
+        expected[n] = position
+        position += len(b"line %d\n" % n)
+
+    for attempt in range(5):
+        index = sandbox.LineIndex(path.stat().st_size, path.stat().st_mtime_ns)
+        targets = [line_count - 1 - t * 7 for t in range(8)]
+        barrier = threading.Barrier(len(targets))
+
+        def seek(line):
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                barrier.wait()
+                return index.seek_line(mm, line)
+
+        with ThreadPoolExecutor(len(targets)) as pool:
+            offsets = list(pool.map(seek, targets))
+        assert offsets == [expected[line] for line in targets]
+        assert index.offsets == [expected[slot * sandbox.LINE_INDEX_STRIDE] for slot in range(len(index.offsets))]
+
+
+def test_abandoned_uploads_are_swept(tmp_path, monkeypatch):
+    monkeypatch.setattr(sandbox, "UPLOAD_DIR", tmp_path)
+    stale, active, orphan = "a" * 32, "b" * 32, "c" * 32
+    for upload_id in (stale, active):
+        (tmp_path / f"{upload_id}.json").write_text("{}")
+        (tmp_path / f"{upload_id}.part").write_bytes(b"partial")
+    (tmp_path / f"{orphan}.part").write_bytes(b"partial")
+    (tmp_path / "notes.txt").write_text("not an upload")
+    old = time.time() - 2 * 3600
+    for name in (f"{stale}.json", f"{stale}.part", f"{orphan}.part", f"{active}.json", "notes.txt"):
+        os.utime(tmp_path / name, (old, old))
+
+    # The active upload received data recently, even though it was created long ago
+    assert sandbox.sweep_uploads(max_age=3600) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"{active}.json", f"{active}.part", "notes.txt"]
+    assert sandbox.sweep_uploads(max_age=3600) == 0
+    monkeypatch.setattr(sandbox, "UPLOAD_DIR", tmp_path / "missing")
+    assert sandbox.sweep_uploads() == 0
+
+
+@pytest.fixture
+def listing_dir():
+    directory = sandbox.SANDBOX_DIR / "listing"
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "zeta").mkdir()
+    (directory / "Alpha").mkdir()
+    for name, size, mtime in (("b.txt", 30, 3000), ("A.log", 10, 1000), ("c.txt", 20, 2000)):
+        (directory / name).write_bytes(b"x" * size)
+        os.utime(directory / name, (mtime, mtime))
+    yield directory
+    for child in directory.iterdir():
+        child.rmdir() if child.is_dir() else child.unlink()
+    directory.rmdir()
+    sandbox.invalidate_listing(directory)
+
+
+def names(listing):
+    return [item["name"] for item in listing["items"]]
+
+
+def test_listing_puts_directories_first_then_sorts_by_name(listing_dir):
+    listing = sandbox.list_directory("listing")
+    assert listing["status"] == "success"
+    assert names(listing) == ["Alpha", "zeta", "A.log", "b.txt", "c.txt"]
+    assert listing["items"][0] == {"name": "Alpha", "type": "directory", "size": 0}
+    assert names(sandbox.list_directory("listing", order="desc")) == ["c.txt", "b.txt", "A.log", "zeta", "Alpha"]
+
+
+@pytest.mark.parametrize("sort, order, expected", [
+    ("size", "asc", ["Alpha", "zeta", "A.log", "c.txt", "b.txt"]),
+    ("size", "desc", ["b.txt", "c.txt", "A.log", "Alpha", "zeta"]),
+    ("mtime", "asc", ["A.log", "c.txt", "b.txt"]),
+    ("type", "asc", ["Alpha", "zeta", "A.log", "b.txt", "c.txt"]),
+])
+def test_listing_sort_keys(listing_dir, sort, order, expected):
+    listing = sandbox.list_directory("listing", sort=sort, order=order)
+    got = names(listing)
+    if sort == "mtime":
+        got = [name for name in got if "." in name]  # directory mtimes are "now"
+    assert got == expected
+
+
+def test_listing_pages_and_filters(listing_dir):
+    page = sandbox.list_directory("listing", offset=1, limit=2)
+    assert names(page) == ["zeta", "A.log"]
+    assert (page["total"], page["offset"], page["limit"]) == (5, 1, 2)
+    assert page["output"] == "2 of 5 entries"
+
+    clamped = sandbox.list_directory("listing", offset=-3, limit=0)
+    assert (clamped["offset"], clamped["limit"], names(clamped)) == (0, 1, ["Alpha"])
+    assert sandbox.list_directory("listing", offset=10)["items"] == []
+
+    assert names(sandbox.list_directory("listing", pattern="*.TXT")) == ["b.txt", "c.txt"]
+    assert names(sandbox.list_directory("listing", type="directory")) == ["Alpha", "zeta"]
+    filtered = sandbox.list_directory("listing", pattern="a*", type="file")
+    assert (names(filtered), filtered["total"]) == (["A.log"], 1)
+
+
+def test_listing_errors(listing_dir):
+    assert sandbox.list_directory("listing/b.txt") == {"status": "error", "output": "Not a directory"}
+    assert sandbox.list_directory("listing", sort="owner")["output"] == "Unknown sort key: owner"
+
+
+def test_listing_cache_is_reused_until_the_directory_changes(listing_dir):
+    first = sandbox.scan_directory(listing_dir)
+    assert sandbox.scan_directory(listing_dir) is first
+
+    # In-place writes don't touch the directory mtime; notify_change drops the entry
+    (listing_dir / "b.txt").write_bytes(b"y" * 5)
+    assert sandbox.scan_directory(listing_dir) is first
+    sandbox.notify_change(listing_dir / "b.txt")
+    assert ("b.txt", False, 5) in [entry[:3] for entry in sandbox.scan_directory(listing_dir)]
+
+    # A new entry bumps the directory mtime, which invalidates the cache by itself
+    cached = sandbox.scan_directory(listing_dir)
+    (listing_dir / "d.txt").write_text("new")
+    stat = listing_dir.stat()
+    os.utime(listing_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    refreshed = sandbox.scan_directory(listing_dir)
+    assert refreshed is not cached
+    assert "d.txt" in [entry[0] for entry in refreshed]
+
+
+@pytest.fixture
+def tree_dir():
+    directory = sandbox.SANDBOX_DIR / "treetest"
+    for rel in ("src/main.py", "src/util.py", "src/deep/x.py", "docs/readme.md",
+                "node_modules/pkg.js", "top.txt"):
+        (directory / rel).parent.mkdir(parents=True, exist_ok=True)
+        (directory / rel).write_text(rel)
+    yield directory
+    shutil.rmtree(directory)
+
+
+def child_names(node):
+    return [child["name"] for child in node["children"]]
+
+
+def test_tree_is_breadth_first_and_depth_limited(tree_dir):
+    tree = sandbox.directory_tree("/treetest", depth=2)
+    assert (tree["status"], tree["nodes"], tree["truncated"]) == ("success", 9, False)
+    root = tree["tree"]
+    assert child_names(root) == ["docs", "node_modules", "src", "top.txt"]
+    src = root["children"][2]
+    assert child_names(src) == ["deep", "main.py", "util.py"]
+    deep = src["children"][0]
+    assert "children" not in deep
+    expanded = sandbox.directory_tree(cursor=deep["expand"])
+    assert expanded["path"] == "/treetest/src/deep"
+    assert child_names(expanded["tree"]) == ["x.py"]
+
+
+def test_tree_node_budget_leaves_continuation_tokens(tree_dir):
+    tree = sandbox.directory_tree("/treetest", depth=3, max_nodes=3)
+    root = tree["tree"]
+    assert (tree["nodes"], tree["truncated"]) == (3, True)
+    assert child_names(root) == ["docs", "node_modules", "src"]
+    assert all("children" not in child and "expand" in child for child in root["children"])
+
+    rest = sandbox.directory_tree(cursor=root["next"])
+    assert child_names(rest["tree"]) == ["top.txt"]
+    docs = sandbox.directory_tree(cursor=root["children"][0]["expand"])
+    assert child_names(docs["tree"]) == ["readme.md"]
+
+
+def test_tree_glob_filters(tree_dir):
+    tree = sandbox.directory_tree("/treetest", depth=3, include=["*.py"], exclude=["node_modules"])
+    root = tree["tree"]
+    assert child_names(root) == ["docs", "src"]
+    assert child_names(root["children"][0]) == []
+    assert child_names(root["children"][1]) == ["deep", "main.py", "util.py"]
+    pruned = sandbox.directory_tree("/treetest", depth=3, exclude=["treetest/src/deep", "*.md"])
+    assert child_names(pruned["tree"]["children"][0]) == []
+    assert child_names(pruned["tree"]["children"][2]) == ["main.py", "util.py"]
+
+
+def test_tree_endpoint_rejects_bad_requests(tree_dir):
+    client = TestClient(server.app)
+    response = client.get("/api/files/tree", params={"path": "/treetest", "depth": 1})
+    assert response.status_code == 200
+    assert child_names(response.json()["tree"]) == ["docs", "node_modules", "src", "top.txt"]
+    assert client.get("/api/files/tree", params={"cursor": "not-a-token"}).status_code == 400
+    assert client.get("/api/files/tree", params={"path": "/treetest/top.txt"}).json()["status"] == "error"
+
+
+@pytest.fixture
+def fresh_sandbox(tmp_path, monkeypatch):
+    root = tmp_path / "sandbox"
+    monkeypatch.setattr(sandbox, "SANDBOX_DIR", root)
+    monkeypatch.setattr(sandbox, "MANIFEST_STAMP", tmp_path / "sandbox.manifest")
+    monkeypatch.setattr(sandbox, "CHANGE_HOOKS", [])
+    monkeypatch.setattr(sandbox, "_manifest_checked_at", None)
+    return root
+
+
+def test_populate_creates_the_manifest_once(fresh_sandbox):
+    result = sandbox.populate_sandbox()
+    assert result["status"] == "initialized"
+    assert sorted(result["created"]) == sorted(sandbox.SANDBOX_MANIFEST)
+    assert (fresh_sandbox / "README.txt").read_text() == sandbox.SANDBOX_MANIFEST["README.txt"]
+    assert (fresh_sandbox / "results").is_dir()
+
+    mtime = (fresh_sandbox / "README.txt").stat().st_mtime_ns
+    assert sandbox.populate_sandbox() == {"status": "current", "created": []}
+    assert (fresh_sandbox / "README.txt").stat().st_mtime_ns == mtime
+
+
+def test_populate_only_fills_in_missing_entries(fresh_sandbox, monkeypatch):
+    sandbox.populate_sandbox()
+    (fresh_sandbox / "wordlists" / "common.txt").write_text("edited")
+    (fresh_sandbox / "scripts" / "recon.sh").unlink()
+
+    # A changed manifest invalidates the stamp; user edits still survive
+    monkeypatch.setattr(sandbox, "MANIFEST_HASH", "changed")
+    result = sandbox.populate_sandbox()
+    assert result == {"status": "initialized", "created": ["scripts/recon.sh"]}
+    assert (fresh_sandbox / "wordlists" / "common.txt").read_text() == "edited"
+
+
+def test_populate_notices_a_recreated_sandbox(fresh_sandbox):
+    sandbox.populate_sandbox()
+    fresh_sandbox.rename(fresh_sandbox.with_name("wiped"))  # kept so the new directory gets a new inode
+    fresh_sandbox.mkdir()
+    assert sandbox.populate_sandbox()["status"] == "initialized"
+    assert (fresh_sandbox / "README.txt").exists()
+
+
+def test_ensure_sandbox_skips_the_pool_when_recently_verified(fresh_sandbox, monkeypatch):
+    calls = []
+
+    async def counting_run_io(name, fn, *args, **kwargs):
+        calls.append(name)
+        return fn(*args)
+
+    monkeypatch.setattr(sandbox, "run_io", counting_run_io)
+    first = asyncio.run(sandbox.ensure_sandbox())
+    second = asyncio.run(sandbox.ensure_sandbox())
+    assert first["status"] == "initialized"
+    assert second == {"status": "current", "created": []}
+    assert calls == ["init"]
+
+    monkeypatch.setattr(sandbox, "_manifest_checked_at", time.monotonic() - sandbox.MANIFEST_RECHECK_SECONDS - 1)
+    assert asyncio.run(sandbox.ensure_sandbox())["status"] == "current"
+    assert calls == ["init", "init"]
+
+
+def test_writes_without_a_session_are_charged_to_the_anonymous_bucket():
+    result = sandbox.sandbox_file_operation("write", "anonymous/notes.txt", "anonymous write")
+    assert result == {"status": "success", "output": "File written: anonymous/notes.txt"}
+    [bucket] = sandbox.get_blob_store().usage("")["sessions"]
+    assert bucket["session_id"] is None and bucket["files"] >= 1
+    sandbox.sandbox_file_operation("delete", "anonymous")
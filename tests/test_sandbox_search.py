@@ -0,0 +1,154 @@
+import pytest
+
+import sandbox_search
+from sandbox_search import SandboxSearch, query_terms, EXACT, PREFIX, SUFFIX, CONTAINS
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "root"
+    (root / "scans").mkdir(parents=True)
+    (root / "scans" / "nmap.txt").write_text("22/tcp open ssh\n80/tcp open http\n443/tcp open https\n")
+    (root / "scans" / "notes.txt").write_text("ssh looks interesting\nssh ssh ssh\n")
+    (root / "blob.bin").write_bytes(b"ssh\0\x01\x02")
+    return root
+
+
+@pytest.fixture
+def index(tmp_path, root):
+    search = SandboxSearch(tmp_path / "index.sqlite", root, refresh_interval=3600)
+    yield search
+    search.close()
+
+
+@pytest.mark.parametrize("query, regex, expected", [
+    ("open ssh", False, [("ssh", PREFIX), ("open", SUFFIX)]),
+    ("a tcp open b", False, [("open", EXACT), ("tcp", EXACT)]),
+    (r"\bssh\b", True, [("ssh", EXACT)]),
+    ("ssh.*open", True, [("open", CONTAINS), ("ssh", CONTAINS)]),
+    ("ss", False, []),
+    ("xyz", False, [("xyz", CONTAINS)]),
+])
+def test_query_terms(query, regex, expected):
+    assert query_terms(query, regex) == expected
+
+
+def test_search_ranks_text_files_and_skips_binaries(index):
+    result = index.search("ssh", context=1)
+    assert [hit["path"] for hit in result["hits"]] == ["/scans/notes.txt", "/scans/nmap.txt"]
+    nmap = result["hits"][1]
+    assert nmap["match_count"] == 1
+    assert nmap["matches"] == [{"line": 1, "text": "22/tcp open ssh", "before": [], "after": ["80/tcp open http"]}]
+    assert index.stats()["by_kind"] == {"text": 2, "binary": 1}
+
+    page = index.search("ssh", limit=1)
+    assert [hit["path"] for hit in page["hits"]] == ["/scans/notes.txt"] and page["has_more"]
+    assert index.search(r"open https?$", regex=True)["hits"][0]["match_count"] == 2
+    assert index.search("ssh", path="/other")["hits"] == []
+
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    monkeypatch.setattr(sandbox_search, "READ_CHUNK_SIZE", 256)
+    monkeypatch.setattr(sandbox_search, "PART_SIZE", 1024)
+
+
+def test_big_files_are_indexed_in_parts(index, root, small_parts):
+    lines = [f"line {number} filler text" for number in range(1, 1001)]
+    lines[776] = "line 777 the needle is here"
+    (root / "big.log").write_text("\n".join(lines) + "\n")
+
+    index.refresh()
+    assert index.stats()["parts"] > 10
+    candidates = index._candidates(query_terms("needle"), "/")
+    assert [(path, len(parts)) for path, _, parts in candidates] == [("/big.log", 1)]
+
+    hit = index.search("needle", context=2)["hits"][0]
+    assert hit["matches"] == [{"line": 777, "text": lines[776], "before": lines[774:776], "after": lines[777:779]}]
+    # Every part is found again with the right line numbers
+    assert index.search("filler", max_lines=1000)["hits"][0]["match_count"] == 999
+    assert index.search("line 1000 filler")["hits"][0]["matches"][0]["line"] == 1000
+
+
+def test_trailing_context_crosses_into_the_next_part(index, root, small_parts):
+    lines = [f"row {number}" for number in range(1, 400)]
+    (root / "rows.txt").write_text("\n".join(lines) + "\n")
+    index.refresh()
+    parts = index._candidates([("row", EXACT)], "/")[0][2]
+    boundary = parts[1][2]   # first line of the second part
+    query = rf"\b{lines[boundary - 2]}\b"   # the last line of the first part
+    assert len(index._candidates(query_terms(query, regex=True), "/")[0][2]) == 1
+    hit = index.search(query, regex=True, context=2)["hits"][0]
+    assert hit["matches"][0]["line"] == boundary - 1
+    assert hit["matches"][0]["after"] == lines[boundary - 1:boundary + 1]
+
+
+def test_files_with_a_huge_vocabulary_are_still_indexed(index, root, monkeypatch):
+    monkeypatch.setattr(sandbox_search, "READ_CHUNK_SIZE", 256)
+    monkeypatch.setattr(sandbox_search, "MAX_PART_TOKENS", 50)
+    (root / "words.txt").write_text("".join(f"word{number}\n" for number in range(2000)))
+    index.refresh()
+    assert index.stats()["parts"] > 10
+    hit = index.search("word1999")["hits"][0]
+    assert hit["matches"][0]["line"] == 2000
+    assert len(index._candidates(query_terms("word1999"), "/")[0][2]) == 1
+
+
+def test_writes_reindex_only_the_changed_path(index, root, monkeypatch):
+    index.refresh()
+
+    def no_full_walk(directory, prefix):
+        assert prefix, "full rescan"
+        return original_walk(directory, prefix)
+
+    original_walk = index._walk
+    monkeypatch.setattr(index, "_walk", no_full_walk)
+
+    (root / "scans" / "new.txt").write_text("fresh token\n")
+    index.mark_dirty(root / "scans" / "new.txt")
+    assert index.refresh() == {"indexed": 1, "removed": 0}
+    assert index.search("fresh")["hits"][0]["path"] == "/scans/new.txt"
+    assert index.refresh() == {"indexed": 0, "removed": 0}
+
+    (root / "scans" / "nmap.txt").write_text("22/tcp closed\n")
+    index.mark_dirty(root / "scans" / "nmap.txt")
+    assert index.refresh() == {"indexed": 1, "removed": 0}
+    assert [hit["path"] for hit in index.search("ssh")["hits"]] == ["/scans/notes.txt"]
+
+    for child in (root / "scans").iterdir():
+        child.unlink()
+    (root / "scans").rmdir()
+    index.mark_dirty(root / "scans")
+    assert index.refresh() == {"indexed": 0, "removed": 3}
+    assert index.search("ssh")["hits"] == []
+    assert index.stats()["files"] == 1
+
+
+def test_unpinned_changes_fall_back_to_a_full_rescan(index, root, tmp_path):
+    index.refresh()
+    (root / "other.txt").write_text("unseen words\n")
+    assert index.refresh() == {"indexed": 0, "removed": 0}
+    index.mark_dirty(tmp_path / "elsewhere.txt")
+    assert index.refresh() == {"indexed": 1, "removed": 0}
+    (root / "more.txt").write_text("more words\n")
+    index.mark_dirty()
+    assert index.refresh() == {"indexed": 1, "removed": 0}
+
+
+def test_interrupted_big_file_is_redone(index, root, small_parts, monkeypatch):
+    (root / "big.log").write_text("".join(f"entry {number}\n" for number in range(500)))
+    real_insert = index._insert_part
+    calls = []
+
+    def failing_insert(conn, fid, part, counts):
+        calls.append(part)
+        if len(calls) == 2:
+            raise OSError("disk went away")
+        real_insert(conn, fid, part, counts)
+
+    monkeypatch.setattr(index, "_insert_part", failing_insert)
+    index.refresh()
+    monkeypatch.setattr(index, "_insert_part", real_insert)
+    index.mark_dirty(root / "big.log")
+    assert index.refresh() == {"indexed": 1, "removed": 0}
+    assert index.search("entry", max_lines=500)["hits"][0]["match_count"] == 500
@@ -0,0 +1,181 @@
+import shutil
+import sqlite3
+import stat
+
+import pytest
+
+import sandbox_storage
+from sandbox_storage import ANONYMOUS_SESSION, BlobStore, QuotaExceededError, reflinks_supported
+
+
+def fake_reflink(source, target):
+    # Stands in for FICLONE on filesystems without it: a private copy the ledger treats as shared
+    shutil.copyfile(source, target)
+    return True
+
+
+@pytest.fixture(params=["reflink", "copy"])
+def mode(request, monkeypatch):
+    if request.param == "reflink":
+        monkeypatch.setattr(sandbox_storage, "clone_file", fake_reflink)
+    return request.param
+
+
+@pytest.fixture
+def store(tmp_path, mode):
+    sandbox = tmp_path / "sandbox"
+    blob_store = BlobStore(tmp_path / "blobs", sandbox, quota_bytes=1024, reflinks=mode == "reflink")
+    yield blob_store
+    blob_store.close()
+
+
+def put(store, rel, data, session_id="s1"):
+    target = store.sandbox_dir / rel
+    store.put_bytes(rel, target, data, session_id)
+    return target
+
+
+def blobs(store):
+    return sorted(p.name for p in store.blob_dir.glob("??/*"))
+
+
+def test_files_are_private_writable_copies(store, mode):
+    first = put(store, "a.txt", b"wordlist")
+    second = put(store, "b.txt", b"wordlist")
+    assert first.stat().st_ino != second.stat().st_ino
+    assert first.stat().st_mode & stat.S_IWUSR
+
+    # An in-place write (as a tool would do) only changes its own file
+    with open(first, "r+b") as f:
+        f.write(b"WORD")
+    assert second.read_bytes() == b"wordlist"
+    assert store.usage()["sessions"][0]["unique_blobs"] == 1
+    if mode == "reflink":
+        blob = next(p for p in store.blob_dir.glob("??/*"))
+        assert blob.read_bytes() == b"wordlist"
+        assert blob.stat().st_mode & 0o222 == 0
+    else:
+        assert blobs(store) == []
+
+
+def test_identical_content_is_charged_by_the_disk_it_takes(store, mode):
+    put(store, "a.txt", b"x" * 400)
+    put(store, "copy/a.txt", b"x" * 400)
+    [session] = store.usage("s1")["sessions"]
+    usage = store.usage()
+    assert usage["reflinks"] is (mode == "reflink")
+    if mode == "reflink":
+        assert len(blobs(store)) == 1
+        assert (session["files"], session["logical_bytes"], session["charged_bytes"]) == (2, 800, 400)
+        assert (usage["physical_bytes"], usage["dedup_saved_bytes"]) == (400, 400)
+        put(store, "third/a.txt", b"x" * 400)
+    else:
+        # Without reflinks every path is a full copy, and that is what gets charged
+        assert blobs(store) == []
+        assert (session["files"], session["logical_bytes"], session["charged_bytes"]) == (2, 800, 800)
+        assert (usage["physical_bytes"], usage["dedup_saved_bytes"]) == (800, 0)
+        with pytest.raises(QuotaExceededError):
+            put(store, "third/a.txt", b"x" * 400)
+
+
+def test_quota_is_enforced_per_session(store):
+    put(store, "a.txt", b"a" * 600)
+    with pytest.raises(QuotaExceededError):
+        put(store, "b.txt", b"b" * 600)
+    assert not (store.sandbox_dir / "b.txt").exists()
+    # Another session has its own allowance, and the same content is charged to each session
+    put(store, "c.txt", b"b" * 600, session_id="s2")
+    with pytest.raises(QuotaExceededError):
+        put(store, "d.txt", b"a" * 600, session_id="s2")
+    with pytest.raises(QuotaExceededError):
+        store.check_quota("e.txt", 500, "s1")
+    store.check_quota("e.txt", 424, "s1")
+
+
+@pytest.mark.parametrize("session_id", [None, ""])
+def test_anonymous_writes_share_one_bucket(store, tmp_path, session_id):
+    put(store, "a.txt", b"a" * 600, session_id)
+    with pytest.raises(QuotaExceededError):
+        put(store, "b.txt", b"b" * 600, None)
+    with pytest.raises(QuotaExceededError):
+        store.check_quota("b.txt", 600, session_id)
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"u" * 100)
+    store.put_file("up.bin", store.sandbox_dir / "up.bin", source, session_id)
+    [session] = store.usage(ANONYMOUS_SESSION)["sessions"]
+    assert (session["session_id"], session["files"], session["charged_bytes"]) == (None, 2, 700)
+    assert store.usage("s1")["sessions"] == []
+
+
+def test_overwriting_a_file_frees_its_previous_charge(store):
+    put(store, "a.txt", b"a" * 600)
+    put(store, "a.txt", b"b" * 900)    # would not fit on top of the old content
+    assert store.usage("s1")["sessions"][0]["charged_bytes"] == 900
+    assert (store.sandbox_dir / "a.txt").read_bytes() == b"b" * 900
+    assert len(blobs(store)) == (1 if store.reflinks else 0)
+
+
+def test_blobs_are_reclaimed_with_their_last_path(store):
+    put(store, "dir/a.txt", b"shared")
+    put(store, "dir/b.txt", b"shared")
+    put(store, "c.txt", b"shared")
+    (store.sandbox_dir / "dir" / "a.txt").unlink()
+    store.forget("dir/a.txt")
+    assert store.usage()["logical_bytes"] == 12
+    store.forget("dir")
+    assert store.usage()["physical_bytes"] == 6
+    store.forget("c.txt")
+    assert blobs(store) == []
+    assert store.usage() == {"sessions": [], "reflinks": store.reflinks, "blobs": 0, "physical_bytes": 0,
+                             "logical_bytes": 0, "dedup_saved_bytes": 0}
+
+
+def test_finished_upload_is_moved_into_storage(store, tmp_path):
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"u" * 100)
+    store.put_file("up/file.bin", store.sandbox_dir / "up" / "file.bin", source, "s1")
+    assert not source.exists()
+    assert (store.sandbox_dir / "up" / "file.bin").read_bytes() == b"u" * 100
+    assert store.usage("s1")["sessions"][0]["charged_bytes"] == 100
+
+
+def test_failed_clones_are_accounted_as_copies(tmp_path, monkeypatch):
+    def failing_clone(source, target):
+        shutil.copyfile(source, target)
+        return False
+
+    monkeypatch.setattr(sandbox_storage, "clone_file", failing_clone)
+    store = BlobStore(tmp_path / "blobs", tmp_path / "sandbox", quota_bytes=1024, reflinks=True)
+    put(store, "a.txt", b"x" * 400)
+    put(store, "b.txt", b"x" * 400)
+    usage = store.usage()
+    assert (usage["blobs"], usage["physical_bytes"], usage["dedup_saved_bytes"]) == (0, 800, 0)
+    assert usage["sessions"][0]["charged_bytes"] == 800
+    assert blobs(store) == []
+    store.close()
+
+
+def test_reflink_probe_matches_the_filesystem(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    supported = reflinks_supported(tmp_path / "a", tmp_path / "b")
+    assert isinstance(supported, bool)
+    assert list((tmp_path / "a").iterdir()) == list((tmp_path / "b").iterdir()) == []
+    store = BlobStore(tmp_path / "a", tmp_path / "b", quota_bytes=1024)
+    assert store.reflinks is supported
+    store.close()
+
+
+def test_ledgers_without_sharing_info_are_upgraded(tmp_path):
+    blob_dir = tmp_path / "blobs"
+    blob_dir.mkdir()
+    conn = sqlite3.connect(str(blob_dir / "ledger.sqlite"))
+    conn.execute("CREATE TABLE files (path TEXT PRIMARY KEY, session_id TEXT NOT NULL, "
+                 "digest TEXT NOT NULL, size INTEGER NOT NULL) WITHOUT ROWID")
+    conn.execute("INSERT INTO files VALUES ('old.txt', 's1', 'abc', 300)")
+    conn.commit()
+    conn.close()
+    store = BlobStore(blob_dir, tmp_path / "sandbox", quota_bytes=1024, reflinks=False)
+    assert store.usage()["physical_bytes"] == 300
+    assert store.usage("s1")["sessions"][0]["charged_bytes"] == 300
+    store.close()
@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pydantic import BaseModel
+
+import reports
+import sandbox
+import server
+import vulndb
+from idempotency import IdempotencyStore, fingerprint
+from memory_db import MemoryDatabase
+
+
+@pytest.fixture
+def db(monkeypatch):
+    memory = MemoryDatabase()
+    monkeypatch.setattr(server, "db", memory)
+    return memory
+
+
+def stamp(minute):
+    return f"2026-01-01T00:{minute:02d}:00+00:00"
+
+
+def seed(db, session_id, messages, executions):
+    async def insert():
+        for minute in messages:
+            await db.chat_messages.insert_one({"id": f"m{minute}", "session_id": session_id, "timestamp": stamp(minute)})
+        for minute in executions:
+            await db.tool_executions.insert_one({"id": f"e{minute}", "session_id": session_id, "timestamp": stamp(minute)})
+    asyncio.run(insert())
+
+
+def test_bundle_limit_applies_to_the_merged_timeline(db):
+    asyncio.run(db.sessions.insert_one({"id": "s1", "name": "engagement"}))
+    seed(db, "s1", messages=range(10, 20), executions=range(0, 10))
+
+    bundle = asyncio.run(server.load_session_bundle("s1", limit=5))
+    # The newest five items overall, with no older executions left in between
+    assert [item["id"] for item in bundle["timeline"]] == ["m15", "m16", "m17", "m18", "m19"]
+    assert (bundle["message_count"], bundle["execution_count"]) == (5, 0)
+    assert bundle["session"]["name"] == "engagement"
+
+
+def test_bundle_interleaves_messages_and_executions(db):
+    asyncio.run(db.sessions.insert_one({"id": "s1"}))
+    seed(db, "s1", messages=[1, 3, 5], executions=[2, 4])
+
+    bundle = asyncio.run(server.load_session_bundle("s1", limit=4))
+    assert [item["id"] for item in bundle["timeline"]] == ["e2", "m3", "e4", "m5"]
+    assert (bundle["message_count"], bundle["execution_count"]) == (2, 2)
+
+
+def test_bundle_serves_history_without_a_session_document(db):
+    seed(db, "orphan", messages=[1, 2], executions=[3])
+
+    bundle = asyncio.run(server.load_session_bundle("orphan"))
+    assert bundle["session"] is None
+    assert [item["id"] for item in bundle["timeline"]] == ["m1", "m2", "e3"]
+    assert asyncio.run(server.load_session_bundle("missing")) is None
+
+
+class Request(BaseModel):
+    value: int
+
+
+def run_idempotent(key, value, handler):
+    response = server.Response()
+    result = asyncio.run(server.idempotent("test", key, Request(value=value), response, handler))
+    return result, response.headers.get(server.REPLAYED_HEADER)
+
+
+def test_idempotent_endpoints_replay_and_reject_reused_keys(db):
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {"calls": len(calls)}
+
+    assert run_idempotent("k1", 1, handler) == ({"calls": 1}, None)
+    assert run_idempotent("k1", 1, handler) == ({"calls": 1}, "true")
+    assert run_idempotent(None, 1, handler) == ({"calls": 2}, None)
+    with pytest.raises(server.HTTPException) as reused:
+        run_idempotent("k1", 2, handler)
+    assert reused.value.status_code == 422
+    for bad_key in ("", "k" * 256):
+        with pytest.raises(server.HTTPException) as invalid:
+            run_idempotent(bad_key, 1, handler)
+        assert invalid.value.status_code == 400
+
+
+def test_idempotent_endpoint_conflicts_while_the_original_runs(db, monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY", IdempotencyStore(wait=0.05))
+    now = datetime.now(timezone.utc)
+    asyncio.run(db.idempotency_keys.insert_one({
+        "_id": "test:k1", "fingerprint": fingerprint({"value": 1}), "status": "in_progress",
+        "created_at": now, "started_at": now}))
+
+    async def handler():
+        raise AssertionError("must not run twice")
+
+    with pytest.raises(server.HTTPException) as conflict:
+        run_idempotent("k1", 1, handler)
+    assert conflict.value.status_code == 409
+
+
+def test_export_report_revalidates_with_its_etag(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_CACHE_DIR", tmp_path)
+    asyncio.run(db.sessions.insert_one({"id": "s1", "content_version": 3}))
+    seed(db, "s1", messages=[1], executions=[2])
+    request = server.ExportRequest(session_id="s1", format="md")
+
+    first = asyncio.run(server.export_report(request, if_none_match=None))
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    for validator in (etag, f"W/{etag}"):
+        assert asyncio.run(server.export_report(request, if_none_match=validator)).status_code == 304
+        not_modified = asyncio.run(server.export_report_stream(request, if_none_match=validator))
+        assert not_modified.status_code == 304
+
+    asyncio.run(server.bump_content_version("s1"))
+    assert asyncio.run(server.export_report(request, if_none_match=etag)).status_code == 200
+
+
+def test_correlate_matches_bare_service_names_of_the_builtin_feed(tmp_path, monkeypatch):
+    path = tmp_path / "vulndb.sqlite"
+    vulndb.build_store(path, (vulndb.normalize_record(v) for v in server.VULNERABILITY_DB), "builtin")
+    monkeypatch.setattr(server, "VULN_STORE", vulndb.VulnStore(path))
+
+    result = asyncio.run(server.correlate_vulnerabilities(["ssh", "apache", "mysql"]))
+    matched = {c["service"]: [v["id"] for v in c["vulnerabilities"]] for c in result["correlations"]}
+    assert matched == {"ssh": ["CVE-2024-0003"], "apache": ["CVE-2024-0001"], "mysql": ["CVE-2024-0002"]}
+    # With a version the affected range decides
+    [versioned] = asyncio.run(server.correlate_vulnerabilities(["OpenSSH 8.9p1", "OpenSSH 9.3p2"]))["correlations"]
+    assert (versioned["service"], versioned["match_count"]) == ("OpenSSH 8.9p1", 1)
+
+
+def test_sandbox_stores_open_on_first_use_and_close_cleanly(monkeypatch):
+    monkeypatch.setattr(server, "SANDBOX_SEARCH", None)
+    search = server.get_sandbox_search()
+    assert server.get_sandbox_search() is search
+    assert server.CHANGE_HOOKS.count(search.mark_dirty) == 1
+    server.close_sandbox_search()
+    assert server.SANDBOX_SEARCH is None
+    assert search.mark_dirty not in server.CHANGE_HOOKS
+
+    monkeypatch.setattr(sandbox, "BLOB_STORE", None)
+    store = server.get_blob_store()
+    assert server.get_blob_store() is store
+    server.close_blob_store()
+    assert sandbox.BLOB_STORE is None
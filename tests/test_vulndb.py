@@ -0,0 +1,169 @@
+import random
+
+import pytest
+
+import vulndb
+
+
+def nvd_item(cve_id, vendor, product, severity, start=None, end_excluding=None):
+    match = {"vulnerable": True, "criteria": f"cpe:2.3:a:{vendor}:{product}:*:*:*:*:*:*:*:*"}
+    if start:
+        match["versionStartIncluding"] = start
+    if end_excluding:
+        match["versionEndExcluding"] = end_excluding
+    return {"cve": {
+        "id": cve_id,
+        "descriptions": [{"lang": "en", "value": f"Issue in {vendor} {product}"}],
+        "metrics": {"cvssMetricV31": [{"cvssData": {"baseSeverity": severity}}]},
+        "configurations": [{"nodes": [{"cpeMatch": [match]}]}],
+    }}
+
+
+def build(tmp_path, items):
+    path = tmp_path / "vulndb.sqlite"
+    vulndb.build_store(path, (vulndb.normalize_record(item) for item in items), "test")
+    return vulndb.VulnStore(path)
+
+
+def test_ranges_of_one_product_do_not_match_another_product_of_the_same_vendor(tmp_path):
+    store = build(tmp_path, [
+        nvd_item("CVE-2023-0001", "apache", "struts", "CRITICAL", "2.0.0", "2.5.33"),
+        nvd_item("CVE-2023-0002", "apache", "http_server", "MEDIUM", "2.4.0", "2.4.56"),
+    ])
+    [correlation] = store.correlate(["Apache httpd 2.4.52"])
+    assert [v["id"] for v in correlation["vulnerabilities"]] == ["CVE-2023-0002"]
+    assert correlation["risk_level"] == "MEDIUM"
+    assert store.correlate(["Apache httpd 2.4.56"]) == []
+    assert [v["id"] for v in store.lookup("apache struts", "2.3.1")] == ["CVE-2023-0001"]
+    assert store.lookup("apache", "2.3.1") == []
+
+
+def test_search_matches_substrings_like_the_linear_scan(tmp_path):
+    records = [
+        {"id": "CVE-2024-0001", "severity": "CRITICAL", "service": "apache"},
+        {"id": "CVE-2024-0002", "severity": "HIGH", "service": "mysql"},
+        {"id": "CVE-2024-0003", "severity": "HIGH", "service": "ssh"},
+        {"id": "CVE-2024-0004", "severity": "MEDIUM", "service": "apache http_server"},
+    ]
+    store = build(tmp_path, records)
+    for needle in ["sql", "SQL", "pache", "h", "p_s", "he ht", "-", "apache http_server"]:
+        results, total = store.search(needle)
+        expected = [r["id"] for r in records if needle.lower() in r["service"]]
+        assert [v["id"] for v in results] == expected, needle
+        assert total == len(expected)
+    assert [v["id"] for v in store.search("ssh", severity="high")[0]] == ["CVE-2024-0003"]
+    assert store.search("apache", limit=1) == ([store.search("apache")[0][0]], 2)
+
+
+def test_version_key_orders_versions_numerically():
+    ordered = ["1.0", "2.4.9", "2.4.52", "8.9", "8.9p1", "8.10", "10.0"]
+    assert sorted(ordered, key=vulndb.version_key) == ordered
+    assert vulndb.version_key("2.4.52") == vulndb.version_key("2.4.52")
+    assert vulndb.version_key("1.0-RC1") == vulndb.version_key("1.0-rc1")
+
+
+@pytest.mark.parametrize("entry, inside, outside", [
+    ({"version_start_including": "2.0", "version_end_excluding": "2.5"}, ["2.0", "2.4.99"], ["1.9", "2.5"]),
+    ({"version_start_excluding": "2.0", "version_end_including": "2.5"}, ["2.0.1", "2.5"], ["2.0", "2.5.1"]),
+    ({"version_end_excluding": "3"}, ["0.1", "2.9"], ["3", "3.1"]),
+    ({}, ["0", "99.9"], []),
+])
+def test_range_bounds_inclusivity(entry, inside, outside):
+    start, end = vulndb.range_bounds(entry)
+    for version in inside:
+        assert start <= (vulndb.version_key(version), 1) <= end, version
+    for version in outside:
+        assert not start <= (vulndb.version_key(version), 1) <= end, version
+
+
+def test_interval_index_stab_matches_a_linear_scan():
+    rng = random.Random(7)
+    versions = [f"{major}.{minor}" for major in range(5) for minor in range(10)]
+    intervals = []
+    for value in range(300):
+        low, high = sorted(rng.sample(versions, 2), key=vulndb.version_key)
+        entry = {rng.choice(["version_start_including", "version_start_excluding"]): low,
+                 rng.choice(["version_end_including", "version_end_excluding"]): high}
+        intervals.append((*vulndb.range_bounds(entry), value))
+    index = vulndb.IntervalIndex(list(intervals))
+    assert len(index) == len(intervals)
+    for version in versions + ["9.9"]:
+        point = (vulndb.version_key(version), 1)
+        expected = sorted(value for start, end, value in intervals if start <= point <= end)
+        assert sorted(index.stab(point)) == expected, version
+    assert vulndb.IntervalIndex([]).stab(("", 1)) == []
+
+
+def test_correlate_ranks_by_severity_and_honours_ranges(tmp_path):
+    store = build(tmp_path, [
+        nvd_item("CVE-2023-0001", "openbsd", "openssh", "MEDIUM", "8.0", "9.3"),
+        nvd_item("CVE-2023-0002", "openbsd", "openssh", "CRITICAL", "8.5", "8.9"),
+        nvd_item("CVE-2023-0003", "openbsd", "openssh", "HIGH", None, "7.0"),
+        {"id": "CVE-2023-0004", "severity": "LOW", "service": "ssh"},
+    ])
+    [correlation] = store.correlate(["OpenSSH 8.6"])
+    assert correlation["version"] == "8.6"
+    assert [v["id"] for v in correlation["vulnerabilities"]] == ["CVE-2023-0002", "CVE-2023-0001"]
+    assert correlation["risk_level"] == "CRITICAL"
+
+    # Without a version every ranged record of the product is a candidate
+    [unversioned] = store.correlate(["openssh"], limit_per_service=2)
+    assert unversioned["match_count"] == 3
+    assert [v["id"] for v in unversioned["vulnerabilities"]] == ["CVE-2023-0002", "CVE-2023-0003"]
+
+    # Unranged records match any of their keys; batches keep the input order
+    batch = store.correlate(["ssh", "nothing here", "OpenSSH 9.3"])
+    assert [c["service"] for c in batch] == ["ssh"]
+    assert [v["id"] for v in batch[0]["vulnerabilities"]] == ["CVE-2023-0004"]
+    assert store.correlate([]) == []
+
+
+def test_search_pages_are_stable_and_ordered(tmp_path):
+    records = [{"id": f"CVE-2024-{n:04d}", "severity": "HIGH", "service": f"apache module{n % 3}"}
+               for n in range(1, 30)]
+    store = build(tmp_path, list(reversed(records)))
+    full, total = store.search("apache", limit=100)
+    assert total == len(records)
+    paged = [v for offset in range(0, total, 4) for v in store.search("apache", limit=4, offset=offset)[0]]
+    assert paged == full
+    assert len({v["id"] for v in paged}) == total
+
+
+def test_delta_adds_modifies_and_withdraws_records(tmp_path):
+    store = build(tmp_path, [
+        {"id": "CVE-2024-0001", "severity": "HIGH", "service": "mysql"},
+        {"id": "CVE-2024-0002", "severity": "LOW", "service": "ftp"},
+    ])
+    result = vulndb.apply_delta(store.db_path, {
+        "version": "2025-01-01",
+        "added": [{"id": "cve-2025-1", "severity": "critical", "service": "redis"},
+                  nvd_item("CVE-2025-0002", "openbsd", "openssh", "HIGH", None, "9.8")],
+        "modified": [{"id": "CVE-2024-0002", "severity": "MEDIUM", "service": "vsftpd"}],
+        "withdrawn": ["cve-2024-0001", "CVE-2000-9999"],
+    })
+    assert result == {"feed_version": "2025-01-01", "added": 2, "modified": 1, "withdrawn": 1, "record_count": 3}
+
+    # Ids are normalized on ingest, so any casing finds them
+    assert store.get("cve-2025-1")["id"] == "CVE-2025-1"
+    assert store.get("CVE-2025-1")["severity"] == "CRITICAL"
+    assert store.get("CVE-2024-0001") is None
+    assert store.search("mysql") == ([], 0)
+    assert [v["id"] for v in store.search("vsftpd")[0]] == ["CVE-2024-0002"]
+    assert store.search("ftp", severity="LOW") == ([], 0)
+    assert [v["id"] for v in store.lookup("openssh", "9.7")] == ["CVE-2025-0002"]
+    info = store.feed_info()
+    assert (info["feed_version"], info["record_count"], info["deltas_applied"]) == ("2025-01-01", 3, 1)
+
+    # A lower-case id added by one delta can be withdrawn by another
+    vulndb.apply_delta(store.db_path, {"withdrawn": ["Cve-2025-1"]})
+    assert store.get("CVE-2025-1") is None
+    assert store.search("redis") == ([], 0)
+
+
+def test_unnamed_deltas_are_numbered_from_the_last_named_version(tmp_path):
+    store = build(tmp_path, [{"id": "CVE-2024-0001", "severity": "HIGH", "service": "mysql"}])
+    base = store.feed_info()["feed_version"]
+    versions = [vulndb.apply_delta(store.db_path, {})["feed_version"] for _ in range(3)]
+    assert versions == [f"{base}+1", f"{base}+2", f"{base}+3"]
+    assert vulndb.apply_delta(store.db_path, {"version": "v7"})["feed_version"] == "v7"
+    assert vulndb.apply_delta(store.db_path, {})["feed_version"] == "v7+5"